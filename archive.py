@@ -0,0 +1,160 @@
+import os
+import glob
+import numpy as np
+import pandas as pd
+from datetime import datetime
+
+from ingest import DELIVERY_COLUMNS, DELIVERY_ID_COLUMN, DATE_COLUMNS, DATE_FORMAT, pyarrow_available, parse_date_column
+from atomic_file import atomic_path
+
+# アーカイブ設定
+ARCHIVE_DIR = "delivery_archive"  # 出荷月ごとのParquetファイルの保存先
+ARCHIVE_INDEX_FILE = "index.parquet"  # 配送管理ID → 出荷月の対応表
+MONTH_KEY_COLUMN = '月キー'  # 出荷月（年 * 12 + 月 - 1 の整数）
+
+# アーカイブに保存する列
+ARCHIVE_COLUMNS = [DELIVERY_ID_COLUMN] + DELIVERY_COLUMNS + [MONTH_KEY_COLUMN, '取込日']
+
+
+def partition_path(month_key, archive_dir=ARCHIVE_DIR):
+    """出荷月のParquetファイルのパス（例: delivery_archive/2025-09.parquet）を返します。"""
+    return os.path.join(archive_dir, f"{month_key // 12}-{month_key % 12 + 1:02d}.parquet")
+
+
+def write_parquet_atomic(df, path):
+    """Parquetファイルを一時ファイル経由で置き換えます。"""
+    with atomic_path(path) as tmp_path:
+        df.to_parquet(tmp_path, index=False)
+
+
+def ids_in(ids, id_set):
+    """
+    配送管理IDがid_setに含まれるかどうかの真偽値配列を返します。
+
+    文字列型（pyarrow）の列のisinは値1つごとに変換が入り遅いため、object型で判定します。
+    """
+    return ids.astype(object).isin(id_set).to_numpy()
+
+
+def format_date_values(values):
+    """
+    日付列の値を1つずつDATE_FORMATの文字列にします（空欄はNone）。
+
+    parse_date_columnは書式に合わない値がある列を文字列のまま返すため、日時型で読み込んだ
+    エクスポートと文字列のままのエクスポートを結合すると、日時と文字列が混ざった列になります。
+    値の型によらず文字列にそろえます（日付の種類は少ないため、種類ごとに1回だけ変換して各行に展開）。
+    """
+    codes, uniques = pd.factorize(values)
+    labels = [value.strftime(DATE_FORMAT) if isinstance(value, datetime) else str(value) for value in uniques]
+    return np.append(np.array(labels, dtype=object), None)[codes]
+
+
+def to_archive_frame(df, ingest_date):
+    """保存用に列をそろえ、日付は元の書式の文字列、その他は文字列に変換します。"""
+    archive_df = pd.DataFrame(index=df.index)
+    for col in ARCHIVE_COLUMNS:
+        if col == '取込日':
+            archive_df[col] = ingest_date
+        elif col == MONTH_KEY_COLUMN:
+            archive_df[col] = df[col].astype('int64')
+        elif col in DATE_COLUMNS:
+            archive_df[col] = format_date_values(df[col])
+        else:
+            archive_df[col] = df[col].astype(object)
+    return archive_df.reset_index(drop=True)
+
+
+def upsert_archive(df, ingest_date, archive_dir=ARCHIVE_DIR):
+    """
+    その日のエクスポートの行をアーカイブに追加・更新します。
+
+    配送管理IDをキーに、既存の行は新しい行で置き換えます。出荷月が変わった行は
+    元の月のファイルから削除します。読み書きするのは関係する月のファイルだけです。
+
+    Args:
+        df: ARCHIVE_COLUMNS（取込日を除く）を持つDataFrame
+        ingest_date: 取込日（"YYYY/MM/DD"）
+        archive_dir: 保存先のディレクトリ
+
+    Returns:
+        保存した行数
+    """
+    if not pyarrow_available():
+        print("pyarrowがインストールされていないため、アーカイブへの保存をスキップします。")
+        return 0
+
+    # 配送管理IDが空の行はキーにできないため保存しない
+    missing_id = df[DELIVERY_ID_COLUMN].isna()
+    if missing_id.any():
+        print(f"配送管理IDが空の行はアーカイブに保存しません: {int(missing_id.sum())}件")
+    new_rows = to_archive_frame(df[~missing_id], ingest_date)
+    new_rows = new_rows.drop_duplicates(subset=[DELIVERY_ID_COLUMN], keep='last')
+
+    os.makedirs(archive_dir, exist_ok=True)
+    index_path = os.path.join(archive_dir, ARCHIVE_INDEX_FILE)
+    if os.path.exists(index_path):
+        index = pd.read_parquet(index_path)
+    else:
+        index = pd.DataFrame({DELIVERY_ID_COLUMN: pd.Series(dtype=object), MONTH_KEY_COLUMN: pd.Series(dtype='int64')})
+
+    # 今回の行が新たに入る月と、今回の行が以前入っていた月のファイルだけを更新
+    new_ids = new_rows[DELIVERY_ID_COLUMN].to_numpy(dtype=object)
+    previous_months = index.loc[ids_in(index[DELIVERY_ID_COLUMN], new_ids), MONTH_KEY_COLUMN]
+    affected_months = sorted(set(new_rows[MONTH_KEY_COLUMN]) | set(previous_months))
+
+    for month_key in affected_months:
+        path = partition_path(int(month_key), archive_dir)
+        month_rows = new_rows[new_rows[MONTH_KEY_COLUMN] == month_key]
+        if os.path.exists(path):
+            existing = pd.read_parquet(path)
+            existing = existing[~ids_in(existing[DELIVERY_ID_COLUMN], new_ids)]
+            month_rows = pd.concat([existing, month_rows], ignore_index=True)
+        if month_rows.empty:
+            os.remove(path)
+        else:
+            write_parquet_atomic(month_rows, path)
+
+    # 配送管理ID → 出荷月の対応表を更新
+    index = pd.concat([
+        index[~ids_in(index[DELIVERY_ID_COLUMN], new_ids)],
+        new_rows[[DELIVERY_ID_COLUMN, MONTH_KEY_COLUMN]]
+    ], ignore_index=True)
+    write_parquet_atomic(index, index_path)
+
+    print(f"アーカイブを更新しました: {len(new_rows)}行（{len(affected_months)}か月分）")
+    return len(new_rows)
+
+
+def read_archive(start_month_key=None, end_month_key=None, archive_dir=ARCHIVE_DIR):
+    """
+    アーカイブから指定した出荷月の範囲の行だけを読み込みます。
+
+    Args:
+        start_month_key: 読み込む最初の月キー（省略時は制限なし）
+        end_month_key: 読み込む最後の月キー（省略時は制限なし）
+        archive_dir: 保存先のディレクトリ
+
+    Returns:
+        ARCHIVE_COLUMNSを持つDataFrame（日付列は日時型に戻す）
+    """
+    if not pyarrow_available():
+        raise FileNotFoundError("pyarrowがインストールされていないため、アーカイブを読み込めません。")
+
+    paths = []
+    for path in sorted(glob.glob(os.path.join(archive_dir, "[0-9][0-9][0-9][0-9]-[0-9][0-9].parquet"))):
+        year, month = os.path.basename(path).replace(".parquet", "").split("-")
+        month_key = int(year) * 12 + int(month) - 1
+        if start_month_key is not None and month_key < start_month_key:
+            continue
+        if end_month_key is not None and month_key > end_month_key:
+            continue
+        paths.append(path)
+
+    if not paths:
+        raise FileNotFoundError(f"'{archive_dir}'に読み込めるアーカイブがありません。")
+
+    df = pd.concat([pd.read_parquet(path) for path in paths], ignore_index=True)
+    for col in DATE_COLUMNS:
+        df[col] = parse_date_column(df[col])
+    print(f"アーカイブから{len(paths)}か月分（{len(df)}行）を読み込みました。")
+    return df
@@ -0,0 +1,35 @@
+import os
+import tempfile
+import contextlib
+
+
+@contextlib.contextmanager
+def atomic_path(path):
+    """
+    ファイルを一時ファイル経由で置き換える区間を作ります。
+
+    区間内で返された一時ファイルのパスに書き込むと、区間の終了時にpathを置き換えます（途中で例外が
+    発生した場合は一時ファイルを削除し、pathは変更しない）。一時ファイルの名前は呼び出しごとに異なるため、
+    同じファイルを同時に書き込むスレッド・プロセス（pipeline.pyのeditとbikouなど）があっても重なりません。
+
+    Yields:
+        一時ファイルのパス（pathと同じディレクトリの「ファイル名.XXXX.tmp」）
+    """
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=directory)
+    os.close(fd)
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+@contextlib.contextmanager
+def atomic_write(path, encoding='utf-8'):
+    """テキストファイルを一時ファイル経由で置き換える区間を作ります（atomic_pathの一時ファイルを開いて返す）。"""
+    with atomic_path(path) as tmp_path:
+        with open(tmp_path, 'w', encoding=encoding) as f:
+            yield f
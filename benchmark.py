@@ -0,0 +1,500 @@
+import io
+import os
+import glob
+import sys
+import json
+import time
+import filecmp
+import hashlib
+import resource
+import tempfile
+import threading
+import subprocess
+import contextlib
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+import pandas as pd
+
+import edit
+import ingest
+from generate_delivery_list import ROW_COUNTS, write_delivery_list
+
+# ベンチマーク設定
+ROW_COUNT = 200000  # 行数（月数によらず一定）
+MONTH_COUNTS = [3, 6, 12, 24, 48]  # 対象月数
+REPEAT = 5  # 計測回数（最小値を採用）
+PAYLOAD_MONTH_COUNT = 12  # 書き込みデータ量の比較に使う月数
+INGEST_ROW_COUNT = 500000  # CSV読み込みの計測に使う行数
+STAGE_ROW_COUNTS = ROW_COUNTS  # 段階別計測の行数（10k / 100k / 1M）
+ENCODING_ROW_COUNT = 300000  # エンコーディング判定の比較に使う行数
+STREAM_ROW_COUNT = 1000000  # ストリーミング集計の比較に使う行数
+DOWNLOAD_FILE_COUNT = 4  # HTTPダウンロードの計測に使うエクスポートの数
+DOWNLOAD_ROW_COUNT = 50000  # エクスポート1件あたりの行数
+DOWNLOAD_BYTES_PER_SECOND = 5 * 1024 * 1024  # 疑似サーバーの1接続あたりの送信速度
+ARCHIVE_CHECK_ROW_COUNT = 20000  # アーカイブの日付列の確認に使うエクスポート1件あたりの行数
+DOWNLOAD_COOKIE = {'name': 'session', 'value': 'benchmark', 'domain': '127.0.0.1', 'path': '/'}  # 疑似サーバーが要求するCookie
+
+
+def make_summary_rows(row_count, month_count, seed=0):
+    """集計対象の行（分類・日付判定済み）を乱数で作成します。"""
+    rng = np.random.default_rng(seed)
+    categories = np.array(edit.CUBE_CATEGORIES, dtype=object)[rng.integers(0, len(edit.CUBE_CATEGORIES), row_count)]
+    rice_quantities = np.array([5, 10, 15, 20, 25, 30])[rng.integers(0, 6, row_count)]
+    pb_quantities = rng.integers(1, 7, row_count)
+    date_groups = np.array(edit.CUBE_DATE_GROUPS, dtype=object)[rng.integers(0, len(edit.CUBE_DATE_GROUPS), row_count)]
+    return pd.DataFrame({
+        'カテゴリ': categories,
+        'タイプ': np.array(edit.CUBE_TYPES, dtype=object)[rng.integers(0, len(edit.CUBE_TYPES), row_count)],
+        '数量': np.where(categories == "ペットボトル", pb_quantities, rice_quantities),
+        '件数': 1,
+        '月キー': edit.MONTH_KEY_START + rng.integers(0, month_count, row_count),
+        '日付グループ': date_groups,
+        '出荷状況': np.array(edit.CUBE_STATUSES, dtype=object)[rng.integers(0, len(edit.CUBE_STATUSES), row_count)],
+    })
+
+
+def time_writer_prep(df):
+    """集計キューブの作成と3シート分の書き込みデータ作成にかかる時間を計測します。"""
+    best = None
+    for _ in range(REPEAT):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            month_keys, cube = edit.build_summary_cube(df)
+            cube_time = time.perf_counter() - start
+            data_count = len(edit.build_summary_data(month_keys, cube))
+            data_count += len(edit.build_schedule_data(month_keys, cube))
+            data_count += len(edit.build_material_consumption_data(month_keys, cube))
+            total_time = time.perf_counter() - start
+        if best is None or total_time < best[1]:
+            best = (cube_time, total_time, data_count)
+    return best
+
+
+def payload_bytes(data):
+    """batch_updateに渡す書き込みデータのJSONサイズ（バイト）を返します。"""
+    return len(json.dumps(data, ensure_ascii=False).encode('utf-8'))
+
+
+def report_payload_sizes(df):
+    """各シートの書き込み範囲数とデータ量を、範囲をまとめる前後で比較します。"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        month_keys, cube = edit.build_summary_cube(df)
+        sheets = {
+            edit.SHEET_NAME: edit.build_summary_data(month_keys, cube),
+            "出荷スケジュール": edit.build_schedule_data(month_keys, cube),
+            "資材消費管理": edit.build_material_consumption_data(month_keys, cube),
+        }
+    print(f"{'シート':<10} {'範囲数(前)':>10} {'範囲数(後)':>10} {'バイト(前)':>10} {'バイト(後)':>10}")
+    for sheet_name, data_to_write in sheets.items():
+        blocks = edit.compile_blocks(data_to_write)
+        print(f"{sheet_name:<10} {len(data_to_write):>10} {len(blocks):>10} "
+              f"{payload_bytes(data_to_write):>10} {payload_bytes(blocks):>10}")
+
+
+def read_csv_for_benchmark(mode, csv_path):
+    """指定した方法でCSVを読み込みます（ingest-childから呼び出し）。"""
+    if mode == "全列読み込み":
+        # 従来の読み込み（全列を型推定で読み込んでから列を選択）
+        df = pd.read_csv(csv_path, encoding='cp932')
+        return df[ingest.DELIVERY_COLUMNS]
+    if mode == "列絞り込み(C)":
+        return ingest.read_delivery_csv(csv_path)
+    if mode == "列絞り込み(pyarrow)":
+        return ingest.read_delivery_csv(csv_path, engine="pyarrow")
+    raise ValueError(f"不明な読み込み方法です: {mode}")
+
+
+def ingest_child(mode, csv_path):
+    """別プロセスでCSVを読み込み、読み込み時間とピークRSSをJSONで出力します。"""
+    start = time.perf_counter()
+    df = read_csv_for_benchmark(mode, csv_path)
+    parse_time = time.perf_counter() - start
+
+    # ru_maxrssはLinuxではKB、macOSではバイト
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    max_rss_mb = max_rss / (1024 * 1024) if sys.platform == "darwin" else max_rss / 1024
+    print(json.dumps({
+        'parse_time': parse_time,
+        'peak_rss_mb': max_rss_mb,
+        'frame_mb': df.memory_usage(deep=True).sum() / (1024 * 1024),
+    }))
+
+
+def report_ingest(row_count=INGEST_ROW_COUNT):
+    """合成したCP932のCSVで、読み込み方法ごとの読み込み時間とピークRSSを比較します。"""
+    modes = ["全列読み込み", "列絞り込み(C)"]
+    if ingest.pyarrow_available():
+        modes.append("列絞り込み(pyarrow)")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        csv_path = os.path.join(tmp_dir, "delivery_list_benchmark.csv")
+        write_delivery_list(csv_path, row_count)
+        file_mb = os.path.getsize(csv_path) / (1024 * 1024)
+
+        print(f"CSV読み込み（{row_count}行、{file_mb:.1f}MB、CP932）")
+        print(f"{'読み込み方法':<16} {'読み込み(s)':>10} {'ピークRSS(MB)':>14} {'DataFrame(MB)':>14}")
+        for mode in modes:
+            # 読み込みごとに新しいプロセスで計測（ピークRSSを分けるため）
+            result = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "ingest-child", mode, csv_path],
+                capture_output=True, text=True, check=True
+            )
+            stats = json.loads(result.stdout.strip().splitlines()[-1])
+            print(f"{mode:<16} {stats['parse_time']:>10.2f} {stats['peak_rss_mb']:>14.1f} {stats['frame_mb']:>14.1f}")
+
+
+def time_stage(stages, name, func, *args):
+    """1つの段階を実行して時間（秒）を記録し、結果を返します。"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        result = func(*args)
+        stages[name] = time.perf_counter() - start
+    return result
+
+
+def run_edit_stages(folder_path):
+    """edit.pyの処理の流れ（CSVの特定〜書き込み範囲の作成）を段階ごとに計測します。"""
+    stages = {}
+    # マニフェストはfolder_path内から探す（今日実際にダウンロードしたエクスポートを計測しないため）
+    csv_paths = time_stage(stages, "discover", edit.find_today_delivery_csvs, folder_path, None, folder_path)
+    df = time_stage(stages, "read", ingest.load_delivery_csvs, csv_paths, ingest.DELIVERY_COLUMNS, edit.CSV_ENGINE)
+    df = df[[ingest.DELIVERY_ID_COLUMN] + ingest.DELIVERY_COLUMNS]
+
+    def classify():
+        product_df = edit.classify_products(df['返礼品'])
+        df['カテゴリ'] = product_df['カテゴリ']
+        df['タイプ'] = product_df['タイプ']
+        df['数量'] = product_df['数量']
+        df['件数'] = edit.get_product_count()
+        df['出荷状況'] = edit.classify_delivery_statuses(df['配送ステータス'])
+
+    def date_group():
+        date_df = edit.classify_shipping_dates(df['出荷予定日'], df['出荷日'])
+        df['月キー'] = date_df['月キー']
+        df['月'] = date_df['月']
+        df['日付グループ'] = date_df['日付グループ']
+
+    time_stage(stages, "classify", classify)
+    time_stage(stages, "date_group", date_group)
+
+    def aggregate():
+        target = df[df['カテゴリ'].isin(edit.CUBE_CATEGORIES) & (df['出荷状況'] != '集計除外')]
+        return edit.build_summary_cube(target)
+
+    month_keys, cube = time_stage(stages, "aggregate", aggregate)
+
+    def layout():
+        sheet_cells = {
+            edit.SHEET_NAME: edit.build_summary_data(month_keys, cube),
+            "出荷スケジュール": edit.build_schedule_data(month_keys, cube),
+            "資材消費管理": edit.build_material_consumption_data(month_keys, cube),
+        }
+        return edit.compile_sheet_updates(sheet_cells, {}, full_write=True)
+
+    time_stage(stages, "layout", layout)
+    return stages
+
+
+def run_bikou_stages(csv_paths):
+    """bikou.pyのextract_unique_note_rowsを計測します。"""
+    import bikou
+
+    stages = {}
+    time_stage(stages, "extract_unique_note_rows", bikou.extract_unique_note_rows, csv_paths)
+    return stages
+
+
+def report_stages(row_counts=STAGE_ROW_COUNTS, output_path=None):
+    """合成したdelivery_list*.csvで、edit.pyとbikou.pyの段階ごとの時間（秒）をJSONで出力します。"""
+    yesterday = datetime.now().date() - timedelta(days=1)
+    results = []
+    for row_count in row_counts:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            csv_path = os.path.join(tmp_dir, f"delivery_list_benchmark_{row_count}.csv")
+            write_delivery_list(csv_path, row_count, payment_date=yesterday)
+            results.append({
+                'rows': row_count,
+                'file_mb': round(os.path.getsize(csv_path) / (1024 * 1024), 1),
+                'edit': run_edit_stages(tmp_dir),
+                'bikou': run_bikou_stages([csv_path]),
+            })
+
+    report = json.dumps(results, ensure_ascii=False, indent=2)
+    print(report)
+    if output_path is not None:
+        with open(output_path, 'w', encoding='utf-8') as f:
+            f.write(report + "\n")
+
+
+def read_csv_safely_previous(csv_path):
+    """変更前のbikou.read_csv_safely（CP932のキャッシュ → エンコーディングを順に置換デコードしてpythonパーサーで解析）。"""
+    try:
+        df = ingest.infer_column_types(ingest.load_export(csv_path))
+        if any('備考' in str(col) or '入金' in str(col) for col in df.columns):
+            return df
+    except Exception:
+        pass
+    with open(csv_path, 'rb') as f:
+        content = f.read()
+    for enc in ["cp932", "shift_jis", "utf-8", "utf-8-sig"]:
+        try:
+            df = pd.read_csv(io.StringIO(content.decode(enc, errors='replace')), on_bad_lines='skip', engine='python')
+        except Exception:
+            continue
+        if any('備考' in str(col) or '入金' in str(col) for col in df.columns):
+            return df
+    raise ValueError(f"CSV読み込みに失敗しました: {csv_path}")
+
+
+def report_encoding(row_count=ENCODING_ROW_COUNT):
+    """エンコーディングごとに、変更前と現在のbikou.read_csv_safelyの読み込み時間（キャッシュなし）を比較します。"""
+    import bikou
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cp932_path = os.path.join(tmp_dir, "delivery_list_cp932.csv")
+        write_delivery_list(cp932_path, row_count)
+        with open(cp932_path, 'rb') as f:
+            text = f.read().decode('cp932')
+        paths = {"cp932": cp932_path}
+        for enc in ["utf-8", "utf-8-sig"]:
+            paths[enc] = os.path.join(tmp_dir, f"delivery_list_{enc}.csv")
+            with open(paths[enc], 'w', encoding=enc, newline='') as f:
+                f.write(text)
+
+        print(f"bikou.read_csv_safely（{row_count}行、キャッシュなし）")
+        print(f"{'エンコーディング':<12} {'変更前(s)':>10} {'現在(s)':>10} {'一致':>4}")
+        cwd = os.getcwd()
+        try:
+            for enc, csv_path in paths.items():
+                results = []
+                for func in [read_csv_safely_previous, bikou.read_csv_safely]:
+                    # 毎回空のキャッシュから読み込む
+                    run_dir = tempfile.mkdtemp(dir=tmp_dir)
+                    os.chdir(run_dir)
+                    ingest._content_hashes.clear()
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        start = time.perf_counter()
+                        df = func(csv_path)
+                        results.append((time.perf_counter() - start, df))
+                    os.chdir(cwd)
+                (previous_time, previous_df), (current_time, current_df) = results
+                matches = previous_df.astype(str).equals(current_df.astype(str))
+                print(f"{enc:<12} {previous_time:>10.2f} {current_time:>10.2f} {'○' if matches else '×':>4}")
+        finally:
+            os.chdir(cwd)
+
+
+def aggregate_for_benchmark(mode, csv_path):
+    """指定した方法でCSVを集計キューブにします（stream-childから呼び出し）。"""
+    if mode == "stream":
+        month_keys, cube, _ = edit.stream_summary_cube([csv_path])
+        return month_keys, cube
+    df = ingest.load_delivery_csvs([csv_path], max_workers=1)
+    df = df[[ingest.DELIVERY_ID_COLUMN] + ingest.DELIVERY_COLUMNS]
+    product_df = edit.classify_products(df['返礼品'])
+    df['カテゴリ'] = product_df['カテゴリ']
+    df['タイプ'] = product_df['タイプ']
+    df['数量'] = product_df['数量']
+    df['件数'] = edit.get_product_count()
+    df['出荷状況'] = edit.classify_delivery_statuses(df['配送ステータス'])
+    date_df = edit.classify_shipping_dates(df['出荷予定日'], df['出荷日'])
+    df['月キー'] = date_df['月キー']
+    df['月'] = date_df['月']
+    df['日付グループ'] = date_df['日付グループ']
+    df = df[df['カテゴリ'].isin(edit.CUBE_CATEGORIES) & (df['出荷状況'] != '集計除外')]
+    return edit.build_summary_cube(df)
+
+
+def stream_child(mode, csv_path):
+    """別プロセスで集計キューブを作成し、時間・ピークRSS・キューブのハッシュをJSONで出力します。"""
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        month_keys, cube = aggregate_for_benchmark(mode, csv_path)
+    elapsed = time.perf_counter() - start
+
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    max_rss_mb = max_rss / (1024 * 1024) if sys.platform == "darwin" else max_rss / 1024
+    print(json.dumps({
+        'time': elapsed,
+        'peak_rss_mb': max_rss_mb,
+        'cube_sha256': hashlib.sha256(month_keys.tobytes() + cube.tobytes()).hexdigest(),
+    }))
+
+
+def report_stream(row_count=STREAM_ROW_COUNT):
+    """合成したCSVで、通常の集計とストリーミング集計の時間・ピークRSSを比較し、キューブが一致するか確認します。"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        csv_path = os.path.join(tmp_dir, "delivery_list_benchmark.csv")
+        write_delivery_list(csv_path, row_count)
+        file_mb = os.path.getsize(csv_path) / (1024 * 1024)
+
+        print(f"集計キューブの作成（{row_count}行、{file_mb:.1f}MB、チャンク{ingest.STREAM_CHUNK_ROWS}行）")
+        print(f"{'方法':<10} {'時間(s)':>8} {'ピークRSS(MB)':>14}")
+        hashes = set()
+        for mode in ["in-memory", "stream"]:
+            # 集計ごとに新しいプロセスで計測（ピークRSSとCSVキャッシュの影響を分けるため）
+            result = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "stream-child", mode, csv_path],
+                capture_output=True, text=True, check=True, cwd=tmp_dir
+            )
+            stats = json.loads(result.stdout.strip().splitlines()[-1])
+            hashes.add(stats['cube_sha256'])
+            print(f"{mode:<10} {stats['time']:>8.2f} {stats['peak_rss_mb']:>14.1f}")
+        print(f"キューブの一致: {'○' if len(hashes) == 1 else '×'}")
+
+
+def serve_exports(file_dir, bytes_per_second=DOWNLOAD_BYTES_PER_SECOND):
+    """
+    file_dir内のファイルを返す疑似的なポータルのHTTPサーバーを別スレッドで起動します。
+
+    DOWNLOAD_COOKIEを送らないリクエストには、ログインが切れたときと同じくHTMLを返します。
+    """
+    cookie = f"{DOWNLOAD_COOKIE['name']}={DOWNLOAD_COOKIE['value']}"
+    chunk_size = 64 * 1024
+
+    class ExportHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            path = os.path.join(file_dir, os.path.basename(self.path))
+            if cookie not in self.headers.get('Cookie', ''):
+                body = "<html>ログインしてください</html>".encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                return
+            if not os.path.exists(path):
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/csv')
+            self.send_header('Content-Length', str(os.path.getsize(path)))
+            self.end_headers()
+            with open(path, 'rb') as f:
+                while chunk := f.read(chunk_size):
+                    self.wfile.write(chunk)
+                    time.sleep(len(chunk) / bytes_per_second)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ExportHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def report_download(file_count=DOWNLOAD_FILE_COUNT, row_count=DOWNLOAD_ROW_COUNT):
+    """疑似サーバーから合成したエクスポートをHTTPで取得し、同時取得数ごとの時間を比較します。"""
+    import download
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        source_dir = os.path.join(tmp_dir, "exports")
+        os.makedirs(source_dir)
+        for i in range(file_count):
+            write_delivery_list(os.path.join(source_dir, f"export_{i}.csv"), row_count, seed=i)
+        total_mb = sum(os.path.getsize(os.path.join(source_dir, name)) for name in os.listdir(source_dir)) / (1024 * 1024)
+
+        server = serve_exports(source_dir)
+        base_url = f"http://127.0.0.1:{server.server_address[1]}"
+        links = {i: f"{base_url}/export_{i}.csv" for i in range(file_count)}
+        try:
+            print(f"HTTPダウンロード（{file_count}件、計{total_mb:.1f}MB、1接続あたり{DOWNLOAD_BYTES_PER_SECOND / (1024 * 1024):.0f}MB/s）")
+            print(f"{'同時取得数':>8} {'時間(s)':>8} {'一致':>4}")
+            for workers in sorted({1, download.HTTP_DOWNLOAD_WORKERS}):
+                dest_dir = os.path.join(tmp_dir, f"downloads_{workers}")
+                os.makedirs(dest_dir)
+                with contextlib.redirect_stdout(io.StringIO()):
+                    start = time.perf_counter()
+                    saved, failed = download.fetch_exports(links, [DOWNLOAD_COOKIE], dest_dir, workers=workers)
+                    elapsed = time.perf_counter() - start
+                matches = not failed and all(
+                    filecmp.cmp(os.path.join(source_dir, f"export_{i}.csv"), path, shallow=False)
+                    for i, path in saved.items()
+                )
+                print(f"{workers:>8} {elapsed:>8.2f} {'○' if matches else '×':>4}")
+
+            # Cookieがない場合はHTMLを保存せずに失敗として扱うことを確認
+            with contextlib.redirect_stdout(io.StringIO()):
+                saved, failed = download.fetch_exports(links, [], os.path.join(tmp_dir, f"downloads_{download.HTTP_DOWNLOAD_WORKERS}"))
+            print(f"Cookieなし: 保存{len(saved)}件、失敗{len(failed)}件")
+        finally:
+            server.shutdown()
+
+
+def check_archive_mixed_dates(row_count=ARCHIVE_CHECK_ROW_COUNT):
+    """
+    日時型で読み込んだエクスポートと、日付列が文字列のままのエクスポート（書式に合わない値を含む）を
+    結合してアーカイブに保存し、日付列が元のCSVと同じ文字列で保存されることを確認します。
+    """
+    import archive
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        typed_path = os.path.join(tmp_dir, "delivery_list_typed.csv")
+        text_path = os.path.join(tmp_dir, "delivery_list_text.csv")
+        write_delivery_list(typed_path, row_count, seed=0)
+        # 配送管理IDをずらし、出荷予定日に書式に合わない値を1つ入れる（この列は文字列のまま読み込まれる）
+        raw = pd.read_csv(typed_path, encoding=ingest.CSV_ENCODING, dtype='str')
+        raw[ingest.DELIVERY_ID_COLUMN] = (raw[ingest.DELIVERY_ID_COLUMN].astype(int) + row_count).astype(str)
+        raw.loc[0, '出荷予定日'] = "未定"
+        raw.to_csv(text_path, index=False, encoding=ingest.CSV_ENCODING)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            frames = [ingest.read_delivery_csv_uncached(path, [ingest.DELIVERY_ID_COLUMN] + ingest.DELIVERY_COLUMNS, True, None)
+                      for path in (typed_path, text_path)]
+            df = ingest.concat_delivery_frames(frames)
+            df['月キー'] = edit.classify_shipping_dates(df['出荷予定日'], df['出荷日'])['月キー']
+            archive_dir = os.path.join(tmp_dir, "archive")
+            saved = archive.upsert_archive(df, "2025/10/01", archive_dir)
+            archived = pd.concat([pd.read_parquet(path) for path in glob.glob(os.path.join(archive_dir, "????-??.parquet"))])
+
+        expected = pd.concat([pd.read_csv(path, encoding=ingest.CSV_ENCODING, dtype='str') for path in (typed_path, text_path)])
+        expected = expected.set_index(ingest.DELIVERY_ID_COLUMN)[ingest.DATE_COLUMNS]
+        actual = archived.set_index(ingest.DELIVERY_ID_COLUMN)[ingest.DATE_COLUMNS].reindex(expected.index)
+        kinds = [str(frame['出荷予定日'].dtype) for frame in frames]
+        print(f"出荷予定日の型: {kinds} → 結合後 {df['出荷予定日'].dtype}")
+        print(f"保存した行数: {saved} / {len(expected)}")
+        for col in ingest.DATE_COLUMNS:
+            same = (actual[col].fillna("") == expected[col].fillna("")).all()
+            print(f"{col}: {'OK' if same else 'NG（元のCSVと異なる値があります）'}")
+
+
+def main():
+    print(f"書き込み準備時間（{ROW_COUNT}行、{REPEAT}回中の最小値）")
+    print(f"{'月数':>4} {'キューブ作成(ms)':>16} {'書き込み準備合計(ms)':>20} {'セル数':>8}")
+    for month_count in MONTH_COUNTS:
+        df = make_summary_rows(ROW_COUNT, month_count)
+        cube_time, total_time, data_count = time_writer_prep(df)
+        print(f"{month_count:>4} {cube_time * 1000:>16.1f} {total_time * 1000:>20.1f} {data_count:>8}")
+
+    print()
+    print(f"書き込み範囲数とデータ量（{PAYLOAD_MONTH_COUNT}か月分）")
+    report_payload_sizes(make_summary_rows(ROW_COUNT, PAYLOAD_MONTH_COUNT))
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["ingest-child"]:
+        ingest_child(sys.argv[2], sys.argv[3])
+    elif sys.argv[1:2] == ["ingest"]:
+        report_ingest()
+    elif sys.argv[1:2] == ["encoding"]:
+        report_encoding()
+    elif sys.argv[1:2] == ["stream-child"]:
+        stream_child(sys.argv[2], sys.argv[3])
+    elif sys.argv[1:2] == ["stream"]:
+        # python3 benchmark.py stream [行数]
+        report_stream(int(sys.argv[2]) if len(sys.argv) > 2 else STREAM_ROW_COUNT)
+    elif sys.argv[1:2] == ["archive"]:
+        check_archive_mixed_dates()
+    elif sys.argv[1:2] == ["download"]:
+        report_download()
+    elif sys.argv[1:2] == ["stages"]:
+        # python3 benchmark.py stages [行数 ...] [--output 出力先.json]
+        args = sys.argv[2:]
+        output_path = None
+        if "--output" in args:
+            output_path = args[args.index("--output") + 1]
+            del args[args.index("--output"):args.index("--output") + 2]
+        report_stages([int(arg) for arg in args] or STAGE_ROW_COUNTS, output_path)
+    else:
+        main()
@@ -1,33 +1,127 @@
+import io
 import os
+import sys
+import json
+import codecs
 import glob
 import pandas as pd
+import numpy as np
 import gspread
 import re
 from datetime import datetime, timedelta
 from oauth2client.service_account import ServiceAccountCredentials
 
+from ingest import CSV_ENCODING, EXPORT_CACHE_DIR, load_export, infer_column_types, file_content_hash
+from manifest import manifest_csv_paths
+from schema import resolve_columns
+from atomic_file import atomic_write
+
 # 設定情報
 SPREADSHEET_ID = "1swzp4-ISlM769K_dKR1BpdwQSkV19YmhHZuzwaXQCdI"
 SHEET_NAME = "備考欄"
 API_KEY_FILE = "key.json"
+CHECKBOX_COLUMN_INDEX = 5  # チェックボックスの列（F列、0ベース）
+
+# 認証済みのクライアントと開いた備考欄シート（open_note_sheet）
+_client = None
+_note_sheet = None
+
+# エンコーディング判定
+ENCODING_CANDIDATES = ["cp932", "shift_jis", "utf-8", "utf-8-sig"]  # 判定したエンコーディングで読めない場合に順に試す
+ENCODING_DETECT_ORDER = ["utf-8", "cp932"]  # 判定で試す順（CP932の日本語はほぼUTF-8として不正なためUTF-8を先に試す）
+ENCODING_SAMPLE_BYTES = 64 * 1024  # 判定に使うファイルの先頭のバイト数
+ENCODING_CACHE_FILE = os.path.join(EXPORT_CACHE_DIR, "encodings.json")  # ファイル内容のSHA-256ごとの判定結果
+
+# 備考欄の抽出に使う列（schema.pyのCOLUMN_RULESの列）
+NOTE_REQUIRED_COLUMNS = ["配送管理ID", "寄附者"]  # ないCSVがあればエラー
+NOTE_OPTIONAL_COLUMNS = ["備考", "配送用伝票備考", "入金日"]  # 備考はどちらか一方が必要。入金日がないCSVはスキップ
+
+
+def detect_encoding(csv_path):
+    """
+    ファイルの先頭ENCODING_SAMPLE_BYTESバイトからエンコーディングを判定する
+
+    BOMがあればutf-8-sig、なければENCODING_DETECT_ORDERを順に厳密にデコードし、
+    最初にデコードできたものを返す（どれもデコードできない場合はNone）
+    """
+    with open(csv_path, 'rb') as f:
+        sample = f.read(ENCODING_SAMPLE_BYTES)
+    if sample.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+
+    # 途中で切れた多バイト文字で失敗しないよう、最後の改行までで判定する
+    if len(sample) == ENCODING_SAMPLE_BYTES and b"\n" in sample:
+        sample = sample[:sample.rindex(b"\n") + 1]
+    for enc in ENCODING_DETECT_ORDER:
+        try:
+            sample.decode(enc)
+            return enc
+        except UnicodeDecodeError:
+            continue
+    return None
 
 
-def read_csv_safely(csv_path):
-    """複数のエンコーディングを試してCSVを読み込む"""
-    encodings = ["cp932", "shift_jis", "utf-8", "utf-8-sig"]
+def load_encoding_cache(path=ENCODING_CACHE_FILE):
+    """判定済みのエンコーディング（ファイル内容のSHA-256 → エンコーディング）を読み込む"""
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+
+def save_encoding_cache(cache, path=ENCODING_CACHE_FILE):
+    """判定済みのエンコーディングを保存する"""
+    with atomic_write(path) as f:
+        json.dump(cache, f)
+
 
+def cached_encoding(csv_path):
+    """ファイルのエンコーディングを返す（同じ内容のファイルは前回の判定結果を使う）"""
+    content_hash = file_content_hash(csv_path)
+    cache = load_encoding_cache()
+    if content_hash not in cache:
+        cache[content_hash] = detect_encoding(csv_path)
+        save_encoding_cache(cache)
+    return cache[content_hash]
+
+
+def has_note_columns(df):
+    """列名に日本語が含まれているか確認（備考列・入金列があるか）"""
+    return any('備考' in str(col) or '入金' in str(col) for col in df.columns)
+
+
+def read_csv_safely(csv_path):
+    """エンコーディングを判定して1回だけデコードし、CSVを読み込む"""
+    enc = cached_encoding(csv_path)
+    try:
+        if enc == CSV_ENCODING:
+            # edit.py・debug.pyと共有するCP932のキャッシュから読み込む
+            df = infer_column_types(load_export(csv_path))
+        elif enc is not None:
+            df = infer_column_types(pd.read_csv(csv_path, encoding=enc, dtype='str', on_bad_lines='skip'))
+        else:
+            df = None
+        if df is not None and has_note_columns(df):
+            print(f"CSVファイル「{os.path.basename(csv_path)}」を {enc} で読み込みました。")
+            return df
+    except Exception:
+        pass
+
+    # 判定したエンコーディングで読めない場合（先頭以降に別の文字コードが混ざっている場合など）は
+    # 候補のエンコーディングを順に試す
     last_error = None
-    for enc in encodings:
+    for enc in ENCODING_CANDIDATES:
         try:
             # バイナリモードで読み込んでからデコードを試みる（エラーを置換）
             with open(csv_path, 'rb') as f:
                 content = f.read()
                 try:
                     content_decoded = content.decode(enc, errors='replace')
-                    import io
                     df = pd.read_csv(io.StringIO(content_decoded), on_bad_lines='skip', engine='python')
-                    # 列名に日本語が含まれているか確認（備考列があるか）
-                    if any('備考' in str(col) or '入金' in str(col) for col in df.columns):
+                    if has_note_columns(df):
                         print(f"CSVファイル「{os.path.basename(csv_path)}」を {enc} で読み込みました。")
                         return df
                 except Exception as decode_error:
@@ -74,8 +168,60 @@ def process_note_text(text):
     return text
 
 
-def find_today_delivery_csvs(folder_path):
-    """指定フォルダで今日ダウンロードした delivery_list*.csv を取得"""
+# 備考欄の加工（clean_note_textsで使う。process_note_textと同じ処理）
+# Pythonの\sと同じ空白文字（str.isspace()がTrueの文字）。pyarrowの正規表現（RE2）の\sはASCIIの空白だけのため明示する
+NOTE_WHITESPACE_PATTERN = "[\t\n\x0b\x0c\r\x1c-\x1f \x85\xa0\u1680\u2000-\u200a\u2028\u2029\u202f\u205f\u3000]+"
+NOTE_START_MARKER = '備考1：'  # これより前を削除
+NOTE_END_MARKER = 'ふるさと納税専用ページです'  # これより後を削除
+NOTE_REMOVE_TEXTS = ['[備考欄:]', '[配送日時指定:]', '１．', '指定なし']  # 削除する文字列（この順に削除）
+NOTE_REMOVE_PATTERN = re.compile("|".join(re.escape(text) for text in NOTE_REMOVE_TEXTS))
+
+
+def clean_note_texts(notes):
+    """
+    備考欄の列をまとめて加工する（各値にprocess_note_textを適用した結果と同じ）
+
+    備考を一意な値に分解（factorize）し、備考の種類ごとに1回だけ列単位の文字列処理で加工してから各行に展開する。
+    削除する文字列は、まず1つの正規表現で含む備考を絞り込み、含む備考だけNOTE_REMOVE_TEXTSの順に削除する
+    （1回の置換でまとめて削除すると「指定[備考欄:]なし」のように削除後にできた文字列が残り、結果が変わるため）。
+    """
+    codes, uniques = pd.factorize(notes)
+    if len(uniques) == 0:
+        return pd.Series("", index=notes.index, dtype='str')
+    texts = pd.Series([str(value) for value in uniques], dtype='str')
+
+    # ① 改行とスペースを削除
+    texts = texts.str.replace(NOTE_WHITESPACE_PATTERN, '', regex=True)
+
+    # ② 「備考1：」より前を削除
+    parts = texts.str.partition(NOTE_START_MARKER)
+    texts = parts[2].where(parts[1] != '', texts)
+
+    # ③ 「ふるさと納税専用ページです」より後を削除
+    texts = texts.str.partition(NOTE_END_MARKER)[0]
+
+    # ④ 特定のテキストを削除
+    has_remove_text = texts.str.contains(NOTE_REMOVE_PATTERN.pattern, regex=True).to_numpy(dtype=bool)
+    if has_remove_text.any():
+        removed = texts[has_remove_text]
+        for text in NOTE_REMOVE_TEXTS:
+            removed = removed.str.replace(text, '', regex=False)
+        texts = texts.where(~has_remove_text, removed)
+
+    # 前後の空白を削除し、空欄（欠損値）は空文字にして各行に展開
+    values = np.append(texts.str.strip().to_numpy(dtype=object), "")
+    return pd.Series(values[codes], index=notes.index, dtype='str')
+
+
+def find_today_delivery_csvs(folder_path, day=None):
+    """指定フォルダで今日ダウンロードした delivery_list*.csv を取得（download.pyのマニフェストがあればそのファイル、dayを指定した場合はその日のマニフェスト）"""
+    manifest_files = manifest_csv_paths(day)
+    if manifest_files:
+        print(f"対象CSVファイル数: {len(manifest_files)}（マニフェスト）")
+        return manifest_files
+    if day is not None:
+        raise FileNotFoundError(f"{day} のマニフェストに有効な delivery_list*.csv がありません")
+
     today = datetime.now().date()
     delivery_files = glob.glob(os.path.join(folder_path, 'delivery_list*.csv'))
 
@@ -95,13 +241,12 @@ def find_today_delivery_csvs(folder_path):
     return today_files
 
 
-def extract_unique_note_rows(csv_paths):
-    """CSVのAA列に備考がある行で、AK列（入金日）が昨日の日付の行を取得し、重複を除外して返す"""
+def extract_unique_note_rows(csv_paths, day=None):
+    """CSVのAA列に備考がある行で、AK列（入金日）が昨日（dayを指定した場合はその前日）の日付の行を取得し、重複を除外して返す"""
     all_rows = []
-    note_col = None
     
     # 昨日の日付を取得（YYYY/MM/DD形式）
-    yesterday = (datetime.now() - timedelta(days=1)).strftime("%Y/%m/%d")
+    yesterday = ((day or datetime.now().date()) - timedelta(days=1)).strftime("%Y/%m/%d")
 
     for csv_path in csv_paths:
         try:
@@ -111,77 +256,28 @@ def extract_unique_note_rows(csv_paths):
             print(f"  エラー詳細: {e}")
             continue
 
-        # AA列名が "AA" でない場合もあるため検索（「備考」列を優先、次に「配送用伝票備考」も確認）
-        current_note_col = None
-        for col in df.columns:
-            if col == "備考":  # まず完全一致を探す
-                current_note_col = col
-                break
-        
-        # 「備考」列が見つからない場合、「配送用伝票備考」も確認
-        if current_note_col is None:
-            for col in df.columns:
-                if col == "配送用伝票備考":
-                    current_note_col = col
-                    break
-        
-        if current_note_col is None:
-            for col in df.columns:
-                if "備考" in col:  # その他の備考列
-                    current_note_col = col
-                    break
+        # 列名から配送ID(A)・寄付者(D)・備考(AA)・入金日(AK)の列を探す（ヘッダーごとに1回だけ。必要な列がなければエラー）
+        columns = resolve_columns(df.columns, required=NOTE_REQUIRED_COLUMNS, optional=NOTE_OPTIONAL_COLUMNS, source=csv_path)
+        if "備考" not in columns and "配送用伝票備考" not in columns:
+            raise ValueError(f"CSV内に備考列(AA)が見つかりません: {csv_path}")
         
-        if current_note_col is None:
-            for col in df.columns:
-                if col == "AA":
-                    current_note_col = col
-                    break
-
-        if current_note_col is None:
-            raise ValueError("CSV内に備考列(AA)が見つかりません")
-        
-        # 最初のCSVファイルで見つかった備考列名を保存
-        if note_col is None:
-            note_col = current_note_col
-
-        # 入金日列を検索
-        payment_date_col = None
-        for col in df.columns:
-            if "入金" in col or col == "AK":
-                payment_date_col = col
-                break
-        
-        if payment_date_col is None:
+        if "入金日" not in columns:
             print(f"警告: {csv_path} に入金日列が見つかりません。スキップします。")
             continue
 
+        # 必要な列だけを残し、列名をそろえる
+        df = df[list(columns.values())]
+        df.columns = list(columns.keys())
+
         # 備考が空でない行、かつ入金日が昨日の日付の行を抽出
         # 「備考」列と「配送用伝票備考」列の両方をチェック
-        date_filter = (df[payment_date_col].astype(str).str.strip() == yesterday)
-        
-        # 「備考」列のフィルタ
-        note_col_filter = None
-        if "備考" in df.columns:
-            note_col_filter = (df["備考"].notna() & 
-                              (df["備考"].astype(str).str.strip() != "") &
-                              (df["備考"].astype(str).str.strip() != "nan"))
-        
-        # 「配送用伝票備考」列のフィルタ
-        delivery_note_filter = None
-        if "配送用伝票備考" in df.columns:
-            delivery_note_filter = (df["配送用伝票備考"].notna() & 
-                                   (df["配送用伝票備考"].astype(str).str.strip() != "") &
-                                   (df["配送用伝票備考"].astype(str).str.strip() != "nan"))
-        
-        # どちらかの備考列に値がある行を抽出
-        if note_col_filter is not None and delivery_note_filter is not None:
-            note_filter = note_col_filter | delivery_note_filter
-        elif note_col_filter is not None:
-            note_filter = note_col_filter
-        elif delivery_note_filter is not None:
-            note_filter = delivery_note_filter
-        else:
-            note_filter = pd.Series([False] * len(df), index=df.index)
+        date_filter = (df["入金日"].astype(str).str.strip() == yesterday)
+        note_filter = pd.Series(False, index=df.index)
+        for col in ["備考", "配送用伝票備考"]:
+            if col in df.columns:
+                note_filter |= (df[col].notna() &
+                                (df[col].astype(str).str.strip() != "") &
+                                (df[col].astype(str).str.strip() != "nan"))
         
         filtered = df[note_filter & date_filter]
         all_rows.append(filtered)
@@ -191,63 +287,22 @@ def extract_unique_note_rows(csv_paths):
 
     merged = pd.concat(all_rows, ignore_index=True)
 
-    # 備考の完全一致で重複を削除（マージ後に再度備考列を検索）
-    if note_col not in merged.columns:
-        # マージ後に備考列を再検索
-        for col in merged.columns:
-            if col == "備考":
-                note_col = col
-                break
-        if note_col not in merged.columns:
-            for col in merged.columns:
-                if "備考" in col and "配送用" not in col:
-                    note_col = col
-                    break
-    
+    # 備考の完全一致で重複を削除（「備考」列がない場合は「配送用伝票備考」列）
+    note_col = "備考" if "備考" in merged.columns else "配送用伝票備考"
     merged = merged.drop_duplicates(subset=[note_col])
 
-    # 必要な列を抽出（配送IDA, 寄付者D, 備考AA, 入金日AK）
-    required_cols = {
-        "A": None,
-        "D": None,
-        "AA": None,
-        "AK": None
-    }
-
-    # CSV内の実際の列名をマッピング
-    for col in merged.columns:
-        if (col.startswith("配送") and ("ID" in col or "管理" in col)) or col == "A":
-            required_cols["A"] = col
-        # D列（寄附者）を取得（「寄附者番号」を除外）
-        if col == "寄附者" or col == "寄付者":
-            required_cols["D"] = col
-        elif ("寄付者" in col or "寄附者" in col) and "番号" not in col and required_cols["D"] is None:
-            required_cols["D"] = col
-        # 備考列は既に見つけたnote_colを使用（「配送用伝票備考」を除外）
-        if col == note_col:
-            required_cols["AA"] = col
-        if "入金" in col or col == "AK":
-            required_cols["AK"] = col
-
-    # 未発見の列チェック
-    missing = [k for k, v in required_cols.items() if v is None]
-    if missing:
-        raise ValueError(f"CSV内に必要な列がありません: {missing}")
-
     # 備考列と配送用伝票備考列の両方を考慮して統合
     if "備考" in merged.columns and "配送用伝票備考" in merged.columns:
         # 両方の列がある場合、どちらか一方に値があれば使用
         merged["備考_統合"] = merged["備考"].fillna("") + merged["配送用伝票備考"].fillna("")
         merged["備考_統合"] = merged["備考_統合"].replace("", pd.NA)
-        required_cols["AA"] = "備考_統合"
-    elif "配送用伝票備考" in merged.columns and required_cols["AA"] is None:
-        required_cols["AA"] = "配送用伝票備考"
+        note_col = "備考_統合"
     
-    final_df = merged[[required_cols["A"], required_cols["D"], required_cols["AA"], required_cols["AK"]]].copy()
+    final_df = merged[["配送管理ID", "寄附者", note_col, "入金日"]].copy()
     final_df.columns = ["配送ID", "寄付者", "備考", "入金日"]
     
     # 備考欄の加工処理
-    final_df["備考"] = final_df["備考"].apply(process_note_text)
+    final_df["備考"] = clean_note_texts(final_df["備考"])
     
     # ④ この段階でAA列備考欄が空になった行は削除
     final_df = final_df[final_df["備考"] != ""]
@@ -261,69 +316,94 @@ def extract_unique_note_rows(csv_paths):
     return final_df
 
 
-def write_to_spreadsheet(df):
-    """備考欄シート A1 と A2 の間に行を挿入。A〜Dに値、F列にチェックボックス。"""
-    scope = ['https://spreadsheets.google.com/feeds',
-             'https://www.googleapis.com/auth/drive']
-
-    creds = ServiceAccountCredentials.from_json_keyfile_name(API_KEY_FILE, scope)
-    client = gspread.authorize(creds)
-
-    sheet = client.open_by_key(SPREADSHEET_ID).worksheet(SHEET_NAME)
-
-    # データ件数分、2行目に一度に行を追加（レート制限対策）
-    if len(df) > 0:
-        empty_rows = [[""] * 6] * len(df)
-        sheet.insert_rows(empty_rows, row=2)
-
-    # A〜D に書き込み（NaNを空文字列に変換）
+def open_note_sheet():
+    """
+    認証して備考欄シートを開く（同じプロセスでは認証済みのクライアントと開いたシートを使い回す）
+    """
+    global _client, _note_sheet
+    if _note_sheet is None:
+        if _client is None:
+            scope = ['https://spreadsheets.google.com/feeds',
+                     'https://www.googleapis.com/auth/drive']
+            creds = ServiceAccountCredentials.from_json_keyfile_name(API_KEY_FILE, scope)
+            _client = gspread.authorize(creds)
+        _note_sheet = _client.open_by_key(SPREADSHEET_ID).worksheet(SHEET_NAME)
+    return _note_sheet
+
+
+def cell_data(value):
+    """セルに書き込む値をbatchUpdateのCellData形式に変換（従来のvalueInputOption=RAWと同じ。空文字は空欄）"""
+    if isinstance(value, (bool, np.bool_)):
+        return {"userEnteredValue": {"boolValue": bool(value)}}
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        return {"userEnteredValue": {"numberValue": value.item() if hasattr(value, "item") else value}}
+    if value == "":
+        return {}
+    return {"userEnteredValue": {"stringValue": str(value)}}
+
+
+def build_note_requests(sheet_id, df):
+    """
+    備考欄シートの書き込みをまとめたbatchUpdateのリクエストを作成
+
+    2行目に件数分の行を挿入し（insertDimension）、A〜Dに値、F列にチェックボックス
+    （BOOLEANの入力規則とFalse）を書き込む（updateCells）
+    """
     values = df.fillna("").values.tolist()
-    if len(values) > 0:
-        sheet.update(range_name=f"A2:D{1 + len(values)}", values=values)
-
-    # F列にチェックボックスを追加（dataValidationを使用）
-    if len(df) > 0:
-        checkbox_range = f"F2:F{1 + len(values)}"
-        # チェックボックス形式を設定
-        requests = [{
-            "setDataValidation": {
+    checkbox = {
+        "userEnteredValue": {"boolValue": False},
+        "dataValidation": {"condition": {"type": "BOOLEAN"}, "showCustomUi": True},
+    }
+    rows = [
+        {"values": [cell_data(value) for value in row] + [{}] * (CHECKBOX_COLUMN_INDEX - len(row)) + [checkbox]}
+        for row in values
+    ]
+    return [
+        {
+            "insertDimension": {
                 "range": {
-                    "sheetId": sheet.id,
-                    "startRowIndex": 1,  # 2行目（0ベース）
-                    "endRowIndex": 1 + len(values),
-                    "startColumnIndex": 5,  # F列（0ベース）
-                    "endColumnIndex": 6
+                    "sheetId": sheet_id,
+                    "dimension": "ROWS",
+                    "startIndex": 1,  # 2行目（0ベース）
+                    "endIndex": 1 + len(values)
                 },
-                "rule": {
-                    "condition": {
-                        "type": "BOOLEAN"
-                    },
-                    "showCustomUi": True
+                "inheritFromBefore": False
+            }
+        },
+        {
+            "updateCells": {
+                "rows": rows,
+                "fields": "userEnteredValue,dataValidation",
+                "start": {
+                    "sheetId": sheet_id,
+                    "rowIndex": 1,  # 2行目（0ベース）
+                    "columnIndex": 0  # A列
                 }
             }
-        }]
-        sheet.spreadsheet.batch_update({"requests": requests})
-        
-        # ブール値Falseを設定（チェックボックスとして表示される）
-        # values_updateを使用してブール値を直接設定
-        false_values = [[False] for _ in range(len(values))]
-        sheet.spreadsheet.values_update(
-            range=f"{SHEET_NAME}!{checkbox_range}",
-            params={"valueInputOption": "USER_ENTERED"},
-            body={"values": false_values}
-        )
+        },
+    ]
+
+
+def write_to_spreadsheet(df):
+    """備考欄シート A1 と A2 の間に行を挿入。A〜Dに値、F列にチェックボックス。"""
+    if len(df) == 0:
+        return
+    sheet = open_note_sheet()
+
+    # 行の挿入・値・チェックボックスを1回のbatchUpdateで書き込む（レート制限対策）
+    sheet.spreadsheet.batch_update({"requests": build_note_requests(sheet.id, df)})
 
     print(f"スプレッドシートへの書き込み完了！ ({len(df)}件)")
 
 
-def main():
+def main(day=None):
     folder_path = "/Users/nj-cmd11/Downloads"  # 必要に応じて変更
 
-    # 1. CSV取得
-    csvs = find_today_delivery_csvs(folder_path)
+    # 1. CSV取得（dayを指定した場合はその日のマニフェストのファイル）
+    csvs = find_today_delivery_csvs(folder_path, day)
 
     # 2-3. 備考あり行を抽出し加工
-    df = extract_unique_note_rows(csvs)
+    df = extract_unique_note_rows(csvs, day)
 
     if df.empty:
         print("備考のある行がありませんでした。")
@@ -334,4 +414,6 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    # 使い方: python3 bikou.py [--date YYYY-MM-DD]（--dateでその日のマニフェストのCSVファイルを処理）
+    args = sys.argv[1:]
+    main(datetime.strptime(args[args.index("--date") + 1], "%Y-%m-%d").date() if "--date" in args else None)
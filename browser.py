@@ -0,0 +1,216 @@
+import os
+import json
+import time
+import contextlib
+from selenium import webdriver
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import TimeoutException
+
+from atomic_file import atomic_write
+
+# ダウンロードディレクトリのパス
+DOWNLOAD_DIR = "/Users/nj-cmd11/Downloads"
+
+# ポータル設定
+BASE_URL = "https://do3.do-furusato.com"
+LOGIN_URL = "https://do3.do-furusato.com/deliveries"
+COOKIE_FILE = "browser_cookies.json"  # ログイン後のCookie（次回の実行でログインを省くため）
+
+# 待機時間の上限（秒）
+PAGE_LOAD_TIMEOUT = 20  # ページの読み込み
+LOGIN_TIMEOUT = 15  # ログインボタンを押してから画面が移動する（またはエラーのアラートが出る）まで
+
+# 実行中に共有するブラウザ（get_sessionで起動し、close_sessionで終了）
+_driver = None
+
+# 手順ごとの所要時間（stepで記録し、print_step_reportで表示）
+_step_times = []
+
+
+def create_driver():
+    """ダウンロード先を指定したヘッドレスのChromeを起動します。"""
+    # --- ヘッドレス用オプション ---
+    options = webdriver.ChromeOptions()
+    options.add_argument("--headless")           # ヘッドレスモード
+    options.add_argument("--no-sandbox")         # Linuxで権限関連エラー回避
+    options.add_argument("--disable-dev-shm-usage") # メモリ不足対策
+    options.add_argument("--window-size=1920,1080") # 画面サイズを指定
+    options.add_argument("--disable-gpu")        # GPU無効化（Windowsなら推奨）
+
+    # ダウンロードディレクトリを指定
+    prefs = {
+        "download.default_directory": DOWNLOAD_DIR,
+        "download.prompt_for_download": False,
+        "download.directory_upgrade": True,
+        # 複数ファイルを続けてダウンロードしても確認を出さない（download.pyでまとめてダウンロードするため）
+        "profile.default_content_setting_values.automatic_downloads": 1
+    }
+    options.add_experimental_option("prefs", prefs)
+
+    # WebDriverの初期化（Chromeを想定）
+    return webdriver.Chrome(options=options)
+
+
+@contextlib.contextmanager
+def step(name):
+    """ブラウザ操作の手順の所要時間を記録します。"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _step_times.append((name, time.perf_counter() - start))
+
+
+def print_step_report():
+    """記録した手順ごとの所要時間を表示し、記録を消去します。"""
+    if not _step_times:
+        return
+    print()
+    print(f"{'手順':<32} {'所要時間(s)':>10}")
+    for name, elapsed in _step_times:
+        print(f"{name:<32} {elapsed:>10.2f}")
+    print(f"{'合計':<32} {sum(elapsed for _, elapsed in _step_times):>10.2f}")
+    _step_times.clear()
+
+
+def wait_for_page_ready(driver, timeout=PAGE_LOAD_TIMEOUT):
+    """ページの読み込みが終わり、実行中のAjax通信（jQuery）がなくなるまで待機します。"""
+    WebDriverWait(driver, timeout).until(
+        lambda d: d.execute_script(
+            "return document.readyState === 'complete' && (!window.jQuery || window.jQuery.active === 0);"
+        )
+    )
+
+
+def wait_for_mask_hidden(driver, timeout=10):
+    """検索中などに画面を覆うマスク（#mask）が消えるまで待機します。"""
+    WebDriverWait(driver, timeout).until(EC.invisibility_of_element_located((By.ID, "mask")))
+
+
+def login_finished(driver):
+    """ログインボタンを押した後、エラーのアラートが出たか、ログインフォームがなくなったかを返します。"""
+    if EC.alert_is_present()(driver):
+        return True
+    return not driver.find_elements(By.NAME, "username")
+
+
+def login(driver):
+    """ポータルにログインします。ログインに失敗した場合は例外を発生させます。"""
+    # 1-1. DOにログインする
+    print("ログイン中...")
+    with step("login.open"):
+        driver.get(LOGIN_URL)
+        # ユーザー名とパスワードフィールドを取得
+        username_field = WebDriverWait(driver, PAGE_LOAD_TIMEOUT).until(
+            EC.element_to_be_clickable((By.NAME, "username"))
+        )
+        password_field = driver.find_element(By.NAME, "password")
+
+    with step("login.submit"):
+        # フィールドをクリアしてから入力
+        username_field.clear()
+        username_field.send_keys("a.tsuyuzaki@nnk")
+        password_field.clear()
+        password_field.send_keys("=fCK(2WR$ESe")
+        driver.find_element(By.ID, "loginBtn1").click()
+
+        # 画面が移動する（成功）か、アラートが出る（失敗）まで待機
+        try:
+            WebDriverWait(driver, LOGIN_TIMEOUT).until(login_finished)
+        except TimeoutException:
+            raise Exception(f"ログインに失敗しました: {LOGIN_TIMEOUT}秒待ってもログイン画面から移動しませんでした")
+
+    # ログイン失敗時のアラートを処理
+    alert = EC.alert_is_present()(driver)
+    if alert:
+        alert_text = alert.text
+        print(f"エラー: {alert_text}")
+        alert.accept()
+        raise Exception(f"ログインに失敗しました: {alert_text}")
+    print("ログイン成功を確認しました。")
+
+
+def is_logged_in(driver):
+    """配送検索を開き、ログインフォームが表示されなければログイン済みとみなします。"""
+    with step("session.check"):
+        driver.get(LOGIN_URL)
+        wait_for_page_ready(driver)
+        return not driver.find_elements(By.NAME, "username")
+
+
+def save_cookies(driver, path=COOKIE_FILE):
+    """ログイン後のCookieを保存します。"""
+    with atomic_write(path) as f:
+        json.dump(driver.get_cookies(), f)
+
+
+def load_cookies(driver, path=COOKIE_FILE):
+    """保存したCookieをブラウザに設定します。設定できた場合はTrueを返します。"""
+    if not os.path.exists(path):
+        return False
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            cookies = json.load(f)
+        # Cookieはそのドメインのページを開いてからでないと設定できない
+        with step("session.load_cookies"):
+            driver.get(BASE_URL)
+            for cookie in cookies:
+                driver.add_cookie(cookie)
+        return True
+    except Exception as e:
+        print(f"保存したCookieを読み込めませんでした: {e}")
+        return False
+
+
+def ensure_logged_in(driver):
+    """
+    ログイン済みでなければログインします。
+
+    保存したCookieでログイン済みの状態に戻せる場合はログインを省き、
+    セッションが切れている場合だけログインし直してCookieを保存します。
+    """
+    if is_logged_in(driver):
+        return
+    if load_cookies(driver) and is_logged_in(driver):
+        print("保存したセッションでログインしました。")
+        return
+    login(driver)
+    save_cookies(driver)
+
+
+def get_session():
+    """実行中に共有するログイン済みのブラウザを返します（初回だけ起動します）。"""
+    global _driver
+    if _driver is None:
+        _driver = create_driver()
+    ensure_logged_in(_driver)
+    return _driver
+
+
+def close_session():
+    """共有しているブラウザを終了します。"""
+    global _driver
+    if _driver is not None:
+        _driver.quit()
+        _driver = None
+
+
+@contextlib.contextmanager
+def session(driver=None):
+    """
+    ログイン済みのブラウザを使う区間を作ります。
+
+    driverを渡した場合（pipeline.pyの共有ブラウザ）はそれをそのまま使い、終了しません。
+    省略した場合（スクリプトを単体で実行した場合）はブラウザを起動してログインし、区間の終わりに終了します。
+    """
+    if driver is not None:
+        yield driver
+        return
+    driver = create_driver()
+    try:
+        ensure_logged_in(driver)
+        yield driver
+    finally:
+        driver.quit()
@@ -6,15 +6,26 @@ import numpy as np
 from datetime import datetime, timedelta
 import re
 
+from ingest import read_delivery_csv, read_export_header
+from manifest import manifest_csv_paths
+from schema import resolve_columns
+
 # テストコミット02
 # Settings
 SPREADSHEET_ID = "1swzp4-ISlM769K_dKR1BpdwQSkV19YmhHZuzwaXQCdI"
 SHEET_NAME_DEBUG = "デバッグ"
 API_KEY_FILE = "key.json"
 
+# 読み込む列（schema.pyのCOLUMN_RULESの列。従来のA,D,I,Q,S,W,AG,AH,AJ列。この順にスプレッドシートに書き込む）
+DEBUG_COLUMNS = ['配送管理ID', '寄附者', 'お届け先名', '配送ステータス', '返礼品', '出荷予定日', '申込日', '出荷日', '商品コード']
+
 def find_today_delivery_csvs(folder_path):
-    """指定されたフォルダ内で今日ダウンロードしたdelivery_listから始まるCSVファイルを全て取得します。"""
+    """指定されたフォルダ内で今日ダウンロードしたdelivery_listから始まるCSVファイルを全て取得します（download.pyのマニフェストがあればそのファイル）。"""
     from datetime import datetime
+
+    manifest_files = manifest_csv_paths()
+    if manifest_files:
+        return manifest_files
     
     # 今日の日付を取得
     today = datetime.now().date()
@@ -79,11 +90,15 @@ try:
     today_csv_files = find_today_delivery_csvs(downloads_folder)
     print(f"今日ダウンロードしたdelivery_listファイル: {[os.path.basename(f) for f in today_csv_files]}")
 
-    # 複数のCSVファイルを読み込んで統合
+    # 複数のCSVファイルから指定された列のみを読み込んで統合（列はCSVの列名から探し、DEBUG_COLUMNSの順に並べる）
     dataframes = []
     for csv_file in today_csv_files:
+        # 必要な列がないCSVがあれば、残りのファイルを読み込まずに終了する
+        columns = resolve_columns(read_export_header(csv_file), required=DEBUG_COLUMNS, source=csv_file)
         try:
-            df_temp = pd.read_csv(csv_file, encoding='cp932')
+            df_temp = read_delivery_csv(csv_file, columns=list(columns.values()), typed=False)
+            df_temp = df_temp[list(columns.values())]
+            df_temp.columns = list(columns.keys())
             dataframes.append(df_temp)
             print(f"CSVファイル「{os.path.basename(csv_file)}」をCP932で読み込みました。（{len(df_temp)}行）")
         except Exception as e:
@@ -94,29 +109,8 @@ try:
         raise FileNotFoundError("有効なCSVファイルが読み込めませんでした。")
     
     # データフレームを結合
-    df_combined = pd.concat(dataframes, ignore_index=True)
-    print(f"合計{len(dataframes)}件のCSVファイルを結合しました。（{len(df_combined)}行）")
-    
-    # 指定された列のみを抽出（A,D,Q,R,S,U,W,AA,AG列）
-    # 列インデックス: 
-    # A配送管理ID=0, 
-    # D寄附者=3, 
-    # Iお届け先名=8, 
-    # J届け先名称カナ=9, 
-    # K届け先郵便番号=10, 
-    # L届け先都道府県=11, 
-    # Q配送ステータス=16, 
-    # S返礼品=18, 
-    # U事業者名称=20, 
-    # W出荷予定日=22, 
-    # AA備考=26, 
-    # AG申込日=32, 
-    # AH出荷日=33, 
-    # AJ商品コード=35
-    selected_columns = [0, 3, 8, 16, 18, 22, 32, 33, 35]
-    # selected_columns = [0, 3, 8, 16, 18, 22, 26, 33, 35]
-    df_filtered = df_combined.iloc[:, selected_columns]
-    
+    df_filtered = pd.concat(dataframes, ignore_index=True)
+    print(f"合計{len(dataframes)}件のCSVファイルを結合しました。（{len(df_filtered)}行）")
     print(f"列を絞り込みました。抽出列数: {len(df_filtered.columns)}列")
     
     # 統合されたデータをスプレッドシートに書き込み
@@ -1,130 +1,90 @@
-import time
 import os
-import glob
-from selenium import webdriver
+import sys
+import time
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import requests
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import NoSuchElementException, TimeoutException
 from selenium.webdriver.common.keys import Keys
 
-# ダウンロードディレクトリのパス
-DOWNLOAD_DIR = "/Users/nj-cmd11/Downloads"
+from browser import DOWNLOAD_DIR, session, step, print_step_report
+from manifest import write_manifest
+from download_watch import watch_downloads, pairs_in_creation_order, expect_download, wait_for_downloads, print_download_report
+
+# ポータル設定
+PRINT_MANAGEMENT_URL = "https://do3.do-furusato.com/print-management"
+EXPORT_USER_NAME = "露崎 藍"  # 印刷管理の名前列（search.pyでエクスポートを依頼したユーザー）
+
+# エクスポート完了の待機設定
+EXPORT_READY_TIMEOUT = 900  # 最大待機時間（秒）
+EXPORT_POLL_INITIAL_DELAY = 5  # 初回の再確認までの待機時間（秒）
+EXPORT_POLL_MAX_DELAY = 30  # 再確認の間隔の上限（秒）
+
+# クリックでダウンロードする場合の設定
+CLICK_DOWNLOAD_BATCH = True  # True: 全行をクリックしてからまとめて完了を待つ / False: 1行ずつ完了を待つ
+DOWNLOAD_COMPLETE_TIMEOUT = 60  # ダウンロード完了の待機時間（秒、まとめて待つ場合は全ファイルで）
+
+# ダウンロード方法
+DOWNLOAD_MODE = "http"  # "http": リンク先をHTTPで並行して取得 / "click": リンクを1件ずつクリック（従来の方法）
 
-def wait_for_download_complete(timeout=60):
+# HTTPでのダウンロード設定
+HTTP_DOWNLOAD_WORKERS = 4  # 同時に取得するファイル数
+HTTP_DOWNLOAD_TIMEOUT = 60  # 接続・読み込みの待機時間（秒）
+HTTP_DOWNLOAD_CHUNK_SIZE = 1024 * 1024  # ディスクに書き込む単位（バイト）
+EXPORT_FILE_PREFIX = "delivery_list_"  # 保存するファイル名の先頭（edit.py・bikou.py・debug.pyのdelivery_list*.csvに合わせる）
+
+# 印刷管理の日付列の書式（時刻がない場合は日付だけで判定）
+EXPORT_TIME_FORMATS = ["%Y/%m/%d %H:%M:%S", "%Y/%m/%d %H:%M", "%Y/%m/%d"]
+
+def parse_export_time(text):
     """
-    ダウンロードディレクトリ内の.downloadファイルがなくなるまで待機する
+    印刷管理の日付列の文字列を日時に変換します。
+
+    Returns:
+        (日時, 時刻を含むかどうか) のタプル。変換できない場合は (None, False)
     """
-    start_time = time.time()
-    while time.time() - start_time < timeout:
-        # .downloadファイルを検索
-        download_files = glob.glob(os.path.join(DOWNLOAD_DIR, "*.download"))
-        if len(download_files) == 0:
-            print("すべてのダウンロードが完了しました。")
-            return True
-        print(f"ダウンロード中... ({len(download_files)}個のファイルがダウンロード中)")
-        time.sleep(1)
-    
-    # タイムアウト時も残っている.downloadファイルを報告
-    remaining_files = glob.glob(os.path.join(DOWNLOAD_DIR, "*.download"))
-    if remaining_files:
-        print(f"警告: {len(remaining_files)}個の.downloadファイルが残っています: {remaining_files}")
-        return False
-    return True
-
-# --- ヘッドレス用オプション ---
-options = webdriver.ChromeOptions()
-options.add_argument("--headless")           # ヘッドレスモード
-options.add_argument("--no-sandbox")         # Linuxで権限関連エラー回避
-options.add_argument("--disable-dev-shm-usage") # メモリ不足対策
-options.add_argument("--window-size=1920,1080") # 画面サイズを指定
-options.add_argument("--disable-gpu")        # GPU無効化（Windowsなら推奨）
-
-# ダウンロードディレクトリを指定
-prefs = {
-    "download.default_directory": DOWNLOAD_DIR,
-    "download.prompt_for_download": False,
-    "download.directory_upgrade": True
-}
-options.add_experimental_option("prefs", prefs)
-
-# WebDriverの初期化（Chromeを想定）
-driver = webdriver.Chrome(options=options)
-
-# クリック補助（オーバーレイ除去とJSクリックのフォールバック）
-def safe_click(elem):
-    # 画面を覆う拡張のオーバーレイを除去
-    driver.execute_script("""
-    const overlay = document.getElementById('desk-compass-snippet');
-    if (overlay) overlay.remove();
-    """)
-    driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", elem)
-    try:
-        WebDriverWait(driver, 5).until(EC.element_to_be_clickable(elem))
-        elem.click()
-    except Exception:
-        # JSクリックにフォールバック
-        driver.execute_script("arguments[0].click();", elem)
-
-try:
-    # 1-1. DOにログインする
-    print("ログイン中...")
-    driver.get("https://do3.do-furusato.com/deliveries")
-    time.sleep(2)
-    
-    # ユーザー名とパスワードフィールドを取得
-    username_field = driver.find_element(By.NAME, "username")
-    password_field = driver.find_element(By.NAME, "password")
-    
-    # フィールドをクリアしてから入力
-    username_field.clear()
-    username_field.send_keys("a.tsuyuzaki@nnk")
-    time.sleep(0.5)
-    
-    password_field.clear()
-    password_field.send_keys("=fCK(2WR$ESe")
-    time.sleep(0.5)
-    
-    driver.find_element(By.ID, "loginBtn1").click()
-    time.sleep(3)
-    
-    # ログイン失敗時のアラートを処理
-    try:
-        WebDriverWait(driver, 3).until(EC.alert_is_present())
-        alert = driver.switch_to.alert
-        alert_text = alert.text
-        print(f"エラー: {alert_text}")
-        alert.accept()
-        raise Exception(f"ログインに失敗しました: {alert_text}")
-    except TimeoutException:
-        # アラートが表示されない場合はログイン成功とみなす
-        print("ログイン成功を確認しました。")
-    except Exception as e:
-        if "ログインに失敗" in str(e):
-            raise
-        # その他のエラーは無視（アラートがない場合）
-        pass
+    for time_format in EXPORT_TIME_FORMATS:
+        try:
+            return datetime.strptime(text, time_format), time_format != "%Y/%m/%d"
+        except ValueError:
+            continue
+    return None, False
+
+def find_today_export_rows(driver, requested_after=None, export_times=None):
+    """
+    印刷管理のテーブルから、今日EXPORT_USER_NAMEが依頼したエクスポートの行を探します。
 
+    Args:
+        driver: ログイン済みのWebDriver
+        requested_after: この日時（分単位）より前に作成された行は対象外にする（時刻がない行は日付だけで判定）
+        export_times: 指定した場合、合致した行の {行のインデックス: 作成日時（時刻がない行はNone）} を格納する
+
+    Returns:
+        条件に合致する行のインデックスのリスト。必要な列が見つからない場合はNone
+    """
     # 1-5. 印刷管理に移動する
     print("印刷管理に移動中...")
-    driver.get("https://do3.do-furusato.com/print-management")
-    
+    driver.get(PRINT_MANAGEMENT_URL)
+
     # テーブルの行を取得
     data_rows = WebDriverWait(driver, 20).until(
         EC.presence_of_all_elements_located((By.CSS_SELECTOR, "table.p-table__dataList tbody tr"))
     )
-    
+
     print(f"テーブルから{len(data_rows)}行を取得しました。")
-    
+
     # ヘッダー行から列のインデックスを取得
     header_row = WebDriverWait(driver, 10).until(
         EC.presence_of_element_located((By.CSS_SELECTOR, "table.p-table__dataList thead tr"))
     )
-    
+
     # ヘッダーから日付列と名前列のインデックスを取得
     date_column_index = None
     name_column_index = None
-    
+
     header_cells = header_row.find_elements(By.CSS_SELECTOR, "th")
     for i, cell in enumerate(header_cells):
         cell_text = cell.text.strip()
@@ -134,82 +94,346 @@ try:
         elif "u-w10par" in cell.get_attribute("class"):
             name_column_index = i
             print(f"名前列のインデックス: {i} (クラス: {cell.get_attribute('class')})")
-    
+
     if date_column_index is None or name_column_index is None:
         print("必要な列が見つかりませんでした。")
-        driver.quit()
-        exit()
-    
+        return None
+
     # 今日の日付を取得
-    from datetime import datetime
     today = datetime.now().strftime("%Y/%m/%d")
     print(f"今日の日付: {today}")
-    
+    if requested_after is not None:
+        requested_after = requested_after.replace(second=0, microsecond=0)
+
     # 条件に合致する行を検索
     matching_rows = []
     for i, row in enumerate(data_rows):
         try:
             # 指定された列インデックスのtd要素を取得
             row_cells = row.find_elements(By.CSS_SELECTOR, "td")
-            
+
             if len(row_cells) > max(date_column_index, name_column_index):
                 date_text = row_cells[date_column_index].text.strip()
                 name_text = row_cells[name_column_index].text.strip()
-                
+
                 # 日付から時間部分を除去して日付のみを取得
                 date_only = date_text.split()[0] if ' ' in date_text else date_text
-                
-                # 条件チェック：今日の日付かつ「露崎 藍」
-                if date_only == today and name_text == "露崎 藍":
+
+                # 条件チェック：今日の日付かつEXPORT_USER_NAME
+                if date_only == today and name_text == EXPORT_USER_NAME:
+                    # 依頼より前に作成された行（同じ日の以前のエクスポート）は対象外
+                    created_at, has_time = parse_export_time(date_text)
+                    if requested_after is not None and has_time and created_at < requested_after:
+                        continue
                     matching_rows.append(i)
+                    if export_times is not None:
+                        export_times[i] = created_at if has_time else None
                     print(f"条件に合致: 行{i+1}")
             else:
                 pass
-                
+
         except Exception as e:
             continue
-    
+
     print(f"条件に合致する行数: {len(matching_rows)}行")
-    
-    # 条件に合致する行のCSVファイルをダウンロード（リフレッシュせず順番に処理）
-    for count, row_index in enumerate(matching_rows, 1):
-        print(f"{count}番目のCSVファイルをダウンロード中...")
+    return matching_rows
+
+def count_downloadable_rows(driver, row_indices):
+    """指定した行のうち、ダウンロードリンクが表示されている行の数を返します。"""
+    data_rows = driver.find_elements(By.CSS_SELECTOR, "table.p-table__dataList tbody tr")
+    count = 0
+    for row_index in row_indices:
+        if row_index < len(data_rows) and data_rows[row_index].find_elements(By.CSS_SELECTOR, "td.u-ta-c a"):
+            count += 1
+    return count
+
+def wait_for_export_ready(driver, requested_after=None, timeout=EXPORT_READY_TIMEOUT, min_rows=1):
+    """
+    今日のエクスポートの行が印刷管理に表示され、ダウンロードできるようになるまで待機します。
+
+    再確認の間隔はEXPORT_POLL_INITIAL_DELAYから倍々に延ばし、EXPORT_POLL_MAX_DELAYで頭打ちにします。
+
+    Args:
+        driver: ログイン済みのWebDriver
+        requested_after: search.pyでエクスポートを依頼した日時
+        timeout: 最大待機時間（秒）
+        min_rows: 必要なエクスポートの行数
+
+    Returns:
+        準備ができた場合はTrue、タイムアウトした場合はFalse
+    """
+    start_time = time.time()
+    attempt = 0
+    while True:
         try:
-            # テーブルの行を再取得（リフレッシュはしない）
-            data_rows = WebDriverWait(driver, 20).until(
-                EC.presence_of_all_elements_located((By.CSS_SELECTOR, "table.p-table__dataList tbody tr"))
-            )
-            if row_index >= len(data_rows):
-                print(f"行インデックス{row_index}が範囲外です。")
+            matching_rows = find_today_export_rows(driver, requested_after)
+        except TimeoutException:
+            # テーブルに行がまだない
+            matching_rows = []
+        if matching_rows is None:
+            return False
+        ready_count = count_downloadable_rows(driver, matching_rows)
+        elapsed = time.time() - start_time
+        if ready_count >= min_rows:
+            print(f"エクスポートの準備ができました。（{ready_count}件、{elapsed:.0f}秒待機）")
+            return True
+
+        remaining = timeout - elapsed
+        if remaining <= 0:
+            print(f"警告: {timeout}秒待ってもエクスポートの準備ができませんでした。（{ready_count}/{min_rows}件）")
+            return False
+
+        # 指数バックオフで再確認までの待機時間を計算（残り時間を超えない）
+        delay = min(EXPORT_POLL_INITIAL_DELAY * (2 ** attempt), EXPORT_POLL_MAX_DELAY, remaining)
+        print(f"エクスポートの準備ができていません（{ready_count}/{min_rows}件）。{delay:.0f}秒後に再確認します...")
+        time.sleep(delay)
+        attempt += 1
+
+def wait_for_export(requested_after=None, timeout=EXPORT_READY_TIMEOUT, driver=None):
+    """今日のエクスポートがダウンロードできるようになるまで待機します（driver省略時はブラウザを起動してログイン）。"""
+    with session(driver) as driver, step("download.wait_export"):
+        ready = wait_for_export_ready(driver, requested_after, timeout)
+    print_step_report()
+    return ready
+
+def export_file_name(row_index, day=None):
+    """エクスポートの行を保存するファイル名を返します（同じ日の同じ行は常に同じ名前）。"""
+    day = day or datetime.now()
+    return f"{EXPORT_FILE_PREFIX}{day:%Y%m%d}_{row_index + 1:02d}.csv"
+
+def find_export_links(driver, row_indices):
+    """
+    指定した行のダウンロードリンクのURLを取得します。
+
+    Returns:
+        {行のインデックス: URL} の辞書（URLがhttp(s)でない行は含まない）
+    """
+    data_rows = driver.find_elements(By.CSS_SELECTOR, "table.p-table__dataList tbody tr")
+    links = {}
+    for row_index in row_indices:
+        if row_index >= len(data_rows):
+            continue
+        anchors = data_rows[row_index].find_elements(By.CSS_SELECTOR, "td.u-ta-c a")
+        href = anchors[0].get_attribute("href") if anchors else None
+        if href and href.startswith(("http://", "https://")):
+            links[row_index] = href
+    return links
+
+def create_http_session(cookies, user_agent=None, workers=HTTP_DOWNLOAD_WORKERS):
+    """
+    ブラウザのCookieを引き継いだHTTPセッションを作成します。
+
+    Args:
+        cookies: driver.get_cookies()と同じ形式のCookieのリスト
+        user_agent: ブラウザのUser-Agent（省略時はrequestsの既定値）
+        workers: 同時に取得するファイル数（接続プールの大きさ）
+    """
+    http = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+    http.mount("http://", adapter)
+    http.mount("https://", adapter)
+    for cookie in cookies:
+        http.cookies.set(cookie['name'], cookie['value'], domain=cookie.get('domain', ''), path=cookie.get('path', '/'))
+    if user_agent:
+        http.headers['User-Agent'] = user_agent
+    return http
+
+def fetch_export(http, url, path, chunk_size=HTTP_DOWNLOAD_CHUNK_SIZE):
+    """
+    1つのエクスポートをHTTPで取得し、ディスクに直接書き込みます。
+
+    取得中は「.part」を付けた名前で書き込み、完了してから本来の名前に変更します。
+
+    Returns:
+        (ファイルサイズ（バイト）, 所要時間（秒）) のタプル
+    """
+    start = time.perf_counter()
+    tmp_path = path + ".part"
+    try:
+        with http.get(url, stream=True, timeout=HTTP_DOWNLOAD_TIMEOUT) as response:
+            response.raise_for_status()
+            if 'text/html' in response.headers.get('Content-Type', ''):
+                raise ValueError("CSVではなくHTMLが返されました（ログインが切れている可能性があります）")
+            size = 0
+            with open(tmp_path, 'wb') as f:
+                for chunk in response.iter_content(chunk_size):
+                    f.write(chunk)
+                    size += len(chunk)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return size, time.perf_counter() - start
+
+def fetch_exports(links, cookies, dest_dir=DOWNLOAD_DIR, user_agent=None, workers=HTTP_DOWNLOAD_WORKERS, day=None):
+    """
+    エクスポートのリンク先をHTTPで並行して取得します。
+
+    Args:
+        links: {行のインデックス: URL} の辞書
+        cookies: driver.get_cookies()と同じ形式のCookieのリスト
+        dest_dir: 保存先のディレクトリ
+        user_agent: ブラウザのUser-Agent
+        workers: 同時に取得するファイル数
+        day: ファイル名に使う日付（省略時は今日）
+
+    Returns:
+        (保存したファイル {行のインデックス: パス}, 失敗した行 {行のインデックス: エラー}) のタプル
+    """
+    saved = {}
+    failed = {}
+    with create_http_session(cookies, user_agent, workers) as http, ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {}
+        for row_index, url in links.items():
+            path = os.path.join(dest_dir, export_file_name(row_index, day))
+            futures[executor.submit(fetch_export, http, url, path)] = (row_index, path)
+        for future in as_completed(futures):
+            row_index, path = futures[future]
+            try:
+                size, elapsed = future.result()
+            except Exception as e:
+                failed[row_index] = e
+                print(f"行{row_index + 1}のCSVをHTTPで取得できませんでした: {e}")
                 continue
+            saved[row_index] = path
+            print(f"行{row_index + 1}のCSVを保存しました: {os.path.basename(path)}（{size / (1024 * 1024):.1f}MB、{elapsed:.1f}秒）")
+    return saved, failed
+
+def main(driver=None, mode=DOWNLOAD_MODE):
+    """
+    印刷管理から今日エクスポートしたCSVファイルをダウンロードします。
+
+    Args:
+        driver: ログイン済みのWebDriver（省略時はブラウザを起動してログインし、終了時に閉じる）
+        mode: "http"（リンク先をHTTPで並行して取得）または "click"（リンクを1件ずつクリック）
+    """
+    with session(driver) as driver:
+        download_today_exports(driver, mode)
+    print_step_report()
+
+def download_today_exports(driver, mode=DOWNLOAD_MODE):
+    """
+    印刷管理の今日のエクスポートの行をダウンロードします（HTTPで取得できなかった行はクリックでダウンロード）。
+
+    ダウンロードしたファイルはマニフェスト（manifest.py）に記録し、edit.py・bikou.py・debug.pyはそこから読み込むファイルを決めます。
+    """
+    export_times = {}
+    with step("download.find_rows"):
+        matching_rows = find_today_export_rows(driver, export_times=export_times)
+    if matching_rows is None:
+        return
+
+    downloaded = {}
+    if mode == "http" and matching_rows:
+        saved = download_rows_over_http(driver, matching_rows)
+        downloaded.update(saved)
+        matching_rows = [row_index for row_index in matching_rows if row_index not in saved]
+        if matching_rows:
+            print(f"HTTPで取得できなかった{len(matching_rows)}件をクリックでダウンロードします。")
+        else:
+            print("CSVファイルのダウンロード処理を完了しました。")
+
+    if matching_rows or not downloaded:
+        clicked = click_download_rows(driver, matching_rows)
+        downloaded.update({row_index: path for row_index, (path, _) in clicked.items()})
+
+    if downloaded:
+        write_manifest(downloaded, export_times=export_times)
+
+def download_rows_over_http(driver, row_indices):
+    """
+    指定した行のCSVをブラウザのCookieを使ってHTTPで並行して取得します。
+
+    Returns:
+        取得できた行の {行のインデックス: 保存したファイルのパス} の辞書
+    """
+    links = find_export_links(driver, row_indices)
+    if not links:
+        print("ダウンロードリンクのURLを取得できませんでした。")
+        return {}
+    print(f"{len(links)}件のCSVファイルをHTTPで取得中...（同時に{HTTP_DOWNLOAD_WORKERS}件）")
+    user_agent = driver.execute_script("return navigator.userAgent;")
+    with step("download.http_fetch"):
+        saved, _ = fetch_exports(links, driver.get_cookies(), DOWNLOAD_DIR, user_agent)
+    return saved
+
+def click_download_rows(driver, matching_rows, batch=CLICK_DOWNLOAD_BATCH):
+    """
+    指定した行のダウンロードリンクを順にクリックしてダウンロードします。
+
+    batchがTrueの場合は全行のダウンロードを続けて開始してからまとめて完了を待つため、
+    全体の時間は各ファイルの合計ではなく最も遅いファイルの時間程度になります。
+    ただし、ファイルと行を作られた順に対応させられない場合（inotifyがないmacOSなどのポーリング）は、
+    別の行のファイルと取り違えないよう1行ずつダウンロードします。
+
+    Returns:
+        {行のインデックス: (保存されたファイルのパス, 所要時間（秒）)} の辞書（完了した行のみ）
+    """
+    # クリック補助（オーバーレイ除去とJSクリックのフォールバック）
+    def safe_click(elem):
+        # 画面を覆う拡張のオーバーレイを除去
+        driver.execute_script("""
+        const overlay = document.getElementById('desk-compass-snippet');
+        if (overlay) overlay.remove();
+        """)
+        driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", elem)
+        try:
+            WebDriverWait(driver, 5).until(EC.element_to_be_clickable(elem))
+            elem.click()
+        except Exception:
+            # JSクリックにフォールバック
+            driver.execute_script("arguments[0].click();", elem)
+
+    # 条件に合致する行のCSVファイルをダウンロード（リフレッシュせず順番にクリック）
+    downloaded = {}
+    with watch_downloads(DOWNLOAD_DIR) as watch:
+        if batch and not pairs_in_creation_order(watch):
+            print("ダウンロードの監視がポーリングのため、1行ずつダウンロードします。")
+            batch = False
+        for count, row_index in enumerate(matching_rows, 1):
+            print(f"{count}番目のCSVファイルをダウンロード中...")
+            try:
+                with step(f"download.click_row{row_index + 1}"):
+                    # テーブルの行を再取得（リフレッシュはしない）
+                    data_rows = WebDriverWait(driver, 20).until(
+                        EC.presence_of_all_elements_located((By.CSS_SELECTOR, "table.p-table__dataList tbody tr"))
+                    )
+                    if row_index >= len(data_rows):
+                        print(f"行インデックス{row_index}が範囲外です。")
+                        continue
+
+                    download_link = data_rows[row_index].find_element(By.CSS_SELECTOR, "td.u-ta-c a")
+                    expect_download(watch, row_index)
+                    safe_click(download_link)
+
+                    # アラートにOK
+                    WebDriverWait(driver, 5).until(EC.alert_is_present())
+                    alert = driver.switch_to.alert
+                    alert.accept()
+                    print(f"{count}番目のCSVファイルのダウンロードを開始しました。")
+
+                # 1行ずつ処理する場合は、この行のファイルが保存されるまで待機
+                if not batch:
+                    with step(f"download.wait_row{row_index + 1}"):
+                        downloaded.update(wait_for_downloads(watch, DOWNLOAD_COMPLETE_TIMEOUT, [row_index]))
+
+            except Exception as e:
+                print(f"{count}番目のCSVダウンロードでエラーが発生しました: {e}")
+
+        # 開始したすべてのダウンロードの完了をまとめて待機
+        if batch and watch['pending']:
+            print(f"{len(watch['pending'])}件のダウンロードの完了を待機中...")
+            with step("download.wait_all"):
+                downloaded.update(wait_for_downloads(watch, DOWNLOAD_COMPLETE_TIMEOUT))
 
-            download_link = data_rows[row_index].find_element(By.CSS_SELECTOR, "td.u-ta-c a")
-            safe_click(download_link)
-            
-            # アラートにOK
-            WebDriverWait(driver, 5).until(EC.alert_is_present())
-            alert = driver.switch_to.alert
-            alert.accept()
-            print(f"{count}番目のCSVファイルのダウンロードを開始しました。")
-            
-            # ダウンロード開始を少し待つ（特に最後のファイルの場合）
-            time.sleep(2)
-            
-            # ダウンロード完了を待機（各ファイルごとに最大60秒）
-            wait_for_download_complete(timeout=60)
-                
-        except Exception as e:
-            print(f"{count}番目のCSVダウンロードでエラーが発生しました: {e}")
-    
     if len(matching_rows) == 0:
         print("条件に合致する行が見つかりませんでした。")
     else:
-        # 最後にすべてのダウンロードが完了しているか確認
-        print("すべてのCSVファイルのダウンロード完了を最終確認中...")
-        # 少し待ってから最終確認（最後のダウンロードが確実に開始されるように）
-        time.sleep(3)
-        wait_for_download_complete(timeout=60)
-        print("CSVファイルのダウンロード処理を完了しました。")
-
-finally:
-    driver.quit()
\ No newline at end of file
+        print_download_report(downloaded)
+        print(f"CSVファイルのダウンロード処理を完了しました。（{len(downloaded)}/{len(matching_rows)}件）")
+    return downloaded
+
+if __name__ == "__main__":
+    # 使い方: python3 download.py [--click]（--clickで従来のクリックによるダウンロード）
+    main(mode="click" if "--click" in sys.argv[1:] else DOWNLOAD_MODE)
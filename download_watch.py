@@ -0,0 +1,235 @@
+import os
+import time
+import select
+import struct
+import ctypes
+import ctypes.util
+import contextlib
+
+# 監視設定
+WATCH_POLL_INTERVAL = 0.5  # inotifyが使えない場合にディレクトリを確認する間隔（秒）
+TEMP_SUFFIXES = (".crdownload", ".download", ".part", ".tmp")  # ダウンロード中のファイルの拡張子
+
+# inotifyのイベント（/usr/include/linux/inotify.h）
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+INOTIFY_EVENT = struct.Struct("iIII")  # wd, mask, cookie, len（この後にlenバイトのファイル名）
+
+
+def open_inotify(directory):
+    """
+    ディレクトリのinotifyを開きます。
+
+    Returns:
+        inotifyのファイルディスクリプタ。inotifyが使えない場合（macOSなど）はNone
+    """
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+    except (OSError, AttributeError, TypeError):
+        return None
+    if fd < 0:
+        return None
+    if libc.inotify_add_watch(fd, os.fsencode(directory), IN_CREATE | IN_MOVED_TO | IN_CLOSE_WRITE) < 0:
+        os.close(fd)
+        return None
+    return fd
+
+
+def read_inotify_events(fd, timeout):
+    """
+    inotifyのイベントをtimeout秒まで待って読み込みます。
+
+    Returns:
+        (ファイル名, mask) のリスト
+    """
+    readable, _, _ = select.select([fd], [], [], timeout)
+    if not readable:
+        return []
+    try:
+        data = os.read(fd, 64 * 1024)
+    except BlockingIOError:
+        return []
+    events = []
+    offset = 0
+    while offset < len(data):
+        _, mask, _, name_len = INOTIFY_EVENT.unpack_from(data, offset)
+        offset += INOTIFY_EVENT.size
+        name = data[offset:offset + name_len].rstrip(b"\0")
+        offset += name_len
+        events.append((os.fsdecode(name), mask))
+    return events
+
+
+def is_temp_name(name):
+    """ダウンロード中のファイル名（.crdownloadなど）かどうかを返します。"""
+    return name.endswith(TEMP_SUFFIXES)
+
+
+def strip_temp_suffix(name):
+    """ダウンロード中のファイル名から拡張子を除き、完了後のファイル名を返します。"""
+    for suffix in TEMP_SUFFIXES:
+        if name.endswith(suffix):
+            return name[:-len(suffix)]
+    return name
+
+
+def start_watch(directory):
+    """
+    ダウンロードディレクトリの監視を開始します（ダウンロードを開始する前に呼び出す）。
+
+    Returns:
+        監視の状態を保持する辞書（expect_download・wait_for_downloads・stop_watchに渡す）
+    """
+    fd = open_inotify(directory)
+    return {
+        'directory': directory,
+        'fd': fd,
+        'known': set(os.listdir(directory)),  # 監視開始時からあるファイル（対象外）
+        'dir_mtime': None,
+        'sizes': {},  # ポーリング時の前回のファイルサイズ（サイズが変わらなくなったら完了とみなす）
+        'pending': [],  # [(行のインデックス, ダウンロードを開始した時刻)]（開始順）
+        'temp_rows': {},  # {完了後のファイル名: 行のインデックス}
+        'temp_names': {},  # {行のインデックス: 最後に見つかったファイル名}
+        'finished': {},  # {行のインデックス: (パス, 所要時間（秒）)}
+    }
+
+
+def stop_watch(watch):
+    """監視を終了します。"""
+    if watch['fd'] is not None:
+        os.close(watch['fd'])
+        watch['fd'] = None
+
+
+@contextlib.contextmanager
+def watch_downloads(directory):
+    """ダウンロードディレクトリを監視する区間を作ります。"""
+    watch = start_watch(directory)
+    try:
+        yield watch
+    finally:
+        stop_watch(watch)
+
+
+def pairs_in_creation_order(watch):
+    """
+    同時に開始した複数のダウンロードを、ファイルが作られた順に行と対応させられるかどうかを返します。
+
+    inotifyはファイルが作られた順にイベントを返しますが、ポーリング（macOSなど）ではディレクトリの
+    一覧の順（順不同）にしか見つからないため、同時に複数のダウンロードを待つと別の行と対応してしまいます。
+    """
+    return watch['fd'] is not None
+
+
+def expect_download(watch, row_index):
+    """行のダウンロードを開始したことを記録します（クリックの直前に呼び出す）。"""
+    watch['pending'].append((row_index, time.perf_counter()))
+
+
+def assign_row(watch, name):
+    """
+    ファイル名に対応する行を返します。
+
+    まだ対応していないファイルには、ダウンロード中のファイルの名前が変わった行（Chromeは
+    「Unconfirmed 123.crdownload」→「ファイル名.crdownload」→「ファイル名」と名前を変える）、
+    次にまだファイルが見つかっていない行の順に、最も早く開始した行を割り当てます。
+    """
+    final_name = strip_temp_suffix(name)
+    if final_name in watch['temp_rows']:
+        return watch['temp_rows'][final_name]
+    reserved = {row_index: key for key, row_index in watch['temp_rows'].items()}
+    unfinished = [row_index for row_index, _ in watch['pending'] if row_index not in watch['finished']]
+    renamed = [row_index for row_index in unfinished if row_index in reserved
+               and not os.path.exists(os.path.join(watch['directory'], watch['temp_names'][row_index]))]
+    candidates = renamed + [row_index for row_index in unfinished if row_index not in reserved]
+    if not candidates:
+        return None
+    row_index = candidates[0]
+    if row_index in reserved:
+        del watch['temp_rows'][reserved[row_index]]
+    watch['temp_rows'][final_name] = row_index
+    watch['temp_names'][row_index] = name
+    return row_index
+
+
+def handle_file(watch, name, complete):
+    """
+    新しく見つかったファイルを処理します。
+
+    Args:
+        name: ファイル名
+        complete: ファイルの書き込みが終わっている場合はTrue（名前の変更・書き込みの終了）
+    """
+    if name.startswith(".") or name in watch['known']:
+        return
+    row_index = assign_row(watch, name)
+    if row_index is None or is_temp_name(name) or not complete or row_index in watch['finished']:
+        return
+    watch['known'].add(name)
+    started = dict(watch['pending'])[row_index]
+    watch['finished'][row_index] = (os.path.join(watch['directory'], name), time.perf_counter() - started)
+
+
+def poll_directory(watch):
+    """ディレクトリの一覧を確認します（inotifyが使えない場合）。ディレクトリが変わっていなければ一覧を読まない。"""
+    directory = watch['directory']
+    dir_mtime = os.stat(directory).st_mtime_ns
+    names = None
+    if dir_mtime != watch['dir_mtime'] or watch['sizes']:
+        watch['dir_mtime'] = dir_mtime
+        names = [name for name in os.listdir(directory) if name not in watch['known']]
+    for name in names or []:
+        if is_temp_name(name):
+            handle_file(watch, name, complete=False)
+            continue
+        try:
+            size = os.path.getsize(os.path.join(directory, name))
+        except OSError:
+            continue
+        # 直接書き込まれるファイルは、サイズが前回の確認から変わらなくなったら完了とみなす
+        complete = watch['sizes'].get(name) == size
+        watch['sizes'][name] = size
+        handle_file(watch, name, complete)
+        if complete:
+            watch['sizes'].pop(name, None)
+
+
+def wait_for_downloads(watch, timeout=60, row_indices=None):
+    """
+    ダウンロードが完了する（完了後のファイル名で保存される）まで待機します。
+
+    Args:
+        watch: start_watchの戻り値
+        timeout: 最大待機時間（秒）
+        row_indices: 待機する行のインデックス（省略時はexpect_downloadで記録した全行）
+
+    Returns:
+        {行のインデックス: (パス, 所要時間（秒）)} の辞書（完了した行のみ）
+    """
+    if row_indices is None:
+        row_indices = [row_index for row_index, _ in watch['pending']]
+    deadline = time.perf_counter() + timeout
+    while not all(row_index in watch['finished'] for row_index in row_indices):
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            missing = [row_index + 1 for row_index in row_indices if row_index not in watch['finished']]
+            print(f"警告: {timeout}秒待ってもダウンロードが完了しませんでした（行{missing}）。")
+            break
+        if watch['fd'] is not None:
+            for name, mask in read_inotify_events(watch['fd'], remaining):
+                handle_file(watch, name, complete=bool(mask & (IN_MOVED_TO | IN_CLOSE_WRITE)))
+        else:
+            poll_directory(watch)
+            time.sleep(min(WATCH_POLL_INTERVAL, max(remaining, 0)))
+    return {row_index: watch['finished'][row_index] for row_index in row_indices if row_index in watch['finished']}
+
+
+def print_download_report(finished):
+    """行ごとのダウンロードしたファイルと所要時間を表示します。"""
+    print(f"{'行':>4} {'所要時間(s)':>10}  ファイル")
+    for row_index, (path, elapsed) in sorted(finished.items()):
+        print(f"{row_index + 1:>4} {elapsed:>10.1f}  {os.path.basename(path)}")
@@ -1,10 +1,20 @@
 import os
+import sys
+import json
 import glob
 import pandas as pd
+import numpy as np
 import gspread
 import time
 from datetime import datetime
 
+from ingest import (DATE_FORMAT, DELIVERY_COLUMNS, DELIVERY_ID_COLUMN, STREAM_CHUNK_ROWS,
+                    load_delivery_csvs, iter_delivery_csv_chunks)
+from archive import upsert_archive, read_archive
+from manifest import MANIFEST_DIR, manifest_csv_paths, sort_by_export_time
+from atomic_file import atomic_write
+import tracing
+
 # 設定情報
 SPREADSHEET_ID = "1swzp4-ISlM769K_dKR1BpdwQSkV19YmhHZuzwaXQCdI"
 SHEET_NAME = "寄附受付集計"
@@ -15,6 +25,12 @@ MAX_RETRIES = 3  # 最大リトライ回数
 INITIAL_RETRY_DELAY = 2  # 初回リトライ待機時間（秒）
 MAX_RETRY_DELAY = 30  # 最大リトライ待機時間（秒）
 
+# CSV読み込み設定
+CSV_ENGINE = None  # "pyarrow"を指定するとpyarrowのCSVパーサーで読み込む
+
+# 差分書き込み設定
+SNAPSHOT_FILE = "sheet_snapshot.json"  # 前回書き込みに成功したセルの値の記録
+
 def translate_error(error_str):
     """エラーメッセージを日本語に翻訳します。"""
     error_str_lower = str(error_str).lower()
@@ -122,14 +138,28 @@ def retry_with_backoff(func, *args, **kwargs):
             error_msg_jp = translate_error(str(e))
             print(f"エラーが発生しました（試行 {attempt + 1}/{MAX_RETRIES + 1}）: {error_msg_jp}")
             print(f"{delay}秒後にリトライします...")
+            tracing.record_retry(delay)
             time.sleep(delay)
     
     # ここには到達しないはずですが、念のため
     raise last_exception
 
-def find_today_delivery_csvs(folder_path):
-    """指定されたフォルダ内で今日ダウンロードしたdelivery_listから始まるCSVファイルを全て取得します。"""
+def find_today_delivery_csvs(folder_path, day=None, manifest_dir=MANIFEST_DIR):
+    """
+    今日（dayを指定した場合はその日）ダウンロードしたdelivery_listから始まるCSVファイルを全て取得します。
+
+    download.pyのマニフェスト（manifest_dir内）があればそのファイルを使い（内容が同じファイルは1件にまとめる）、
+    ない場合は指定されたフォルダ内を検索します。同じ配送管理IDの行は後のファイルの行を残すため、
+    古いエクスポートから順に並べて返します。
+    """
     from datetime import datetime
+
+    manifest_files = manifest_csv_paths(day, manifest_dir)
+    if manifest_files:
+        print(f"マニフェストのdelivery_listファイル: {len(manifest_files)}件")
+        return sort_by_export_time(manifest_files, day, manifest_dir)
+    if day is not None:
+        raise FileNotFoundError(f"{day}のマニフェストに有効なCSVファイルがありません。")
     
     # 今日の日付を取得
     today = datetime.now().date()
@@ -151,7 +181,7 @@ def find_today_delivery_csvs(folder_path):
         raise FileNotFoundError(f"今日ダウンロードしたdelivery_listから始まるCSVファイルが見つかりません。")
     
     print(f"今日ダウンロードしたdelivery_listファイル: {len(today_files)}件")
-    return today_files
+    return sort_by_export_time(today_files, day, manifest_dir)
 
 def get_product_category(product_name):
     """商品名からカテゴリを分類します。"""
@@ -182,6 +212,39 @@ def get_product_quantity(product_name, category):
                 return int(num.replace("kg", ""))
     return 0
 
+def classify_products(product_names):
+    """
+    返礼品ごとにカテゴリ・タイプ・数量を分類します。
+
+    返礼品を一意な値に分解（factorize）し、商品名の種類ごとに1回だけ
+    分類関数を呼び出してから各行に展開します。CSVの行数ではなく
+    返礼品の種類数に比例した回数しか分類処理を行いません。
+
+    Args:
+        product_names: 返礼品列（Series）
+
+    Returns:
+        カテゴリ・タイプ（category型）と数量（int）を列に持つDataFrame
+    """
+    codes, uniques = pd.factorize(product_names, use_na_sentinel=False)
+
+    # 商品名の種類ごとに1回だけ分類
+    unique_categories = [get_product_category(name) for name in uniques]
+    unique_types = [get_product_type(name) for name in uniques]
+    unique_quantities = np.array(
+        [get_product_quantity(name, category) for name, category in zip(uniques, unique_categories)],
+        dtype=np.int64
+    )
+
+    # 各行に展開（カテゴリ・タイプはカテゴリコードのまま展開）
+    category_values = pd.Categorical(unique_categories)
+    type_values = pd.Categorical(unique_types)
+    return pd.DataFrame({
+        'カテゴリ': pd.Categorical.from_codes(category_values.codes[codes], categories=category_values.categories),
+        'タイプ': pd.Categorical.from_codes(type_values.codes[codes], categories=type_values.categories),
+        '数量': unique_quantities[codes],
+    }, index=product_names.index)
+
 def get_product_count():
     """CSVの1行を1件として件数を返します。"""
     return 1
@@ -277,6 +340,91 @@ def get_date_group(scheduled_date, shipped_date):
     # どちらも空の場合はNone（集計対象外）
     return None
 
+# 日付グループ（日 → グループ番号の対応表。添字が日、-1は対象外）
+DATE_GROUPS = ["2日グループ", "10日グループ", "17日グループ", "24日グループ"]
+DATE_GROUP_LOOKUP = np.array([-1] + [0] * 7 + [1] * 3 + [2] * 7 + [3] * 14, dtype=np.int8)
+
+# 月キー（年 * 12 + 月 - 1 の整数）
+MONTH_KEY_START = 2025 * 12 + 9 - 1  # 2025年9月
+MONTH_KEY_DEFAULT = 2025 * 12 + 10 - 1  # 2025年10月
+
+def month_key_to_label(month_key):
+    """月キーを「2025年9月」形式の文字列に変換します。"""
+    return f"{month_key // 12}年{month_key % 12 + 1}月"
+
+def parse_dates(values):
+    """
+    日付列を一括で日時型に変換します。
+
+    DATE_FORMATの書式で一括変換し、変換できなかった値だけを
+    値の種類ごとに従来どおり1件ずつ変換します。
+
+    Args:
+        values: 日付文字列の列（Series）
+
+    Returns:
+        日時型のSeries（変換できない値・空欄はNaT）
+    """
+    parsed = pd.to_datetime(values, format=DATE_FORMAT, errors='coerce')
+    unparsed = parsed.isna() & values.notna()
+    if unparsed.any():
+        def parse_one(value):
+            try:
+                date_obj = pd.to_datetime(value)
+                # タイムゾーン付きの場合は現地時刻のまま扱う
+                if date_obj is not pd.NaT and date_obj.tzinfo is not None:
+                    date_obj = date_obj.tz_localize(None)
+                return date_obj
+            except:
+                return pd.NaT
+
+        fallback = {value: parse_one(value) for value in values[unparsed].unique()}
+        parsed[unparsed] = pd.to_datetime(values[unparsed].map(fallback))
+    return parsed
+
+def classify_shipping_dates(scheduled_dates, shipped_dates):
+    """
+    出荷予定日・出荷日から月と日付グループを一括で判定します。
+
+    get_month_with_fallback、get_date_groupと同じ結果を列単位で求めます。
+
+    Args:
+        scheduled_dates: 出荷予定日列（Series）
+        shipped_dates: 出荷日列（Series）
+
+    Returns:
+        月キー（int）、月・日付グループ（category型）を列に持つDataFrame
+    """
+    scheduled = parse_dates(scheduled_dates)
+    shipped = parse_dates(shipped_dates)
+
+    # 月: 出荷予定日 → 出荷日 → 2025年10月の順に採用（2025年9月より前は対象外）
+    scheduled_key = (scheduled.dt.year * 12 + scheduled.dt.month - 1).to_numpy(dtype=float, na_value=np.nan)
+    shipped_key = (shipped.dt.year * 12 + shipped.dt.month - 1).to_numpy(dtype=float, na_value=np.nan)
+    month_keys = np.where(
+        scheduled_key >= MONTH_KEY_START,
+        scheduled_key,
+        np.where(shipped_key >= MONTH_KEY_START, shipped_key, MONTH_KEY_DEFAULT)
+    ).astype(np.int64)
+
+    # 日付グループ: 出荷予定日（なければ出荷日）の日から対応表で判定
+    days = np.where(
+        scheduled.notna().to_numpy(),
+        scheduled.dt.day.to_numpy(dtype=float, na_value=np.nan),
+        shipped.dt.day.to_numpy(dtype=float, na_value=np.nan)
+    )
+    days = np.nan_to_num(days, nan=0).astype(np.intp)
+    date_group_codes = DATE_GROUP_LOOKUP[days]
+
+    # 月は時系列順のカテゴリとして展開
+    unique_keys, month_codes = np.unique(month_keys, return_inverse=True)
+    month_labels = [month_key_to_label(int(key)) for key in unique_keys]
+    return pd.DataFrame({
+        '月キー': month_keys,
+        '月': pd.Categorical.from_codes(month_codes.reshape(-1), categories=month_labels),
+        '日付グループ': pd.Categorical.from_codes(date_group_codes, categories=DATE_GROUPS),
+    }, index=scheduled_dates.index)
+
 def get_delivery_status(delivery_status_str):
     """配送ステータスから出荷状況を判定します。"""
     if pd.isna(delivery_status_str):
@@ -293,652 +441,853 @@ def get_delivery_status(delivery_status_str):
     else:
         return "すでに過ぎた"    # 出荷済み（元の「すでに過ぎた」カテゴリ）
 
-def update_material_consumption_spreadsheet(df):
+def classify_delivery_statuses(delivery_statuses):
+    """配送ステータスの種類ごとに1回だけ出荷状況を判定し、各行に展開します。"""
+    codes, uniques = pd.factorize(delivery_statuses, use_na_sentinel=False)
+    statuses = pd.Categorical([get_delivery_status(status) for status in uniques])
+    return pd.Series(
+        pd.Categorical.from_codes(statuses.codes[codes], categories=statuses.categories),
+        index=delivery_statuses.index
+    )
+
+# 集計キューブの軸（月 × カテゴリ × タイプ × 出荷状況 × 日付グループ × 数量 × 指標）
+CUBE_CATEGORIES = ["玄米", "白米", "無洗米", "ペットボトル"]
+CUBE_TYPES = ["定期便", "単品"]
+CUBE_STATUSES = ["まだ過ぎてない", "すでに過ぎた", "不明"]
+CUBE_DATE_GROUPS = DATE_GROUPS + [None]  # 最後は日付グループなし（出荷予定日・出荷日とも空）
+CUBE_QUANTITIES = [0, 1, 2, 3, 4, 5, 6, 10, 15, 20, 25, 30]  # get_product_quantityが返す値
+CUBE_MEASURES = ["数量", "件数"]
+
+# 資材消費管理シートの対象月（2025年11月以降）
+MATERIAL_MONTH_KEY_START = 2025 * 12 + 11 - 1
+
+def build_summary_cube(df):
+    """
+    集計対象の行から月別の集計キューブを作成します。
+
+    全行を1回だけ走査し、月 × カテゴリ × タイプ × 出荷状況 × 日付グループ ×
+    数量 × 指標（数量・件数）の密なNumPy配列に合計値を格納します。
+    各シートの書き込みデータはこのキューブから添字で取り出します。
+
+    Args:
+        df: カテゴリ・タイプ・数量・件数・月キー・日付グループ・出荷状況列を持つDataFrame
+
+    Returns:
+        (月キーの配列（昇順）, 集計キューブ) のタプル
     """
-    資材消費管理シートに集計データを書き込みます。
+    month_keys, month_codes = np.unique(df['月キー'].to_numpy(dtype=np.int64), return_inverse=True)
+    date_group_codes = pd.Index(DATE_GROUPS).get_indexer(df['日付グループ'])
+    codes = (
+        month_codes.reshape(-1),
+        pd.Index(CUBE_CATEGORIES).get_indexer(df['カテゴリ']),
+        pd.Index(CUBE_TYPES).get_indexer(df['タイプ']),
+        pd.Index(CUBE_STATUSES).get_indexer(df['出荷状況']),
+        np.where(date_group_codes < 0, len(DATE_GROUPS), date_group_codes),
+        pd.Index(CUBE_QUANTITIES).get_indexer(df['数量']),
+    )
+    shape = (len(month_keys), len(CUBE_CATEGORIES), len(CUBE_TYPES), len(CUBE_STATUSES),
+             len(CUBE_DATE_GROUPS), len(CUBE_QUANTITIES))
+
+    # 各行のセル位置を求めて一括で合計
+    flat_index = np.ravel_multi_index(codes, shape)
+    size = int(np.prod(shape))
+    quantity = np.bincount(flat_index, weights=df['数量'].to_numpy(dtype=float), minlength=size)
+    count = np.bincount(flat_index, weights=df['件数'].to_numpy(dtype=float), minlength=size)
+    cube = np.stack([quantity, count], axis=-1).astype(np.int64).reshape(shape + (len(CUBE_MEASURES),))
+    return month_keys, cube
+
+# ストリーミング集計（1か月分のキューブのセル数と、集計しない行のセル番号）
+CUBE_MONTH_SHAPE = (len(CUBE_CATEGORIES), len(CUBE_TYPES), len(CUBE_STATUSES),
+                    len(CUBE_DATE_GROUPS), len(CUBE_QUANTITIES))
+CUBE_MONTH_CELLS = int(np.prod(CUBE_MONTH_SHAPE))
+CELL_OTHER = -1  # 集計対象外のカテゴリ
+CELL_EXCLUDED = -2  # 集計除外の配送ステータス
+
+def summary_cell_codes(df):
     """
-    try:
-        # 認証情報（リトライ付き）
-        def get_worksheet():
-            gc = gspread.service_account(filename=API_KEY_FILE)
-            sh = gc.open_by_key(SPREADSHEET_ID)
-            return sh.worksheet("資材消費管理")
-        
-        material_worksheet = retry_with_backoff(get_worksheet)
-        
-        # 資材カテゴリ列を追加
-        df['資材カテゴリ'] = df.apply(lambda row: get_material_category(row['カテゴリ'], row['数量']), axis=1)
-        
-        # 資材カテゴリがNoneのデータを除外
-        material_df = df[df['資材カテゴリ'].notna()]
-        
-        # 2025年11月以降のデータのみを対象
-        def is_target_month(month_str):
-            if pd.isna(month_str):
-                return False
-            try:
-                year, month = month_str.replace('月', '').split('年')
-                year = int(year)
-                month = int(month)
-                # 2025年11月以降
-                if year == 2025 and month >= 11:
-                    return True
-                elif year >= 2026:
-                    return True
-                return False
-            except:
-                return False
-        
-        material_df = material_df[material_df['月'].apply(is_target_month)]
-        target_df = df[df['月'].apply(is_target_month)]
-        
-        # 月別・資材カテゴリ別に件数を集計
-        material_summary = material_df.groupby(['月', '資材カテゴリ'])['件数'].sum().reset_index()
-        
-        # 追加で求める指標の集計
-        rice_white_summary = (
-            target_df[target_df['カテゴリ'].isin(['玄米', '白米'])]
-            .groupby('月')['数量']
-            .sum() / 5
-        )
-        musen_summary = (
-            target_df[target_df['カテゴリ'] == '無洗米']
-            .groupby('月')['数量']
-            .sum() / 5
-        )
-        pb_small_summary = (
-            target_df[
-                (target_df['カテゴリ'] == 'ペットボトル') &
-                (target_df['数量'].isin([1, 3, 5]))
-            ]
-            .groupby('月')['件数']
-            .sum()
-        )
-        
-        rice_white_summary = rice_white_summary.to_dict()
-        musen_summary = musen_summary.to_dict()
-        pb_small_summary = pb_small_summary.to_dict()
-        
-        # スペーサー集計（PB1本、PB3本、PB5本の件数）
-        spacer_summary = (
-            target_df[
-                (target_df['カテゴリ'] == 'ペットボトル') &
-                (target_df['数量'].isin([1, 3, 5]))
+    各行を加算する集計キューブのセル番号（月キー × CUBE_MONTH_CELLS + 月内のセル位置）を求めます。
+
+    集計対象外のカテゴリの行はCELL_OTHER、集計除外の行はCELL_EXCLUDEDになります。
+
+    Args:
+        df: カテゴリ・タイプ・数量・月キー・日付グループ・出荷状況列を持つDataFrame
+
+    Returns:
+        セル番号の配列（int64）
+    """
+    in_categories = df['カテゴリ'].isin(CUBE_CATEGORIES).to_numpy()
+    excluded = in_categories & (df['出荷状況'] == '集計除外').to_numpy()
+    target = in_categories & ~excluded
+    target_df = df[target]
+    date_group_codes = pd.Index(DATE_GROUPS).get_indexer(target_df['日付グループ'])
+    month_cells = np.ravel_multi_index((
+        pd.Index(CUBE_CATEGORIES).get_indexer(target_df['カテゴリ']),
+        pd.Index(CUBE_TYPES).get_indexer(target_df['タイプ']),
+        pd.Index(CUBE_STATUSES).get_indexer(target_df['出荷状況']),
+        np.where(date_group_codes < 0, len(DATE_GROUPS), date_group_codes),
+        pd.Index(CUBE_QUANTITIES).get_indexer(target_df['数量']),
+    ), CUBE_MONTH_SHAPE)
+
+    cells = np.full(len(df), CELL_OTHER, dtype=np.int64)
+    cells[excluded] = CELL_EXCLUDED
+    cells[target] = target_df['月キー'].to_numpy(dtype=np.int64) * CUBE_MONTH_CELLS + month_cells
+    return cells
+
+def cube_from_cells(cells, row_counts):
+    """
+    セル番号ごとの行数から、build_summary_cubeと同じ集計キューブを作成します。
+
+    Args:
+        cells: セル番号の配列（集計するセルのみ）
+        row_counts: 各セル番号の行数
+
+    Returns:
+        (月キーの配列（昇順）, 集計キューブ) のタプル
+    """
+    month_keys, month_codes = np.unique(cells // CUBE_MONTH_CELLS, return_inverse=True)
+    month_cells = cells % CUBE_MONTH_CELLS
+    flat_index = month_codes.reshape(-1) * CUBE_MONTH_CELLS + month_cells
+    shape = (len(month_keys),) + CUBE_MONTH_SHAPE
+    size = int(np.prod(shape))
+
+    # 件数は行数、数量はセルの数量軸の値 × 行数
+    quantities = np.array(CUBE_QUANTITIES)[month_cells % len(CUBE_QUANTITIES)]
+    quantity = np.bincount(flat_index, weights=(row_counts * quantities).astype(float), minlength=size)
+    count = np.bincount(flat_index, weights=row_counts.astype(float), minlength=size)
+    cube = np.stack([quantity, count], axis=-1).astype(np.int64).reshape(shape + (len(CUBE_MEASURES),))
+    return month_keys, cube
+
+def stream_summary_cube(csv_paths, chunk_rows=STREAM_CHUNK_ROWS):
+    """
+    CSVファイルをchunk_rows行ずつ読み込み、チャンクごとに分類して集計キューブを作成します。
+
+    ファイル全体を読み込んで結合する通常の集計（load_delivery_csvs → build_summary_cube）と
+    同じキューブになります。各チャンクは分類してセル番号にしたら破棄し、残すのは
+    配送管理IDが空の行のセルごとの行数と、配送管理IDのある行の（ID, セル番号）だけです。
+    同じ配送管理IDの行は、最後に最も新しいファイルの行だけを残してから合計します。
+    残す（ID, セル番号）は行数に比例して増えます（チャンクの全列よりは小さい）。
+
+    アーカイブは更新しません（チャンクごとに更新すると、関係する月のファイルをチャンクの数だけ
+    読み書きし、アーカイブが大きいほど遅く、メモリも多く使うため）。
+
+    Args:
+        csv_paths: 古いエクスポートから順に並べたCSVファイルのパスのリスト（manifest.sort_by_export_time）
+        chunk_rows: 1回に読み込む行数
+
+    Returns:
+        (月キーの配列（昇順）, 集計キューブ, 読み込んだ行数) のタプル（読み込めたファイルがない場合はNone）
+    """
+    no_id_counts = pd.Series(dtype=np.int64)  # 配送管理IDが空の行: セル番号ごとの行数
+    id_chunks = []
+    id_cell_chunks = []
+    other_products = {}
+    row_count = 0
+    file_count = 0
+    for csv_path in csv_paths:
+        # ファイルの途中で読み込めなくなった場合はそのファイルの行をすべて除く
+        file_counts = []
+        file_ids = []
+        file_cells = []
+        file_other_products = {}
+        file_rows = 0
+        try:
+            for chunk in iter_delivery_csv_chunks(csv_path, chunk_rows=chunk_rows):
+                product_df = classify_products(chunk['返礼品'])
+                chunk['カテゴリ'] = product_df['カテゴリ']
+                chunk['タイプ'] = product_df['タイプ']
+                chunk['数量'] = product_df['数量']
+                chunk['件数'] = get_product_count()
+                chunk['出荷状況'] = classify_delivery_statuses(chunk['配送ステータス'])
+                date_df = classify_shipping_dates(chunk['出荷予定日'], chunk['出荷日'])
+                chunk['月キー'] = date_df['月キー']
+                chunk['月'] = date_df['月']
+                chunk['日付グループ'] = date_df['日付グループ']
+
+                cells = summary_cell_codes(chunk)
+                has_id = chunk[DELIVERY_ID_COLUMN].notna().to_numpy()
+                file_counts.append(pd.Series(cells[~has_id]).value_counts())
+                file_ids.append(chunk[DELIVERY_ID_COLUMN][has_id].reset_index(drop=True))
+                file_cells.append(cells[has_id])
+                for product in chunk['返礼品'][(chunk['カテゴリ'] == "その他").to_numpy()].unique():
+                    file_other_products[product] = None
+                file_rows += len(chunk)
+        except Exception as e:
+            print(f"CSVファイル「{os.path.basename(csv_path)}」の読み込みでエラーが発生しました: {e}")
+            continue
+
+        print(f"CSVファイル「{os.path.basename(csv_path)}」をCP932で読み込みました。（{file_rows}行）")
+        for counts in file_counts:
+            no_id_counts = no_id_counts.add(counts, fill_value=0)
+        id_chunks.extend(file_ids)
+        id_cell_chunks.extend(file_cells)
+        other_products.update(file_other_products)
+        row_count += file_rows
+        file_count += 1
+
+    if file_count == 0:
+        return None
+    print(f"合計{file_count}件のCSVファイルを集計しました。（{row_count}行）")
+
+    # 同じ配送管理IDの行は最後（最新のファイル）の行を残す
+    ids = pd.concat(id_chunks, ignore_index=True) if id_chunks else pd.Series(dtype=str)
+    id_cells = np.concatenate(id_cell_chunks) if id_cell_chunks else np.array([], dtype=np.int64)
+    duplicated = ids.duplicated(keep='last').to_numpy()
+    if duplicated.any():
+        print(f"重複した配送管理IDの行を除外しました: {int(duplicated.sum())}件")
+    cell_counts = no_id_counts.add(pd.Series(id_cells[~duplicated]).value_counts(), fill_value=0)
+
+    # 通常の集計と同じ内容をコンソールに出力
+    if other_products:
+        print("以下の商品名は集計されませんでした:")
+        for product in other_products:
+            print(f"- {product}")
+    else:
+        print("集計対象外の商品は見つかりませんでした。")
+    excluded_count = int(cell_counts.get(CELL_EXCLUDED, 0))
+    if excluded_count > 0:
+        print(f"集計から除外された件数: {excluded_count}件（配送キャンセル、返送、配送対象外）")
+
+    cell_counts = cell_counts[cell_counts.index >= 0]
+    month_keys, cube = cube_from_cells(
+        cell_counts.index.to_numpy(dtype=np.int64), cell_counts.to_numpy(dtype=np.int64)
+    )
+    return month_keys, cube, row_count
+
+def format_cell_value(value):
+    """集計値をセルの値に変換します（0の場合は空にする）。"""
+    return int(value) if value > 0 else ''
+
+def compile_blocks(data_to_write):
+    """
+    1セルずつの書き込みデータを長方形の範囲にまとめます。
+
+    各行の連続する列をひとまとまりにし、同じ列範囲が上下に続く行を
+    1つの範囲に結合します。書き込まないセル（行・列の隙間）は範囲に含めません。
+
+    Args:
+        data_to_write: {'range': A1形式のセル, 'values': [[値]]} のリスト
+
+    Returns:
+        {'range': A1形式の範囲, 'values': 2次元の値} のリスト
+    """
+    # セル位置 → 値（同じセルへの書き込みは後のものを優先）
+    cells = {}
+    for item in data_to_write:
+        start_row, start_col = gspread.utils.a1_to_rowcol(item['range'].split(':')[0])
+        for r, row_values in enumerate(item['values']):
+            for c, value in enumerate(row_values):
+                cells[(start_row + r, start_col + c)] = value
+
+    # 行ごとに連続する列の区間を求める
+    runs_by_row = {}
+    for row, col in sorted(cells):
+        runs = runs_by_row.setdefault(row, [])
+        if runs and runs[-1][1] == col - 1:
+            runs[-1][1] = col
+        else:
+            runs.append([col, col])
+
+    # 同じ列区間が連続する行を1つの範囲に結合
+    blocks = []
+    open_blocks = {}  # (開始列, 終了列) → 範囲
+    for row in sorted(runs_by_row):
+        for start_col, end_col in runs_by_row[row]:
+            block = open_blocks.get((start_col, end_col))
+            if block is not None and block['end_row'] == row - 1:
+                block['end_row'] = row
+            else:
+                block = {'start_row': row, 'end_row': row, 'start_col': start_col, 'end_col': end_col}
+                open_blocks[(start_col, end_col)] = block
+                blocks.append(block)
+
+    return [
+        {
+            'range': (
+                gspread.utils.rowcol_to_a1(block['start_row'], block['start_col']) + ':' +
+                gspread.utils.rowcol_to_a1(block['end_row'], block['end_col'])
+            ),
+            'values': [
+                [cells[(row, col)] for col in range(block['start_col'], block['end_col'] + 1)]
+                for row in range(block['start_row'], block['end_row'] + 1)
             ]
-            .groupby('月')['件数']
-            .sum()
-        )
-        spacer_summary = spacer_summary.to_dict()
-        
-        # データから実際に存在する月を動的に取得し、時系列順にソート
-        all_months = set(material_summary['月'].dropna().unique())
-        all_months.update(rice_white_summary.keys())
-        all_months.update(musen_summary.keys())
-        all_months.update(pb_small_summary.keys())
-        all_months.update(spacer_summary.keys())
-        
-        # 月を時系列順にソート
-        def sort_key(month_str):
-            if pd.isna(month_str):
-                return (9999, 13)  # Noneは最後に
-            year, month = month_str.replace('月', '').split('年')
-            return (int(year), int(month))
-        
-        months_ordered = sorted([m for m in all_months if not pd.isna(m)], key=sort_key)
-        print(f"資材消費管理シート - 検出された月: {months_ordered}")
-        
-        # 資材カテゴリと行のマッピング
-        material_row_map = {
-            "5kg箱": 41,
-            "10kg箱": 42,
-            "20kg箱": 43,
-            "30kg箱": 44,
-            "PB2本": 45,
-            "PB4本": 46,
-            "PB6本": 47
         }
-        
-        # 書き込み用データを格納する配列を初期化
-        data_to_write = []
-        
-        if not months_ordered:
-            print("資材消費管理シートに書き込む対象月がありませんでした。")
-            return
-        
-        # 各月の処理（2025年11月がC列(3)から開始）
-        for i, month in enumerate(months_ordered):
-            col = 3 + i  # C列(3)から開始、1列ずつ増加
-            
-            # 各資材カテゴリの処理
-            for material_category, row in material_row_map.items():
-                # 件数の集計
-                count = material_summary.loc[
-                    (material_summary['月'] == month) &
-                    (material_summary['資材カテゴリ'] == material_category),
-                    '件数'
-                ].sum()
-                
-                # int64をintに変換し、0の場合は空にする
-                count = int(count) if count > 0 else ''
-                
-                # 書き込み
-                data_to_write.append({
-                    'range': gspread.utils.rowcol_to_a1(row, col),
-                    'values': [[count]]
-                })
-            
-            # 追加行の計算と書き込み（各月のC列を基準）
-            rice_white_value = rice_white_summary.get(month, 0)
-            rice_white_value = int(rice_white_value) if rice_white_value > 0 else ''
-            data_to_write.append({
-                'range': gspread.utils.rowcol_to_a1(36, col),
-                'values': [[rice_white_value]]
-            })
-            
-            musen_value = musen_summary.get(month, 0)
-            musen_value = int(musen_value) if musen_value > 0 else ''
-            data_to_write.append({
-                'range': gspread.utils.rowcol_to_a1(37, col),
-                'values': [[musen_value]]
-            })
-            
-            pb_small_value = pb_small_summary.get(month, 0)
-            pb_small_value = int(pb_small_value) if pb_small_value > 0 else ''
-            data_to_write.append({
-                'range': gspread.utils.rowcol_to_a1(16, col),
-                'values': [[pb_small_value]]
-            })
-            
-            # スペーサーの集計（PB1本、PB3本、PB5本の件数）
-            spacer_value = spacer_summary.get(month, 0)
-            spacer_value = int(spacer_value) if spacer_value > 0 else ''
+        for block in blocks
+    ]
+
+def build_material_consumption_data(month_keys, cube):
+    """
+    資材消費管理シートの書き込みデータを集計キューブから作成します。
+    """
+    quantity_index = CUBE_MEASURES.index("数量")
+    count_index = CUBE_MEASURES.index("件数")
+    pb_index = CUBE_CATEGORIES.index("ペットボトル")
+
+    # 月 × カテゴリ × 数量 × 指標に集約
+    by_quantity = cube.sum(axis=(2, 3, 4))
+
+    # カテゴリ × 数量 → 資材カテゴリの対応
+    material_cells = {}
+    for c, category in enumerate(CUBE_CATEGORIES):
+        for q, quantity in enumerate(CUBE_QUANTITIES):
+            material_category = get_material_category(category, quantity)
+            if material_category is not None:
+                material_cells.setdefault(material_category, []).append((c, q))
+
+    rice_white = [CUBE_CATEGORIES.index("玄米"), CUBE_CATEGORIES.index("白米")]
+    musen = CUBE_CATEGORIES.index("無洗米")
+    pb_small = [CUBE_QUANTITIES.index(q) for q in [1, 3, 5]]
+
+    # 集計対象の行がある月（数量不明のペットボトルのみの月は除く）を抽出
+    month_counts = by_quantity[:, :, :, count_index].copy()
+    month_counts[:, pb_index, CUBE_QUANTITIES.index(0)] = 0
+    month_indexes = [
+        m for m, month_key in enumerate(month_keys)
+        if month_key >= MATERIAL_MONTH_KEY_START and month_counts[m].sum() > 0
+    ]
+    months_ordered = [month_key_to_label(int(month_keys[m])) for m in month_indexes]
+    print(f"資材消費管理シート - 検出された月: {months_ordered}")
+
+    # 資材カテゴリと行のマッピング
+    material_row_map = {
+        "5kg箱": 41,
+        "10kg箱": 42,
+        "20kg箱": 43,
+        "30kg箱": 44,
+        "PB2本": 45,
+        "PB4本": 46,
+        "PB6本": 47
+    }
+
+    # 書き込み用データを格納する配列を初期化
+    data_to_write = []
+
+    if not months_ordered:
+        print("資材消費管理シートに書き込む対象月がありませんでした。")
+        return data_to_write
+
+    # 各月の処理（2025年11月がC列(3)から開始）
+    for i, m in enumerate(month_indexes):
+        col = 3 + i  # C列(3)から開始、1列ずつ増加
+
+        # 各資材カテゴリの件数
+        for material_category, row in material_row_map.items():
+            count = sum(by_quantity[m, c, q, count_index] for c, q in material_cells.get(material_category, []))
             data_to_write.append({
-                'range': gspread.utils.rowcol_to_a1(48, col),
-                'values': [[spacer_value]]
+                'range': gspread.utils.rowcol_to_a1(row, col),
+                'values': [[format_cell_value(count)]]
             })
-        
-        # gspreadの`batch_update`を使って効率的に書き込み（リトライ付き）
-        if data_to_write:
-            retry_with_backoff(material_worksheet.batch_update, data_to_write)
-            print("資材消費管理シートの更新が完了しました。")
-        else:
-            print("資材消費管理シートに書き込むデータがありませんでした。")
+
+        # 追加行の計算と書き込み（各月のC列を基準）
+        rice_white_value = by_quantity[m, rice_white, :, quantity_index].sum() / 5
+        data_to_write.append({
+            'range': gspread.utils.rowcol_to_a1(36, col),
+            'values': [[format_cell_value(rice_white_value)]]
+        })
+
+        musen_value = by_quantity[m, musen, :, quantity_index].sum() / 5
+        data_to_write.append({
+            'range': gspread.utils.rowcol_to_a1(37, col),
+            'values': [[format_cell_value(musen_value)]]
+        })
+
+        pb_small_value = by_quantity[m, pb_index, pb_small, count_index].sum()
+        data_to_write.append({
+            'range': gspread.utils.rowcol_to_a1(16, col),
+            'values': [[format_cell_value(pb_small_value)]]
+        })
+
+        # スペーサーの集計（PB1本、PB3本、PB5本の件数）
+        spacer_value = by_quantity[m, pb_index, pb_small, count_index].sum()
+        data_to_write.append({
+            'range': gspread.utils.rowcol_to_a1(48, col),
+            'values': [[format_cell_value(spacer_value)]]
+        })
+
+    return data_to_write
+
+def prepare_material_consumption_sheet(month_keys, cube):
+    """
+    資材消費管理シートの書き込みデータ（1セルずつ）を作成します。
+    """
+    try:
+        return build_material_consumption_data(month_keys, cube)
     
-    except gspread.exceptions.GSpreadException as e:
-        error_msg_jp = translate_error(str(e))
-        print(f"資材消費管理シートAPIのエラー: {error_msg_jp}")
-        print(f"詳細: {e}")
     except Exception as e:
         error_msg_jp = translate_error(str(e))
         print(f"資材消費管理シートの更新でエラーが発生しました: {error_msg_jp}")
         print(f"詳細: {e}")
+        return []
 
-def update_schedule_spreadsheet(schedule_summary_quantity_df, schedule_summary_count_df):
+def build_schedule_data(month_keys, cube):
     """
-    出荷スケジュールシートに集計データを書き込みます。
+    出荷スケジュールシートの書き込みデータを集計キューブから作成します。
+    """
+    quantity_index = CUBE_MEASURES.index("数量")
+    count_index = CUBE_MEASURES.index("件数")
+
+    # 月 × カテゴリ × 日付グループ × 指標に集約（日付グループなしは除く）
+    by_date_group = cube.sum(axis=(2, 3, 5))[:, :, :len(DATE_GROUPS)]
+
+    # 日付グループのある行が存在する月を時系列順に抽出
+    month_indexes = [m for m in range(len(month_keys)) if by_date_group[m, :, :, count_index].sum() > 0]
+    months_ordered = [month_key_to_label(int(month_keys[m])) for m in month_indexes]
+    print(f"出荷スケジュールシート - 検出された月: {months_ordered}")
+
+    # カテゴリと列のマッピング（C列=無洗米、D列=白米、E列=玄米、F列=ペットボトル）
+    category_col_map = {
+        "無洗米": 3,  # C列
+        "白米": 4,    # D列
+        "玄米": 5,    # E列
+        "ペットボトル": 6  # F列
+    }
+
+    # 日付グループと行のマッピング
+    date_group_row_map = {
+        "2日グループ": {"count": 3, "quantity": 4},
+        "10日グループ": {"count": 5, "quantity": 6},
+        "17日グループ": {"count": 7, "quantity": 8},
+        "24日グループ": {"count": 9, "quantity": 10}
+    }
+
+    # 書き込み用データを格納する配列を初期化
+    data_to_write = []
+
+    # 各月の処理
+    for i, m in enumerate(month_indexes):
+        # 各月の開始列を計算（2025年9月がC列(3)から開始、7列間隔）
+        # 2025年9月: C列(3), 2025年10月: J列(10), 2025年11月: Q列(17)...
+        start_col = 3 + i * 7
+
+        # 各カテゴリの処理
+        for category, col_offset in category_col_map.items():
+            col = start_col + col_offset - 3  # C列基準でオフセット調整
+            c = CUBE_CATEGORIES.index(category)
+
+            # 各日付グループの処理
+            for date_group, rows in date_group_row_map.items():
+                g = DATE_GROUPS.index(date_group)
+                count = by_date_group[m, c, g, count_index]
+                quantity = by_date_group[m, c, g, quantity_index]
+
+                # ペットボトルの場合は重量に2をかける（1本2kg）
+                if category == "ペットボトル":
+                    quantity = quantity * 2
+
+                # 件数の書き込み
+                data_to_write.append({
+                    'range': gspread.utils.rowcol_to_a1(rows['count'], col),
+                    'values': [[format_cell_value(count)]]
+                })
+
+                # 重量の書き込み
+                data_to_write.append({
+                    'range': gspread.utils.rowcol_to_a1(rows['quantity'], col),
+                    'values': [[format_cell_value(quantity)]]
+                })
+
+    return data_to_write
+
+def prepare_schedule_sheet(month_keys, cube):
+    """
+    出荷スケジュールシートの書き込みデータ（1セルずつ）を作成します。
     """
     try:
-        # 認証情報（リトライ付き）
-        def get_worksheet():
-            gc = gspread.service_account(filename=API_KEY_FILE)
-            sh = gc.open_by_key(SPREADSHEET_ID)
-            return sh.worksheet("出荷スケジュール")
-        
-        schedule_worksheet = retry_with_backoff(get_worksheet)
-        
-        # データから実際に存在する月を動的に取得し、時系列順にソート
-        all_months = set()
-        for df in [schedule_summary_quantity_df, schedule_summary_count_df]:
-            if not df.empty:
-                all_months.update(df['月'].dropna().unique())
-        
-        # 月を時系列順にソート
-        def sort_key(month_str):
-            if pd.isna(month_str):
-                return (9999, 13)  # Noneは最後に
-            year, month = month_str.replace('月', '').split('年')
-            return (int(year), int(month))
-        
-        months_ordered = sorted([m for m in all_months if not pd.isna(m)], key=sort_key)
-        print(f"出荷スケジュールシート - 検出された月: {months_ordered}")
-        
-        # カテゴリと列のマッピング（C列=無洗米、D列=白米、E列=玄米、F列=ペットボトル）
-        category_col_map = {
-            "無洗米": 3,  # C列
-            "白米": 4,    # D列
-            "玄米": 5,    # E列
-            "ペットボトル": 6  # F列
-        }
-        
-        # 日付グループと行のマッピング
-        date_group_row_map = {
-            "2日グループ": {"count": 3, "quantity": 4},
-            "10日グループ": {"count": 5, "quantity": 6},
-            "17日グループ": {"count": 7, "quantity": 8},
-            "24日グループ": {"count": 9, "quantity": 10}
-        }
-        
-        # 書き込み用データを格納する配列を初期化
-        data_to_write = []
-
-        # 各月の処理
-        for i, month in enumerate(months_ordered):
-            # 各月の開始列を計算（2025年9月がC列(3)から開始、7列間隔）
-            # 2025年9月: C列(3), 2025年10月: J列(10), 2025年11月: Q列(17)...
-            start_col = 3 + i * 7
-            
-            # 各カテゴリの処理
-            for category, col_offset in category_col_map.items():
-                col = start_col + col_offset - 3  # C列基準でオフセット調整
-                
-                # 各日付グループの処理
-                for date_group, rows in date_group_row_map.items():
-                    # 件数の集計
-                    count = schedule_summary_count_df.loc[
-                        (schedule_summary_count_df['月'] == month) &
-                        (schedule_summary_count_df['カテゴリ'] == category) &
-                        (schedule_summary_count_df['日付グループ'] == date_group),
-                        '件数'
-                    ].sum()
-                    
-                    # 重量の集計
-                    quantity = schedule_summary_quantity_df.loc[
-                        (schedule_summary_quantity_df['月'] == month) &
-                        (schedule_summary_quantity_df['カテゴリ'] == category) &
-                        (schedule_summary_quantity_df['日付グループ'] == date_group),
-                        '数量'
-                    ].sum()
-                    
-                    # ペットボトルの場合は重量に2をかける（1本2kg）
-                    if category == "ペットボトル":
-                        quantity = quantity * 2
-                    
-                    # int64をintに変換し、0の場合は空にする
-                    count = int(count) if count > 0 else ''
-                    quantity = int(quantity) if quantity > 0 else ''
-                    
-                    # 件数の書き込み
-                    data_to_write.append({
-                        'range': gspread.utils.rowcol_to_a1(rows['count'], col),
-                        'values': [[count]]
-                    })
-                    
-                    # 重量の書き込み
-                    data_to_write.append({
-                        'range': gspread.utils.rowcol_to_a1(rows['quantity'], col),
-                        'values': [[quantity]]
-                    })
-        
-        # gspreadの`batch_update`を使って効率的に書き込み（リトライ付き）
-        if data_to_write:
-            retry_with_backoff(schedule_worksheet.batch_update, data_to_write)
-            print("出荷スケジュールシートの更新が完了しました。")
-        else:
+        data_to_write = build_schedule_data(month_keys, cube)
+        if not data_to_write:
             print("出荷スケジュールシートに書き込むデータがありませんでした。")
+        return data_to_write
     
-    except gspread.exceptions.GSpreadException as e:
-        error_msg_jp = translate_error(str(e))
-        print(f"出荷スケジュールシートAPIのエラー: {error_msg_jp}")
-        print(f"詳細: {e}")
     except Exception as e:
         error_msg_jp = translate_error(str(e))
         print(f"出荷スケジュールシートの更新でエラーが発生しました: {error_msg_jp}")
         print(f"詳細: {e}")
+        return []
 
-def update_spreadsheet(summary_quantity_df, summary_count_df, not_expired_summary_quantity_df, not_expired_summary_count_df):
+def build_summary_data(month_keys, cube):
     """
-    集計データをスプレッドシートに書き込みます。
+    寄附受付集計シートの書き込みデータを集計キューブから作成します。
     """
-    try:
-        # 認証情報（リトライ付き）
-        def get_worksheet():
-            gc = gspread.service_account(filename=API_KEY_FILE)
-            sh = gc.open_by_key(SPREADSHEET_ID)
-            return sh.worksheet(SHEET_NAME)
-        
-        worksheet = retry_with_backoff(get_worksheet)
+    # 月 × カテゴリ × タイプ × 出荷状況 × 指標に集約
+    by_status = cube.sum(axis=(4, 5))
+    all_values = by_status.sum(axis=3)
+    not_expired_values = by_status[:, :, :, CUBE_STATUSES.index("まだ過ぎてない")]
 
-        # データから実際に存在する月を動的に取得し、時系列順にソート
-        all_months = set()
-        for df in [summary_quantity_df, summary_count_df, not_expired_summary_quantity_df, not_expired_summary_count_df]:
-            if not df.empty:
-                all_months.update(df['月'].dropna().unique())
-        
-        # 月を時系列順にソート
-        def sort_key(month_str):
-            if pd.isna(month_str):
-                return (9999, 13)  # Noneは最後に
-            # "2025年9月" -> "2025年9" -> ["2025", "9"]
-            year, month = month_str.replace('月', '').split('年')
-            return (int(year), int(month))
-        
-        months_ordered = sorted([m for m in all_months if not pd.isna(m)], key=sort_key)
-        print(f"検出された月: {months_ordered}")
-        print(f"月の数: {len(months_ordered)}")
-        
-        # 仕様メモに合わせた行マップ
-        row_map = {
-            "玄米": {"quantity_all": 7, "quantity_not_expired": 8, "count_all": 9, "count_not_expired": 10},
-            "白米": {"quantity_all": 11, "quantity_not_expired": 12, "count_all": 13, "count_not_expired": 14},
-            "無洗米": {"quantity_all": 15, "quantity_not_expired": 16, "count_all": 17, "count_not_expired": 18},
-            "ペットボトル": {"quantity_all": 32, "quantity_not_expired": 33, "count_all": 34, "count_not_expired": 35},
-        }
-        
-        # 書き込み用データを格納する配列を初期化
-        data_to_write = []
-        
-        # 各カテゴリの処理
-        for category, rows in row_map.items():
-            # 累計計算用の変数（全ての商品）
-            teiki_quantity_total = 0
-            tanpin_quantity_total = 0
-            teiki_count_total = 0
-            tanpin_count_total = 0
-            
-            # 累計計算用の変数（未出荷商品）
-            teiki_quantity_not_expired_total = 0
-            tanpin_quantity_not_expired_total = 0
-            teiki_count_not_expired_total = 0
-            tanpin_count_not_expired_total = 0
-            
-            # 月別データの書き込み
-            for i, month in enumerate(months_ordered):
-                # 数量データ（全ての商品）
-                teiki_quantity = summary_quantity_df.loc[
-                    (summary_quantity_df['月'] == month) &
-                    (summary_quantity_df['カテゴリ'] == category) &
-                    (summary_quantity_df['タイプ'] == '定期便'),
-                    '数量'
-                ].sum()
-                
-                tanpin_quantity = summary_quantity_df.loc[
-                    (summary_quantity_df['月'] == month) &
-                    (summary_quantity_df['カテゴリ'] == category) &
-                    (summary_quantity_df['タイプ'] == '単品'),
-                    '数量'
-                ].sum()
-                
-                # 件数データ（全ての商品）
-                teiki_count = summary_count_df.loc[
-                    (summary_count_df['月'] == month) &
-                    (summary_count_df['カテゴリ'] == category) &
-                    (summary_count_df['タイプ'] == '定期便'),
-                    '件数'
-                ].sum()
-                
-                tanpin_count = summary_count_df.loc[
-                    (summary_count_df['月'] == month) &
-                    (summary_count_df['カテゴリ'] == category) &
-                    (summary_count_df['タイプ'] == '単品'),
-                    '件数'
-                ].sum()
-                
-                # 未出荷商品の数量データ
-                teiki_quantity_not_expired = not_expired_summary_quantity_df.loc[
-                    (not_expired_summary_quantity_df['月'] == month) &
-                    (not_expired_summary_quantity_df['カテゴリ'] == category) &
-                    (not_expired_summary_quantity_df['タイプ'] == '定期便'),
-                    '数量'
-                ].sum()
-                
-                tanpin_quantity_not_expired = not_expired_summary_quantity_df.loc[
-                    (not_expired_summary_quantity_df['月'] == month) &
-                    (not_expired_summary_quantity_df['カテゴリ'] == category) &
-                    (not_expired_summary_quantity_df['タイプ'] == '単品'),
-                    '数量'
-                ].sum()
-                
-                # 未出荷商品の件数データ
-                teiki_count_not_expired = not_expired_summary_count_df.loc[
-                    (not_expired_summary_count_df['月'] == month) &
-                    (not_expired_summary_count_df['カテゴリ'] == category) &
-                    (not_expired_summary_count_df['タイプ'] == '定期便'),
-                    '件数'
-                ].sum()
-                
-                tanpin_count_not_expired = not_expired_summary_count_df.loc[
-                    (not_expired_summary_count_df['月'] == month) &
-                    (not_expired_summary_count_df['カテゴリ'] == category) &
-                    (not_expired_summary_count_df['タイプ'] == '単品'),
-                    '件数'
-                ].sum()
-
-                # int64をintに変換し、0の場合は空にする
-                teiki_quantity = int(teiki_quantity) if teiki_quantity > 0 else ''
-                tanpin_quantity = int(tanpin_quantity) if tanpin_quantity > 0 else ''
-                teiki_count = int(teiki_count) if teiki_count > 0 else ''
-                tanpin_count = int(tanpin_count) if tanpin_count > 0 else ''
-                teiki_quantity_not_expired = int(teiki_quantity_not_expired) if teiki_quantity_not_expired > 0 else ''
-                tanpin_quantity_not_expired = int(tanpin_quantity_not_expired) if tanpin_quantity_not_expired > 0 else ''
-                teiki_count_not_expired = int(teiki_count_not_expired) if teiki_count_not_expired > 0 else ''
-                tanpin_count_not_expired = int(tanpin_count_not_expired) if tanpin_count_not_expired > 0 else ''
+    # 集計対象の行がある月を時系列順に抽出
+    month_indexes = [m for m in range(len(month_keys)) if all_values[m, :, :, CUBE_MEASURES.index("件数")].sum() > 0]
+    months_ordered = [month_key_to_label(int(month_keys[m])) for m in month_indexes]
+    print(f"検出された月: {months_ordered}")
+    print(f"月の数: {len(months_ordered)}")
+
+    # 仕様メモに合わせた行マップ
+    row_map = {
+        "玄米": {"quantity_all": 7, "quantity_not_expired": 8, "count_all": 9, "count_not_expired": 10},
+        "白米": {"quantity_all": 11, "quantity_not_expired": 12, "count_all": 13, "count_not_expired": 14},
+        "無洗米": {"quantity_all": 15, "quantity_not_expired": 16, "count_all": 17, "count_not_expired": 18},
+        "ペットボトル": {"quantity_all": 32, "quantity_not_expired": 33, "count_all": 34, "count_not_expired": 35},
+    }
+
+    # 行の種類とキューブの取り出し元（全ての商品/未出荷商品 × 数量/件数）
+    row_sources = {
+        "quantity_all": (all_values, CUBE_MEASURES.index("数量")),
+        "quantity_not_expired": (not_expired_values, CUBE_MEASURES.index("数量")),
+        "count_all": (all_values, CUBE_MEASURES.index("件数")),
+        "count_not_expired": (not_expired_values, CUBE_MEASURES.index("件数")),
+    }
+    teiki = CUBE_TYPES.index("定期便")
+    tanpin = CUBE_TYPES.index("単品")
+
+    # 書き込み用データを格納する配列を初期化
+    data_to_write = []
+
+    # 各カテゴリの処理
+    for category, rows in row_map.items():
+        c = CUBE_CATEGORIES.index(category)
+
+        # 累計計算用の変数（定期便、単品）
+        totals = {row_name: [0, 0] for row_name in rows}
+
+        # 月別データの書き込み
+        for i, m in enumerate(month_indexes):
+            # 列番号を計算（D列(4)から開始）
+            col_teiki = 4 + i * 2  # D列(4)から開始
+            col_tanpin = 5 + i * 2  # E列(5)から開始
+
+            # 全ての商品・未出荷商品の(kg/本)・(件)の順に書き込み
+            for row_name in ["quantity_all", "quantity_not_expired", "count_all", "count_not_expired"]:
+                values, measure = row_sources[row_name]
+                teiki_value = format_cell_value(values[m, c, teiki, measure])
+                tanpin_value = format_cell_value(values[m, c, tanpin, measure])
 
                 # 累計に加算（数値の場合のみ）
-                if isinstance(teiki_quantity, int):
-                    teiki_quantity_total += teiki_quantity
-                if isinstance(tanpin_quantity, int):
-                    tanpin_quantity_total += tanpin_quantity
-                if isinstance(teiki_count, int):
-                    teiki_count_total += teiki_count
-                if isinstance(tanpin_count, int):
-                    tanpin_count_total += tanpin_count
-                
-                # 未出荷商品の累計に加算（数値の場合のみ）
-                if isinstance(teiki_quantity_not_expired, int):
-                    teiki_quantity_not_expired_total += teiki_quantity_not_expired
-                if isinstance(tanpin_quantity_not_expired, int):
-                    tanpin_quantity_not_expired_total += tanpin_quantity_not_expired
-                if isinstance(teiki_count_not_expired, int):
-                    teiki_count_not_expired_total += teiki_count_not_expired
-                if isinstance(tanpin_count_not_expired, int):
-                    tanpin_count_not_expired_total += tanpin_count_not_expired
-
-                # 列番号を計算（D列(4)から開始）
-                col_teiki = 4 + i * 2  # D列(4)から開始
-                col_tanpin = 5 + i * 2  # E列(5)から開始
-
-                # 書き込みリクエストを作成
-                # 全ての商品(kg/本)
-                data_to_write.append({
-                    'range': gspread.utils.rowcol_to_a1(rows['quantity_all'], col_teiki),
-                    'values': [[teiki_quantity]]
-                })
-                data_to_write.append({
-                    'range': gspread.utils.rowcol_to_a1(rows['quantity_all'], col_tanpin),
-                    'values': [[tanpin_quantity]]
-                })
-                
-                # 未出荷商品(kg/本) - 玄米、白米、無洗米、ペットボトル
-                data_to_write.append({
-                    'range': gspread.utils.rowcol_to_a1(rows['quantity_not_expired'], col_teiki),
-                    'values': [[teiki_quantity_not_expired]]
-                })
-                data_to_write.append({
-                    'range': gspread.utils.rowcol_to_a1(rows['quantity_not_expired'], col_tanpin),
-                    'values': [[tanpin_quantity_not_expired]]
-                })
-                
-                # 全ての商品(件)
-                data_to_write.append({
-                    'range': gspread.utils.rowcol_to_a1(rows['count_all'], col_teiki),
-                    'values': [[teiki_count]]
-                })
-                data_to_write.append({
-                    'range': gspread.utils.rowcol_to_a1(rows['count_all'], col_tanpin),
-                    'values': [[tanpin_count]]
-                })
-                
-                # 未出荷商品(件) - 玄米、白米、無洗米、ペットボトル
+                if isinstance(teiki_value, int):
+                    totals[row_name][0] += teiki_value
+                if isinstance(tanpin_value, int):
+                    totals[row_name][1] += tanpin_value
+
                 data_to_write.append({
-                    'range': gspread.utils.rowcol_to_a1(rows['count_not_expired'], col_teiki),
-                    'values': [[teiki_count_not_expired]]
+                    'range': gspread.utils.rowcol_to_a1(rows[row_name], col_teiki),
+                    'values': [[teiki_value]]
                 })
                 data_to_write.append({
-                    'range': gspread.utils.rowcol_to_a1(rows['count_not_expired'], col_tanpin),
-                    'values': [[tanpin_count_not_expired]]
+                    'range': gspread.utils.rowcol_to_a1(rows[row_name], col_tanpin),
+                    'values': [[tanpin_value]]
                 })
-            
-            # 累計の書き込み（B列: 定期便合計、C列: 単品合計）
-            # 全ての商品(kg/本)の累計
-            data_to_write.append({
-                'range': gspread.utils.rowcol_to_a1(rows['quantity_all'], 2),  # B列
-                'values': [[teiki_quantity_total if teiki_quantity_total > 0 else '']]
-            })
-            data_to_write.append({
-                'range': gspread.utils.rowcol_to_a1(rows['quantity_all'], 3),  # C列
-                'values': [[tanpin_quantity_total if tanpin_quantity_total > 0 else '']]
-            })
-            
-            # 全ての商品(件)の累計
-            data_to_write.append({
-                'range': gspread.utils.rowcol_to_a1(rows['count_all'], 2),  # B列
-                'values': [[teiki_count_total if teiki_count_total > 0 else '']]
-            })
-            data_to_write.append({
-                'range': gspread.utils.rowcol_to_a1(rows['count_all'], 3),  # C列
-                'values': [[tanpin_count_total if tanpin_count_total > 0 else '']]
-            })
-            
-            # 未出荷商品(kg/本)の累計
-            data_to_write.append({
-                'range': gspread.utils.rowcol_to_a1(rows['quantity_not_expired'], 2),  # B列
-                'values': [[teiki_quantity_not_expired_total if teiki_quantity_not_expired_total > 0 else '']]
-            })
-            data_to_write.append({
-                'range': gspread.utils.rowcol_to_a1(rows['quantity_not_expired'], 3),  # C列
-                'values': [[tanpin_quantity_not_expired_total if tanpin_quantity_not_expired_total > 0 else '']]
-            })
-            
-            # 未出荷商品(件)の累計
+
+        # 累計の書き込み（B列: 定期便合計、C列: 単品合計）
+        for row_name in ["quantity_all", "count_all", "quantity_not_expired", "count_not_expired"]:
+            teiki_total, tanpin_total = totals[row_name]
             data_to_write.append({
-                'range': gspread.utils.rowcol_to_a1(rows['count_not_expired'], 2),  # B列
-                'values': [[teiki_count_not_expired_total if teiki_count_not_expired_total > 0 else '']]
+                'range': gspread.utils.rowcol_to_a1(rows[row_name], 2),  # B列
+                'values': [[teiki_total if teiki_total > 0 else '']]
             })
             data_to_write.append({
-                'range': gspread.utils.rowcol_to_a1(rows['count_not_expired'], 3),  # C列
-                'values': [[tanpin_count_not_expired_total if tanpin_count_not_expired_total > 0 else '']]
+                'range': gspread.utils.rowcol_to_a1(rows[row_name], 3),  # C列
+                'values': [[tanpin_total if tanpin_total > 0 else '']]
             })
 
-        # A4セルに今日の日付を設定
-        today = datetime.now()
-        year = today.year
-        month = today.month
-        day = today.day
-        day_of_week = ['月', '火', '水', '木', '金', '土', '日'][today.weekday()]
-        formatted_date = f"{year}年{month}月{day}日({day_of_week})"
-        
-        data_to_write.append({
-            'range': 'A4',
-            'values': [[formatted_date]]
-        })
+    # A4セルに今日の日付を設定
+    today = datetime.now()
+    year = today.year
+    month = today.month
+    day = today.day
+    day_of_week = ['月', '火', '水', '木', '金', '土', '日'][today.weekday()]
+    formatted_date = f"{year}年{month}月{day}日({day_of_week})"
 
-        # gspreadの`batch_update`を使って効率的に書き込み（リトライ付き）
-        retry_with_backoff(worksheet.batch_update, data_to_write)
-        print("スプレッドシートの更新が完了しました。")
+    data_to_write.append({
+        'range': 'A4',
+        'values': [[formatted_date]]
+    })
 
-    except gspread.exceptions.GSpreadException as e:
+    return data_to_write
+
+def prepare_summary_sheet(month_keys, cube):
+    """
+    寄附受付集計シートの書き込みデータ（1セルずつ）を作成します。
+    """
+    try:
+        return build_summary_data(month_keys, cube)
+
+    except Exception as e:
         error_msg_jp = translate_error(str(e))
-        print(f"スプレッドシートAPIのエラー: {error_msg_jp}")
+        print(f"エラーが発生しました: {error_msg_jp}")
         print(f"詳細: {e}")
-    except FileNotFoundError as e:
+        return []
+
+def with_sheet_name(sheet_name, blocks):
+    """書き込み範囲をシート名付きのA1形式（'シート名'!A1:B2）に変換します。"""
+    return [
+        {'range': gspread.utils.absolute_range_name(sheet_name, block['range']), 'values': block['values']}
+        for block in blocks
+    ]
+
+def load_snapshot(path=SNAPSHOT_FILE):
+    """
+    前回書き込みに成功したセルの値をシートごとに読み込みます。
+
+    Returns:
+        {シート名: {A1形式のセル: 値}} の辞書（記録がない場合は空）
+    """
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, encoding='utf-8') as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"警告: 前回の書き込み記録を読み込めませんでした。全セルを書き込みます: {e}")
+        return {}
+
+    # 別のスプレッドシートの記録は使わない
+    if snapshot.get('spreadsheet_id') != SPREADSHEET_ID:
+        return {}
+    return snapshot.get('sheets', {})
+
+def save_snapshot(sheets, path=SNAPSHOT_FILE):
+    """書き込みに成功したセルの値を記録します（一時ファイル経由で置き換え）。"""
+    with atomic_write(path) as f:
+        json.dump({'spreadsheet_id': SPREADSHEET_ID, 'sheets': sheets}, f, ensure_ascii=False)
+
+def diff_cells(data_to_write, previous_cells):
+    """
+    前回書き込んだ値から変わったセル（数値から空になったセルを含む）だけを返します。
+
+    Args:
+        data_to_write: {'range': A1形式のセル, 'values': [[値]]} のリスト
+        previous_cells: {A1形式のセル: 前回の値} の辞書
+    """
+    return [
+        item for item in data_to_write
+        if item['range'] not in previous_cells or previous_cells[item['range']] != item['values'][0][0]
+    ]
+
+def compile_sheet_updates(sheet_cells, snapshot, full_write=False):
+    """
+    各シートの書き込みデータを差分に絞り、長方形の範囲にまとめます。
+
+    Args:
+        sheet_cells: {シート名: 1セルずつの書き込みデータ} の辞書
+        snapshot: load_snapshotで読み込んだ前回の値
+        full_write: Trueの場合は差分に絞らず全セルを書き込む
+
+    Returns:
+        シート名付きの {'range': ..., 'values': ...} のリスト
+    """
+    data_to_write = []
+    for sheet_name, cells in sheet_cells.items():
+        changed_cells = cells if full_write else diff_cells(cells, snapshot.get(sheet_name, {}))
+        blocks = compile_blocks(changed_cells)
+        print(f"{sheet_name}シート - 書き込み範囲: {len(cells)}セル中{len(changed_cells)}セル → {len(blocks)}範囲")
+        data_to_write += with_sheet_name(sheet_name, blocks)
+    return data_to_write
+
+def update_snapshot(snapshot, sheet_cells):
+    """書き込んだセルの値で前回の値の記録を更新します。"""
+    for sheet_name, cells in sheet_cells.items():
+        previous_cells = snapshot.setdefault(sheet_name, {})
+        for item in cells:
+            previous_cells[item['range']] = item['values'][0][0]
+    return snapshot
+
+def open_spreadsheet():
+    """
+    認証してスプレッドシートを開きます。1回の実行につき1度だけ呼び出します。
+    """
+    gc = gspread.service_account(filename=API_KEY_FILE)
+    return gc.open_by_key(SPREADSHEET_ID)
+
+def write_sheets(spreadsheet, data_to_write):
+    """
+    全シートの書き込み範囲を1回のvalues_batch_updateでまとめて書き込みます。
+
+    Args:
+        spreadsheet: open_spreadsheetで開いたスプレッドシート
+        data_to_write: シート名付きの {'range': ..., 'values': ...} のリスト
+
+    Returns:
+        書き込みに成功した（または書き込むデータがなかった）場合はTrue
+    """
+    try:
+        if not data_to_write:
+            print("スプレッドシートに書き込むデータ（前回からの変更）がありませんでした。")
+            return True
+
+        body = {
+            'valueInputOption': 'RAW',
+            'data': data_to_write
+        }
+
+        # スプレッドシート単位の`values_batch_update`で全シートを一括書き込み（リトライ付き）
+        retry_with_backoff(spreadsheet.values_batch_update, body)
+        print(f"スプレッドシートの更新が完了しました。（{len(data_to_write)}範囲）")
+        return True
+
+    except gspread.exceptions.GSpreadException as e:
+        # 書き込みに失敗したことをトレースの区間（sheets.values_batch_update）に残す
+        tracing.record_error(e)
         error_msg_jp = translate_error(str(e))
-        print(f"エラー: {error_msg_jp}")
+        print(f"スプレッドシートAPIのエラー: {error_msg_jp}")
         print(f"詳細: {e}")
     except Exception as e:
+        tracing.record_error(e)
         error_msg_jp = translate_error(str(e))
         print(f"エラーが発生しました: {error_msg_jp}")
         print(f"詳細: {e}")
 
+def main(full_write=False, from_archive=False, day=None, stream=False):
+    """
+    Args:
+        full_write: Trueの場合は前回の書き込み記録を使わず全セルを書き込む
+        from_archive: Trueの場合はCSVではなくローカルのアーカイブから集計する
+        day: 指定した場合は今日ではなくその日のマニフェストのCSVファイルから集計する
+        stream: Trueの場合はCSVを一定の行数ずつ読み込んで集計する（メモリ使用量を抑える。
+            配送管理IDとセル番号の組は行数に比例して残る。アーカイブは更新しない）
 
-# ダウンロードフォルダのパス
-downloads_folder = "/Users/nj-cmd11/Downloads"
+    Returns:
+        スプレッドシートへの書き込みまで成功した場合はTrue
+    """
+    # ダウンロードフォルダのパス
+    downloads_folder = "/Users/nj-cmd11/Downloads"
 
-try:
-    # 今日ダウンロードしたdelivery_listから始まるCSVファイルを特定
-    today_csv_files = find_today_delivery_csvs(downloads_folder)
-    print(f"今日ダウンロードしたdelivery_listファイル: {[os.path.basename(f) for f in today_csv_files]}")
+    # 各段階とAPI呼び出しの時間・行数・メモリ・リトライをtrace_log.jsonlに記録
+    tracing.start_run("edit.py")
+    status = "error"
 
-    # 複数のCSVファイルを読み込んで結合
-    dataframes = []
-    for csv_file in today_csv_files:
-        try:
-            df_temp = pd.read_csv(csv_file, encoding='cp932')
-            dataframes.append(df_temp)
-            print(f"CSVファイル「{os.path.basename(csv_file)}」をCP932で読み込みました。")
-        except Exception as e:
-            print(f"CSVファイル「{os.path.basename(csv_file)}」の読み込みでエラーが発生しました: {e}")
-            continue
-    
-    if not dataframes:
-        raise FileNotFoundError("有効なCSVファイルが読み込めませんでした。")
-    
-    # データフレームを結合
-    df = pd.concat(dataframes, ignore_index=True)
-    print(f"合計{len(dataframes)}件のCSVファイルを結合しました。")
+    try:
+        if from_archive:
+            # 集計に必要な出荷月（2025年9月以降）のアーカイブだけを読み込む
+            with tracing.span("read_archive") as span:
+                df = read_archive(start_month_key=MONTH_KEY_START)
+                span['rows_out'] = len(df)
+        else:
+            # 今日ダウンロードしたdelivery_listから始まるCSVファイルを特定
+            with tracing.span("discover") as span:
+                today_csv_files = find_today_delivery_csvs(downloads_folder, day)
+                span['rows_out'] = len(today_csv_files)
+            print(f"今日ダウンロードしたdelivery_listファイル: {[os.path.basename(f) for f in today_csv_files]}")
 
-    # 必要な列のみを抽出
-    df = df[['返礼品', '出荷予定日', '出荷日', '申込日', '商品コード', '配送ステータス']]
-    
-    # カテゴリ分けと数量の抽出
-    df['カテゴリ'] = df['返礼品'].apply(get_product_category)
-    df['タイプ'] = df['返礼品'].apply(get_product_type)
-    df['数量'] = df.apply(lambda row: get_product_quantity(row['返礼品'], row['カテゴリ']), axis=1)
-    df['件数'] = df.apply(lambda row: get_product_count(), axis=1)
-    df['月'] = df.apply(lambda row: get_month_with_fallback(row['出荷予定日'], row['出荷日']), axis=1)
-    df['日付グループ'] = df.apply(lambda row: get_date_group(row['出荷予定日'], row['出荷日']), axis=1)
-    df['出荷状況'] = df['配送ステータス'].apply(get_delivery_status)
-    
-    # 集計対象外の商品名を出力
-    other_products = df[df['カテゴリ'] == "その他"]['返礼品'].unique()
-    if len(other_products) > 0:
-        print("以下の商品名は集計されませんでした:")
-        for product in other_products:
-            print(f"- {product}")
-    else:
-        print("集計対象外の商品は見つかりませんでした。")
+            # 複数のCSVファイルを並列に読み込み、重複した配送管理IDを除いて結合
+            if not stream:
+                with tracing.span("read", rows_in=len(today_csv_files)) as span:
+                    df = load_delivery_csvs(today_csv_files, engine=CSV_ENGINE)
+                    span['rows_out'] = 0 if df is None else len(df)
+                if df is None:
+                    raise FileNotFoundError("有効なCSVファイルが読み込めませんでした。")
+
+        if stream and not from_archive:
+            # チャンクごとに分類・セル番号への変換を行い、集計キューブに畳み込む
+            print("--streamではアーカイブを更新しません（更新する場合は--streamなしで実行してください）。")
+            with tracing.span("stream", rows_in=len(today_csv_files)) as span:
+                result = stream_summary_cube(today_csv_files)
+                if result is None:
+                    raise FileNotFoundError("有効なCSVファイルが読み込めませんでした。")
+                month_keys, cube, span['rows_out'] = result
+        else:
+            # 必要な列のみを抽出
+            df = df[[DELIVERY_ID_COLUMN] + DELIVERY_COLUMNS]
+
+            # カテゴリ分けと数量の抽出
+            # 返礼品の種類ごとに1回だけ分類して各行に展開
+            with tracing.span("classify", rows_in=len(df)) as span:
+                product_df = classify_products(df['返礼品'])
+                df['カテゴリ'] = product_df['カテゴリ']
+                df['タイプ'] = product_df['タイプ']
+                df['数量'] = product_df['数量']
+                df['件数'] = get_product_count()
+                df['出荷状況'] = classify_delivery_statuses(df['配送ステータス'])
+                span['rows_out'] = len(df)
+            # 出荷予定日・出荷日を一括で変換して月と日付グループを判定
+            with tracing.span("date_group", rows_in=len(df)) as span:
+                date_df = classify_shipping_dates(df['出荷予定日'], df['出荷日'])
+                df['月キー'] = date_df['月キー']
+                df['月'] = date_df['月']
+                df['日付グループ'] = date_df['日付グループ']
+                span['rows_out'] = len(df)
+
+            # 今日のエクスポートをアーカイブに追加・更新（失敗しても集計は続ける）
+            if not from_archive:
+                with tracing.span("archive", rows_in=len(df)) as span:
+                    try:
+                        span['rows_out'] = upsert_archive(df, datetime.now().strftime(DATE_FORMAT))
+                    except Exception as e:
+                        print(f"アーカイブの更新でエラーが発生しました: {translate_error(str(e))}")
+                        print(f"詳細: {e}")
+
+            # 集計対象外の商品名を出力
+            other_products = df[df['カテゴリ'] == "その他"]['返礼品'].unique()
+            if len(other_products) > 0:
+                print("以下の商品名は集計されませんでした:")
+                for product in other_products:
+                    print(f"- {product}")
+            else:
+                print("集計対象外の商品は見つかりませんでした。")
+
+            with tracing.span("filter", rows_in=len(df)) as span:
+                # 不要なカテゴリを除外
+                df = df[df['カテゴリ'].isin(["玄米", "白米", "無洗米", "ペットボトル"])]
+
+                # 集計除外対象を除外
+                excluded_count = len(df[df['出荷状況'] == '集計除外'])
+                if excluded_count > 0:
+                    print(f"集計から除外された件数: {excluded_count}件（配送キャンセル、返送、配送対象外）")
+                df = df[df['出荷状況'] != '集計除外']
+                span['rows_out'] = len(df)
+
+            # 月 × カテゴリ × タイプ × 出荷状況 × 日付グループ × 数量の集計キューブを作成
+            with tracing.span("aggregate", rows_in=len(df)) as span:
+                month_keys, cube = build_summary_cube(df)
+                span['rows_out'] = len(month_keys)
+
+        # 各シート（寄附受付集計・出荷スケジュール・資材消費管理）の書き込みデータを作成
+        with tracing.span("layout", rows_in=len(month_keys)) as span:
+            sheet_cells = {
+                SHEET_NAME: prepare_summary_sheet(month_keys, cube),
+                "出荷スケジュール": prepare_schedule_sheet(month_keys, cube),
+                "資材消費管理": prepare_material_consumption_sheet(month_keys, cube),
+            }
+            span['rows_out'] = sum(len(cells) for cells in sheet_cells.values())
         
-    # 不要なカテゴリを除外
-    df = df[df['カテゴリ'].isin(["玄米", "白米", "無洗米", "ペットボトル"])]
-    
-    # 集計除外対象を除外
-    excluded_count = len(df[df['出荷状況'] == '集計除外'])
-    if excluded_count > 0:
-        print(f"集計から除外された件数: {excluded_count}件（配送キャンセル、返送、配送対象外）")
-    df = df[df['出荷状況'] != '集計除外']
-    
-    # 集計（数量と件数の両方）
-    summary_quantity = df.groupby(['月', 'カテゴリ', 'タイプ'])['数量'].sum().reset_index()
-    summary_count = df.groupby(['月', 'カテゴリ', 'タイプ'])['件数'].sum().reset_index()
-    
-    # 「まだ過ぎていない」ものの集計（玄米、白米、無洗米、ペットボトル）
-    not_expired_df = df[df['出荷状況'] == 'まだ過ぎてない']
-    not_expired_summary_quantity = not_expired_df[not_expired_df['カテゴリ'].isin(['玄米', '白米', '無洗米', 'ペットボトル'])].groupby(['月', 'カテゴリ', 'タイプ'])['数量'].sum().reset_index()
-    not_expired_summary_count = not_expired_df[not_expired_df['カテゴリ'].isin(['玄米', '白米', '無洗米', 'ペットボトル'])].groupby(['月', 'カテゴリ', 'タイプ'])['件数'].sum().reset_index()
-
-    # 出荷スケジュール用の集計（月別・日付グループ別・カテゴリ別）
-    # 日付グループがNoneのデータを除外
-    schedule_df = df[df['日付グループ'].notna()]
-    schedule_summary_quantity = schedule_df.groupby(['月', 'カテゴリ', '日付グループ'])['数量'].sum().reset_index()
-    schedule_summary_count = schedule_df.groupby(['月', 'カテゴリ', '日付グループ'])['件数'].sum().reset_index()
-
-    # スプレッドシートの更新処理を呼び出し
-    update_spreadsheet(summary_quantity, summary_count, not_expired_summary_quantity, not_expired_summary_count)
-    
-    # 出荷スケジュールシートの更新処理を呼び出し
-    update_schedule_spreadsheet(schedule_summary_quantity, schedule_summary_count)
-    
-    # 資材消費管理シートの更新処理を呼び出し
-    update_material_consumption_spreadsheet(df)
-    
-except FileNotFoundError as e:
-    error_msg_jp = translate_error(str(e))
-    print(f"エラー: {error_msg_jp}")
-    print(f"詳細: {e}")
-except KeyError as e:
-    error_msg_jp = translate_error(str(e))
-    print(f"エラー: CSVファイルに指定された列が見つかりません: {error_msg_jp}")
-    print(f"詳細: {e}")
-except Exception as e:
-    error_msg_jp = translate_error(str(e))
-    print(f"エラーが発生しました: {error_msg_jp}")
-    print(f"詳細: {e}")
\ No newline at end of file
+        # 前回書き込んだ値から変わったセルだけを範囲にまとめる
+        with tracing.span("diff", rows_in=sum(len(cells) for cells in sheet_cells.values())) as span:
+            snapshot = load_snapshot()
+            if full_write:
+                print("全セルを書き込みます（差分書き込みなし）。")
+            data_to_write = compile_sheet_updates(sheet_cells, snapshot, full_write)
+            span['rows_out'] = len(data_to_write)
+        
+        # 認証とスプレッドシートの取得は1回だけ行い、全シートをまとめて書き込み（リトライ付き）
+        if data_to_write:
+            with tracing.span("sheets.open"):
+                spreadsheet = retry_with_backoff(open_spreadsheet)
+        else:
+            spreadsheet = None
+        with tracing.span("sheets.values_batch_update", rows_in=len(data_to_write)):
+            written = write_sheets(spreadsheet, data_to_write)
+        if written:
+            # 書き込みに成功した場合のみ記録を更新
+            save_snapshot(update_snapshot(snapshot, sheet_cells))
+            status = "ok"
+        
+    except FileNotFoundError as e:
+        error_msg_jp = translate_error(str(e))
+        print(f"エラー: {error_msg_jp}")
+        print(f"詳細: {e}")
+    except KeyError as e:
+        error_msg_jp = translate_error(str(e))
+        print(f"エラー: CSVファイルに指定された列が見つかりません: {error_msg_jp}")
+        print(f"詳細: {e}")
+    except Exception as e:
+        error_msg_jp = translate_error(str(e))
+        print(f"エラーが発生しました: {error_msg_jp}")
+        print(f"詳細: {e}")
+    finally:
+        tracing.finish_run(status)
+    return status == "ok"
+
+
+if __name__ == "__main__":
+    # --full を指定すると前回の書き込み記録を使わず全セルを書き込む
+    # --archive を指定するとCSVではなくローカルのアーカイブから集計する
+    # --date YYYY-MM-DD を指定するとその日のマニフェストのCSVファイルから集計する
+    # --stream を指定するとCSVを一定の行数ずつ読み込んで集計する（大きなエクスポートでメモリ使用量を抑える）
+    args = sys.argv[1:]
+    day = datetime.strptime(args[args.index("--date") + 1], "%Y-%m-%d").date() if "--date" in args else None
+    main(full_write="--full" in args, from_archive="--archive" in args, day=day, stream="--stream" in args)
@@ -0,0 +1,140 @@
+import os
+import sys
+import csv
+import random
+from datetime import date, datetime, timedelta
+
+# delivery_list*.csvの列（ポータルの出力と同じ並び。集計で使わない列は値を空にする）
+DELIVERY_HEADER = [
+    "配送管理ID", "寄附ID", "寄附者番号", "寄附者", "寄附者カナ", "寄附者郵便番号", "寄附者住所", "寄附者電話番号",
+    "お届け先名", "届け先名称カナ", "届け先郵便番号", "届け先都道府県", "届け先住所", "届け先電話番号", "配送業者", "伝票番号",
+    "配送ステータス", "返礼品ID", "返礼品", "数量", "事業者名称", "温度帯", "出荷予定日", "配送希望日",
+    "配送希望時間帯", "のし", "備考", "配送用伝票備考", "寄附金額", "決済方法", "受付経路", "キャンペーン",
+    "申込日", "出荷日", "出荷予定月", "商品コード", "入金日", "更新日",
+]
+
+# 返礼品名のパターン（カテゴリ・定期便・kg/本の組み合わせ）
+PRODUCT_NAMES = [
+    "【令和7年産】あきたこまち 玄米 5kg",
+    "【令和7年産】あきたこまち 玄米 10kg",
+    "【令和7年産】あきたこまち 玄米 30kg",
+    "【令和7年産】あきたこまち 白米 5kg",
+    "【令和7年産】あきたこまち 白米 10kg",
+    "【令和7年産】あきたこまち 白米 20kg（10kg×2袋）",
+    "【定期便6回】あきたこまち 白米 5kg",
+    "【定期便12回】あきたこまち 白米 10kg",
+    "【令和7年産】あきたこまち 無洗米 5kg",
+    "【令和7年産】あきたこまち 無洗米 15kg（5kg×3袋）",
+    "【定期便3回】あきたこまち 無洗米 10kg",
+    "【定期便6回】あきたこまち 玄米 25kg",
+    "あきたこまち ペットボトル 2合×1本",
+    "あきたこまち ペットボトル 2合×2本",
+    "あきたこまち ペットボトル 2合×3本",
+    "あきたこまち ペットボトル 2合×6本",
+    "【定期便12回】あきたこまち ペットボトル 2合×4本",
+    "きりたんぽ鍋セット",
+]
+
+# 配送ステータス（出現頻度の重み付き）
+DELIVERY_STATUSES = [
+    ("出荷依頼準備中", 20), ("出荷準備中", 10), ("出荷済", 40), ("配送完了", 20),
+    ("配送キャンセル", 4), ("返送", 1), ("配送対象外", 5),
+]
+
+# 生成する行数（python3 generate_delivery_list.py で行数を省略した場合）
+ROW_COUNTS = [10000, 100000, 1000000]
+
+# 備考欄（ポータルの出力と同じく、申込フォームの定型文に寄附者の記入が挟まる）
+NOTE_RATE = 0.3  # 備考がある行の割合
+DELIVERY_NOTE_RATE = 0.05  # 配送用伝票備考がある行の割合
+NOTE_MESSAGES = [
+    "玄関前に置き配をお願いします",
+    "不在の場合は宅配ボックスに入れてください",
+    "のしは不要です",
+    "１．午前中に届くようにお願いします",
+    "贈答用なので金額がわかるものは同封しないでください",
+    "指定なし",
+    "",
+]
+NOTE_TIMES = ["指定なし", "午前中", "14時～16時", "16時～18時", "18時～20時"]
+DELIVERY_NOTES = ["置き配希望", "インターホン故障中のためお電話ください", "管理人室に預けてください"]
+PAYMENT_DATE_RATE = 0.1  # payment_dateを指定した場合に、入金日をその日にする行の割合
+
+
+def make_note(rng, donor):
+    """備考欄のテキストを作成します（空の場合もあります）。"""
+    if rng.random() >= NOTE_RATE:
+        return ""
+    message = rng.choice(NOTE_MESSAGES)
+    if rng.random() < 0.3:
+        # 寄附者ごとに異なる記入（重複しない備考）
+        message += f"\n{donor}様 部屋番号{rng.randrange(100, 1000)}号室まで"
+    return (
+        f"[備考欄:]\r\n備考1：{message}\r\n"
+        f"[配送日時指定:]{rng.choice(NOTE_TIMES)}\r\n"
+        "このページはふるさと納税専用ページです。　お問い合わせは事業者までお願いします。"
+    )
+
+
+def write_delivery_list(path, row_count, seed=0, start_date=date(2025, 9, 1), month_count=12, payment_date=None):
+    """
+    ポータルの出力と同じ列構成のdelivery_list*.csv（CP932）を乱数で作成します。
+
+    Args:
+        path: 出力先のパス
+        row_count: 行数
+        seed: 乱数のシード
+        start_date: 出荷予定日の開始日
+        month_count: 出荷予定日の月数
+        payment_date: 一部の行の入金日にする日付（bikou.pyが抽出する昨日の入金分。省略時は申込日と同じ）
+    """
+    rng = random.Random(seed)
+    statuses, weights = zip(*DELIVERY_STATUSES)
+    column_index = {name: i for i, name in enumerate(DELIVERY_HEADER)}
+    day_count = month_count * 30
+
+    def random_date(blank_rate):
+        if rng.random() < blank_rate:
+            return ""
+        return (start_date + timedelta(days=rng.randrange(day_count))).strftime("%Y/%m/%d")
+
+    with open(path, 'w', encoding='cp932', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(DELIVERY_HEADER)
+        for i in range(row_count):
+            product_index = rng.randrange(len(PRODUCT_NAMES))
+            row = [""] * len(DELIVERY_HEADER)
+            row[column_index["配送管理ID"]] = str(1000000 + i)
+            row[column_index["寄附者"]] = f"寄附者{rng.randrange(row_count // 3 + 1)}"
+            row[column_index["お届け先名"]] = row[column_index["寄附者"]]
+            row[column_index["配送ステータス"]] = rng.choices(statuses, weights)[0]
+            row[column_index["返礼品"]] = PRODUCT_NAMES[product_index]
+            row[column_index["事業者名称"]] = "もみがらエネルギー株式会社"
+            row[column_index["出荷予定日"]] = random_date(0.1)
+            row[column_index["備考"]] = make_note(rng, row[column_index["寄附者"]])
+            if rng.random() < DELIVERY_NOTE_RATE:
+                row[column_index["配送用伝票備考"]] = rng.choice(DELIVERY_NOTES)
+            row[column_index["申込日"]] = random_date(0.0)
+            row[column_index["出荷日"]] = random_date(0.5)
+            row[column_index["商品コード"]] = f"KMC{product_index:03d}"
+            row[column_index["入金日"]] = row[column_index["申込日"]]
+            if payment_date is not None and rng.random() < PAYMENT_DATE_RATE:
+                row[column_index["入金日"]] = payment_date.strftime("%Y/%m/%d")
+            writer.writerow(row)
+
+
+if __name__ == "__main__":
+    # 使い方: python3 generate_delivery_list.py [行数 ...] [--out 出力先フォルダ]
+    args = sys.argv[1:]
+    out_dir = "."
+    if "--out" in args:
+        out_dir = args[args.index("--out") + 1]
+        del args[args.index("--out"):args.index("--out") + 2]
+    row_counts = [int(arg) for arg in args] or ROW_COUNTS
+
+    os.makedirs(out_dir, exist_ok=True)
+    yesterday = datetime.now().date() - timedelta(days=1)
+    for row_count in row_counts:
+        path = os.path.join(out_dir, f"delivery_list_synthetic_{row_count}.csv")
+        write_delivery_list(path, row_count, payment_date=yesterday)
+        print(f"{path} を作成しました。（{row_count}行、{os.path.getsize(path) / (1024 * 1024):.1f}MB）")
@@ -0,0 +1,335 @@
+import os
+import time
+import hashlib
+import importlib.util
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from atomic_file import atomic_path
+
+# CSV設定
+CSV_ENCODING = "cp932"
+DATE_FORMAT = "%Y/%m/%d"  # 出荷予定日・出荷日・申込日の書式
+
+# edit.pyの集計に使う列
+DELIVERY_COLUMNS = ['返礼品', '出荷予定日', '出荷日', '申込日', '商品コード', '配送ステータス']
+
+# 配送ごとに一意なID（複数のCSVの重複除外に使う）
+DELIVERY_ID_COLUMN = '配送管理ID'
+
+# 種類の少ない文字列列（category型で読み込む）
+CATEGORY_COLUMNS = ['返礼品', '配送ステータス', '商品コード']
+
+# 日付列（読み込み時に日時型に変換する）
+DATE_COLUMNS = ['出荷予定日', '出荷日', '申込日']
+
+# 変換済みCSVのキャッシュ設定（edit.py・bikou.py・debug.pyで共有）
+EXPORT_CACHE_DIR = "export_cache"  # CP932を1回だけデコードした全列（文字列）のArrowファイルの保存先
+EXPORT_CACHE_VERSION = 1  # 変換方法を変えたら上げる（古いキャッシュを使わないため）
+EXPORT_CACHE_MAX_AGE_DAYS = 7  # これより長く使われていないArrowのキャッシュは新しいキャッシュの作成時に削除
+
+# ストリーミング読み込み（edit.py --stream）で1回に読み込む行数
+STREAM_CHUNK_ROWS = 100000
+
+# 計算済みのファイル内容のハッシュ（file_content_hash）
+_content_hashes = {}
+
+
+def pyarrow_available():
+    """pyarrowがインストールされているかどうかを返します。"""
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def parse_date_column(values):
+    """
+    日付列をDATE_FORMATの書式で日時型に変換します。
+
+    書式に合わない値が1つでもある場合は、値を失わないよう文字列のまま返します。
+    """
+    parsed = pd.to_datetime(values, format=DATE_FORMAT, errors='coerce')
+    if (parsed.isna() & values.notna()).any():
+        return values
+    return parsed
+
+
+def file_content_hash(path):
+    """
+    ファイルの内容のSHA-256（16進数）を返します。
+
+    同じプロセスでは、パス・サイズ・更新日時が変わっていないファイルを2回目以降読み直しません
+    （pipeline.pyでedit.pyとbikou.pyが同じファイルを読む場合など）。
+    """
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if key not in _content_hashes:
+        with open(path, 'rb') as f:
+            _content_hashes[key] = hashlib.file_digest(f, "sha256").hexdigest()
+    return _content_hashes[key]
+
+
+def export_cache_path(csv_path, cache_dir=EXPORT_CACHE_DIR):
+    """CSVファイルの内容に対応するキャッシュファイルのパスを返します。"""
+    return os.path.join(cache_dir, f"v{EXPORT_CACHE_VERSION}-{file_content_hash(csv_path)}.arrow")
+
+
+def prune_export_cache(cache_dir=EXPORT_CACHE_DIR, max_age_days=EXPORT_CACHE_MAX_AGE_DAYS):
+    """
+    max_age_days日以上使われていないArrowのキャッシュファイル（と書き込み途中で残った一時ファイル）を削除します。
+
+    load_exportは作成時と読み込むたびにキャッシュの更新日時を新しくするため、更新日時が最後に使われた日時です。
+
+    同じディレクトリにあるJSONのキャッシュ（bikou.pyのencodings.json、schema.pyのschemas.json）は削除しません。
+    """
+    limit = time.time() - max_age_days * 24 * 60 * 60
+    for name in os.listdir(cache_dir):
+        if not (name.endswith(".arrow") or (".arrow." in name and name.endswith(".tmp"))):
+            continue
+        path = os.path.join(cache_dir, name)
+        try:
+            if os.path.getmtime(path) < limit:
+                os.remove(path)
+        except FileNotFoundError:
+            # 同時に実行している別のスレッド・プロセスが削除・置き換えたファイル
+            continue
+
+
+def load_export(csv_path, columns=None, engine=None, cache_dir=EXPORT_CACHE_DIR):
+    """
+    delivery_list*.csvをCP932でデコードし、全列を文字列のまま読み込みます。
+
+    デコード結果はファイルの内容のハッシュをキーにArrow形式でキャッシュし、
+    同じ内容のファイルは2回目以降（別のスクリプトからでも）メモリマップで読み込みます。
+    pyarrowがない場合はキャッシュせずにCSVから読み込みます。
+
+    Args:
+        csv_path: CSVファイルのパス
+        columns: 読み込む列（列名または列番号のリスト。省略時は全列。CSVの列の順に並べて返す）
+        engine: キャッシュがない場合に使うCSVパーサー
+        cache_dir: キャッシュの保存先
+
+    Returns:
+        文字列型の列を持つDataFrame（空欄は欠損値）
+    """
+    read_options = {'encoding': CSV_ENCODING, 'dtype': 'str'}
+    if engine is not None:
+        read_options['engine'] = engine
+
+    if not pyarrow_available():
+        if columns is not None:
+            read_options['usecols'] = columns
+        return pd.read_csv(csv_path, **read_options)
+
+    from pyarrow import feather
+
+    cache_path = export_cache_path(csv_path, cache_dir)
+    if not os.path.exists(cache_path):
+        df = pd.read_csv(csv_path, **read_options)
+        try:
+            with atomic_path(cache_path) as tmp_path:
+                feather.write_feather(df, tmp_path, compression='uncompressed')
+        except OSError:
+            # 同じファイルを同時に読み込んだ別のスレッド・プロセスが先にキャッシュを作成していればそれを使う
+            if not os.path.exists(cache_path):
+                raise
+        prune_export_cache(cache_dir)
+    else:
+        # 読み込むたびに更新日時を新しくする（prune_export_cacheが使われ続けているキャッシュを削除しないため）
+        os.utime(cache_path)
+
+    # 無圧縮のArrowファイルをメモリマップで読み込む（文字列列もコピーせずに参照）
+    if columns is not None:
+        if all(isinstance(col, int) for col in columns):
+            columns = sorted(columns)
+        else:
+            header = feather.read_table(cache_path, columns=[], memory_map=True).schema.names
+            columns = [col for col in header if col in columns]
+    table = feather.read_table(cache_path, columns=columns, memory_map=True)
+    return table.to_pandas()
+
+
+def read_export_header(csv_path, cache_dir=EXPORT_CACHE_DIR):
+    """
+    delivery_list*.csvの列名のリストを返します。
+
+    load_exportのキャッシュがあればキャッシュから、なければCSVの1行目だけを読み込みます。
+    """
+    if pyarrow_available():
+        from pyarrow import feather
+
+        cache_path = export_cache_path(csv_path, cache_dir)
+        if os.path.exists(cache_path):
+            os.utime(cache_path)
+            return feather.read_table(cache_path, columns=[], memory_map=True).schema.names
+    return list(pd.read_csv(csv_path, encoding=CSV_ENCODING, dtype='str', nrows=0).columns)
+
+
+def infer_column_types(df):
+    """
+    文字列で読み込んだ列を、read_csvの既定の型推定と同じく数値にできる列は数値に変換します。
+    """
+    df = df.copy()
+    for col in df.columns:
+        try:
+            df[col] = pd.to_numeric(df[col])
+        except (ValueError, TypeError):
+            continue
+    return df
+
+
+def read_delivery_csv(csv_path, columns=DELIVERY_COLUMNS, typed=True, engine=None):
+    """
+    delivery_list*.csvから必要な列だけを読み込みます。
+
+    Args:
+        csv_path: CSVファイルのパス
+        columns: 読み込む列（列名または列番号のリスト）
+        typed: Trueの場合、CATEGORY_COLUMNSをcategory型、DATE_COLUMNSを日時型、
+            その他の列を文字列として読み込む。Falseの場合は型を推定する
+        engine: "pyarrow"を指定するとpyarrowのCSVパーサーを使う
+            （pyarrowがない場合は標準のパーサーを使う）
+
+    Returns:
+        指定した列だけを持つDataFrame
+    """
+    if engine == "pyarrow" and not pyarrow_available():
+        print("pyarrowがインストールされていないため、標準のCSVパーサーで読み込みます。")
+        engine = None
+
+    if not pyarrow_available():
+        return read_delivery_csv_uncached(csv_path, columns, typed, engine)
+
+    # 共有キャッシュ（全列を文字列で保存）から必要な列だけを読み込む
+    df = load_export(csv_path, columns=list(columns), engine=engine)
+    missing = [col for col in columns if not isinstance(col, int) and col not in df.columns]
+    if missing:
+        raise ValueError(f"CSVファイルに指定された列が見つかりません: {missing}")
+
+    if not typed:
+        return infer_column_types(df)
+
+    for col in df.columns:
+        if col in CATEGORY_COLUMNS:
+            df[col] = df[col].astype('category')
+        elif col in DATE_COLUMNS:
+            df[col] = parse_date_column(df[col])
+    return df
+
+
+def read_delivery_csv_uncached(csv_path, columns, typed, engine):
+    """pyarrowがない場合に、キャッシュを使わずread_delivery_csvと同じ形で読み込みます。"""
+    read_options = {'encoding': CSV_ENCODING, 'usecols': columns}
+    if engine is not None:
+        read_options['engine'] = engine
+
+    if not typed:
+        return pd.read_csv(csv_path, **read_options)
+
+    # 列の型を固定して読み込む（日付は文字列で読み込んでから一括変換）
+    read_options['dtype'] = {
+        col: ('category' if col in CATEGORY_COLUMNS else 'str')
+        for col in columns
+    }
+    df = pd.read_csv(csv_path, **read_options)
+    for col in DATE_COLUMNS:
+        if col in df.columns:
+            df[col] = parse_date_column(df[col])
+    return df
+
+
+def iter_delivery_csv_chunks(csv_path, columns=DELIVERY_COLUMNS, chunk_rows=STREAM_CHUNK_ROWS):
+    """
+    delivery_list*.csvをchunk_rows行ずつ読み込みます（ファイル全体をメモリに載せない）。
+
+    キャッシュは使わず、各チャンクをread_delivery_csvと同じ型（CATEGORY_COLUMNSはcategory型、
+    DATE_COLUMNSは日時型、その他は文字列）に変換して返します。配送管理IDは自動で追加します。
+
+    Yields:
+        chunk_rows行以下のDataFrame
+    """
+    read_columns = list(columns)
+    if DELIVERY_ID_COLUMN not in read_columns:
+        read_columns.append(DELIVERY_ID_COLUMN)
+    dtype = {col: ('category' if col in CATEGORY_COLUMNS else 'str') for col in read_columns}
+    with pd.read_csv(csv_path, encoding=CSV_ENCODING, usecols=read_columns, dtype=dtype, chunksize=chunk_rows) as reader:
+        for chunk in reader:
+            for col in DATE_COLUMNS:
+                if col in chunk.columns:
+                    chunk[col] = parse_date_column(chunk[col])
+            yield chunk
+
+
+def concat_delivery_frames(dataframes):
+    """
+    read_delivery_csvで読み込んだDataFrameを結合します。
+
+    カテゴリの異なるcategory型の列も、category型のまま結合します。
+    """
+    df = pd.concat(dataframes, ignore_index=True)
+    for col in CATEGORY_COLUMNS:
+        if col not in df.columns or isinstance(df[col].dtype, pd.CategoricalDtype):
+            continue
+        if all(isinstance(d[col].dtype, pd.CategoricalDtype) for d in dataframes):
+            df[col] = pd.Series(union_categoricals([d[col] for d in dataframes]), index=df.index)
+    return df
+
+
+def load_delivery_csvs(csv_paths, columns=DELIVERY_COLUMNS, engine=None, max_workers=None):
+    """
+    複数のdelivery_list*.csvをプロセスプールで並列に読み込み、重複を除いて結合します。
+
+    エクスポートが重なって同じ配送管理IDの行が複数のファイルにある場合は、
+    最も新しいエクスポート（csv_pathsの後のファイル）の行、つまり最新の配送ステータスの行を残します。
+    配送管理IDが空の行は重複とみなしません。
+
+    Args:
+        csv_paths: 古いエクスポートから順に並べたCSVファイルのパスのリスト（manifest.sort_by_export_time）
+        columns: 読み込む列（配送管理IDは自動で追加）
+        engine: read_delivery_csvに渡すCSVパーサー
+        max_workers: 並列数（省略時はCPUコア数とファイル数の小さい方）
+
+    Returns:
+        結合したDataFrame（読み込めたファイルがない場合はNone）
+    """
+    read_columns = list(columns)
+    if DELIVERY_ID_COLUMN not in read_columns:
+        read_columns.append(DELIVERY_ID_COLUMN)
+
+    if max_workers is None:
+        max_workers = min(len(csv_paths), os.cpu_count() or 1)
+
+    results = {}
+    if max_workers <= 1:
+        for csv_path in csv_paths:
+            try:
+                results[csv_path] = read_delivery_csv(csv_path, read_columns, engine=engine)
+            except Exception as e:
+                print(f"CSVファイル「{os.path.basename(csv_path)}」の読み込みでエラーが発生しました: {e}")
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                csv_path: executor.submit(read_delivery_csv, csv_path, read_columns, True, engine)
+                for csv_path in csv_paths
+            }
+            for csv_path, future in futures.items():
+                try:
+                    results[csv_path] = future.result()
+                except Exception as e:
+                    print(f"CSVファイル「{os.path.basename(csv_path)}」の読み込みでエラーが発生しました: {e}")
+
+    dataframes = [results[csv_path] for csv_path in csv_paths if csv_path in results]
+    for csv_path in csv_paths:
+        if csv_path in results:
+            print(f"CSVファイル「{os.path.basename(csv_path)}」をCP932で読み込みました。（{len(results[csv_path])}行）")
+    if not dataframes:
+        return None
+
+    df = concat_delivery_frames(dataframes)
+    print(f"合計{len(dataframes)}件のCSVファイルを結合しました。（{len(df)}行）")
+
+    # 同じ配送管理IDの行は最後（最新のファイル）の行を残す
+    duplicated = df[DELIVERY_ID_COLUMN].notna() & df.duplicated(subset=[DELIVERY_ID_COLUMN], keep='last')
+    if duplicated.any():
+        print(f"重複した配送管理IDの行を除外しました: {int(duplicated.sum())}件")
+        df = df[~duplicated].reset_index(drop=True)
+    return df
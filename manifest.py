@@ -0,0 +1,133 @@
+import os
+import json
+import hashlib
+from datetime import datetime
+
+from atomic_file import atomic_write
+
+# マニフェスト設定
+MANIFEST_DIR = "download_manifests"  # download.pyがダウンロードした日ごとに書き出すマニフェスト（YYYY-MM-DD.json）
+
+
+def manifest_path(day=None, manifest_dir=MANIFEST_DIR):
+    """指定した日（省略時は今日）のマニフェストのパスを返します。"""
+    day = day or datetime.now().date()
+    return os.path.join(manifest_dir, f"{day:%Y-%m-%d}.json")
+
+
+def file_sha256(path):
+    """ファイルの内容のSHA-256（16進数）を返します。"""
+    with open(path, 'rb') as f:
+        return hashlib.file_digest(f, 'sha256').hexdigest()
+
+
+def make_entry(path, row_index, exported_at=None):
+    """
+    ダウンロードしたファイル1件分のマニフェストの項目を作成します。
+
+    Args:
+        path: 保存したファイルのパス
+        row_index: 印刷管理のテーブルの行のインデックス（0始まり）
+        exported_at: 印刷管理に表示されたエクスポートの作成日時（時刻がない場合はNone）
+    """
+    return {
+        'path': os.path.abspath(path),
+        'size': os.path.getsize(path),
+        'sha256': file_sha256(path),
+        'source_row': row_index + 1,
+        'exported_at': exported_at.isoformat(timespec='seconds') if exported_at else None,
+        'downloaded_at': datetime.fromtimestamp(os.path.getmtime(path)).isoformat(timespec='seconds'),
+    }
+
+
+def write_manifest(files, day=None, manifest_dir=MANIFEST_DIR, export_times=None):
+    """
+    ダウンロードしたファイルのマニフェストを書き出します（同じ日のマニフェストは置き換える）。
+
+    書き込み途中のマニフェストを読まないように、一時ファイルに書いてから名前を変更します。
+
+    Args:
+        files: {行のインデックス: ファイルのパス} の辞書
+        export_times: {行のインデックス: エクスポートの作成日時} の辞書（download.find_today_export_rows）
+
+    Returns:
+        書き出したマニフェストのパス
+    """
+    os.makedirs(manifest_dir, exist_ok=True)
+    path = manifest_path(day, manifest_dir)
+    manifest = {
+        'date': f"{day or datetime.now().date():%Y-%m-%d}",
+        'written_at': datetime.now().isoformat(timespec='seconds'),
+        'files': [make_entry(file_path, row_index, (export_times or {}).get(row_index))
+                  for row_index, file_path in sorted(files.items())],
+    }
+    with atomic_write(path) as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    print(f"マニフェストを書き出しました: {path}（{len(manifest['files'])}件）")
+    return path
+
+
+def read_manifest(day=None, manifest_dir=MANIFEST_DIR):
+    """指定した日（省略時は今日）のマニフェストを返します。ない場合はNone。"""
+    path = manifest_path(day, manifest_dir)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def manifest_csv_paths(day=None, manifest_dir=MANIFEST_DIR):
+    """
+    マニフェストに記録されたCSVファイルのパスを返します。
+
+    内容が同じファイル（SHA-256が同じ）は最初の1件だけを返し、削除されたファイルや
+    ダウンロード後にサイズが変わったファイルは除きます。
+
+    Returns:
+        ファイルのパスのリスト。マニフェストがない場合はNone
+    """
+    manifest = read_manifest(day, manifest_dir)
+    if manifest is None:
+        return None
+    paths = []
+    seen_hashes = set()
+    for entry in manifest['files']:
+        if entry['sha256'] in seen_hashes:
+            print(f"内容が同じファイルのため除外: {os.path.basename(entry['path'])}")
+            continue
+        if not os.path.exists(entry['path']) or os.path.getsize(entry['path']) != entry['size']:
+            print(f"警告: マニフェストのファイルが見つからないか変更されています: {entry['path']}")
+            continue
+        seen_hashes.add(entry['sha256'])
+        paths.append(entry['path'])
+    return paths
+
+
+def export_order_key(entry):
+    """
+    マニフェストの項目を古いエクスポートから順に並べるためのキーを返します。
+
+    印刷管理の作成日時の順で、作成日時が同じ（または時刻がない）場合は印刷管理の下の行ほど古いとみなします
+    （印刷管理は新しいエクスポートから順に表示されるため）。
+    """
+    return (entry.get('exported_at') or "", -entry['source_row'])
+
+
+def sort_by_export_time(csv_paths, day=None, manifest_dir=MANIFEST_DIR):
+    """
+    CSVファイルを古いエクスポートから順に並べて返します（同じ配送管理IDの行は後のファイルの行を残すため）。
+
+    ダウンロードが終わった時刻（更新日時）はエクスポートの新しさと一致しないため、マニフェストに
+    記録されたファイルはexport_order_keyの順に並べます。マニフェストにないファイル（ダウンロードフォルダを
+    検索した場合）は更新日時の順に、マニフェストのファイルより前に並べます。
+    """
+    manifest = read_manifest(day, manifest_dir)
+    entries = {entry['path']: entry for entry in (manifest or {}).get('files', [])}
+
+    def order_key(path):
+        entry = entries.get(os.path.abspath(path))
+        if entry is None:
+            return (0, (os.path.getmtime(path), path))
+        return (1, export_order_key(entry))
+
+    return sorted(csv_paths, key=order_key)
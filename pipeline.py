@@ -0,0 +1,179 @@
+import sys
+import time
+import importlib
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# 同時に実行するステージ数（edit.pyとbikou.pyのスプレッドシート書き込みを並行させる）
+MAX_PARALLEL_STAGES = 2
+
+# search.pyでエクスポートを依頼した日時（それ以降に作成されたエクスポートを待つ）
+export_requested_at = None
+
+
+def run_module(module_name, func_name="main", *args, **kwargs):
+    """スクリプトを1回だけ読み込み、同じプロセスの中で関数を実行します。"""
+    module = importlib.import_module(module_name)
+    return getattr(module, func_name)(*args, **kwargs)
+
+
+def shared_browser():
+    """search・wait_export・downloadで共有するログイン済みのブラウザを返します。"""
+    return run_module("browser", "get_session")
+
+
+def close_shared_browser():
+    """共有しているブラウザを終了します（ブラウザを使うステージを実行しなかった場合は何もしない）。"""
+    if "browser" in sys.modules:
+        sys.modules["browser"].close_session()
+
+
+def run_search():
+    """search.pyでポータルにCSVのエクスポートを依頼します。"""
+    global export_requested_at
+    export_requested_at = datetime.now()
+    run_module("search", "main", shared_browser())
+    return True
+
+
+def wait_for_export():
+    """印刷管理に今回のエクスポートが表示され、ダウンロードできるようになるまで待機します。"""
+    print("search.py完了。エクスポートの準備ができるまで待機中...")
+    return run_module("download", "wait_for_export", export_requested_at, driver=shared_browser())
+
+
+def run_download():
+    """download.pyで今日エクスポートしたCSVファイルをダウンロードします。"""
+    run_module("download", "main", shared_browser())
+    return True
+
+
+def run_edit():
+    """edit.pyの集計と書き込みを実行し、成功したかどうかを返します。"""
+    return run_module("edit")
+
+
+def run_bikou():
+    """bikou.pyで備考欄を抽出して書き込みます。"""
+    run_module("bikou")
+    return True
+
+
+def run_check_c4_alert():
+    """C4セルを確認します（エラーでアラートを表示した場合はNoneが返る）。"""
+    return run_module("check_c4_alert", "check_c4_cell") is not None
+
+
+# ステージ名: (実行する関数, 先に完了している必要があるステージ)
+# 前のステージが失敗しても、run_script.shと同じく後のステージは実行する
+STAGES = {
+    "search": (run_search, []),
+    "wait_export": (wait_for_export, ["search"]),
+    "download": (run_download, ["wait_export"]),
+    "edit": (run_edit, ["download"]),
+    "bikou": (run_bikou, ["download"]),
+    "check_c4_alert": (run_check_c4_alert, ["edit"]),
+}
+
+# メインスレッドで実行するステージ（check_c4_alertのアラートはtkinterのウィンドウで、macOSではメインスレッド以外で
+# 表示できないため）。実行中のステージがすべて終わってから、スレッドプールを使わずに実行する
+MAIN_THREAD_STAGES = {"check_c4_alert"}
+
+
+def run_stage(name):
+    """
+    1つのステージを実行し、結果と所要時間を返します。
+
+    Returns:
+        (結果, 所要時間（秒）, エラー) のタプル。結果は "成功"・"失敗"・"エラー" のいずれか
+    """
+    func, _ = STAGES[name]
+    print(f"=== {name} を開始します ===")
+    start = time.perf_counter()
+    try:
+        outcome = "成功" if func() else "失敗"
+        error = None
+    except (Exception, SystemExit) as e:
+        # スクリプト内のexit()なども、後のステージを止めないようにここで受け止める
+        outcome = "エラー"
+        error = f"{type(e).__name__}: {e}"
+        print(f"{name} でエラーが発生しました: {error}")
+    elapsed = time.perf_counter() - start
+    print(f"=== {name} が終了しました（{outcome}、{elapsed:.1f}秒） ===")
+    return outcome, elapsed, error
+
+
+def run_pipeline(stage_names=None):
+    """
+    ステージを依存関係の順に実行します。依存関係のないステージは並行して実行します。
+
+    Args:
+        stage_names: 実行するステージ名のリスト（省略時は全ステージ）。
+            指定しなかったステージは完了済みとして扱う
+
+    Returns:
+        {ステージ名: (結果, 所要時間, エラー)} の辞書（実行順）
+    """
+    if stage_names is None:
+        stage_names = list(STAGES)
+    unknown = [name for name in stage_names if name not in STAGES]
+    if unknown:
+        raise ValueError(f"不明なステージです: {unknown}（指定できるステージ: {list(STAGES)}）")
+
+    pending = [name for name in STAGES if name in stage_names]
+    finished = set(STAGES) - set(pending)
+    results = {}
+
+    try:
+        with ThreadPoolExecutor(max_workers=MAX_PARALLEL_STAGES) as executor:
+            running = {}
+            while pending or running:
+                # 依存するステージがすべて終わったステージを開始
+                for name in list(pending):
+                    if not all(dep in finished for dep in STAGES[name][1]):
+                        continue
+                    if name in MAIN_THREAD_STAGES:
+                        if running:
+                            continue
+                        pending.remove(name)
+                        results[name] = run_stage(name)
+                        finished.add(name)
+                        continue
+                    pending.remove(name)
+                    running[executor.submit(run_stage, name)] = name
+
+                if not running:
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    results[name] = future.result()
+                    finished.add(name)
+    finally:
+        close_shared_browser()
+
+    return results
+
+
+def print_report(results, total_time):
+    """ステージごとの結果と所要時間を表示します。"""
+    print()
+    print(f"{'ステージ':<16} {'結果':<6} {'所要時間(s)':>10}")
+    for name, (outcome, elapsed, error) in results.items():
+        print(f"{name:<16} {outcome:<6} {elapsed:>10.1f}")
+        if error:
+            print(f"  詳細: {error}")
+    print(f"{'合計':<16} {'':<6} {total_time:>10.1f}")
+
+
+def main():
+    # 使い方: python3 pipeline.py [ステージ名 ...]（省略時は全ステージ）
+    stage_names = sys.argv[1:] or None
+    start = time.perf_counter()
+    results = run_pipeline(stage_names)
+    print_report(results, time.perf_counter() - start)
+    return all(outcome == "成功" for outcome, _, _ in results.values())
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,130 @@
+import os
+import json
+import hashlib
+
+from ingest import EXPORT_CACHE_DIR
+from atomic_file import atomic_write
+
+# 列の解決設定
+# ヘッダーごとの列の対応（ヘッダーのSHA-256 → {列: CSVの列名}）。
+# ingest.prune_export_cacheが古いファイルを削除するのはArrowのキャッシュだけのため、このファイルは残る
+SCHEMA_CACHE_FILE = os.path.join(EXPORT_CACHE_DIR, "schemas.json")
+SCHEMA_VERSION = 1  # COLUMN_RULESを変えたら上げる（古い対応を使わないため）
+
+# 列の探し方（列ごとに、CSVの列名と完全一致する列 → 以下の条件を上から順に、最初に見つかった列を使う）
+# 条件のない列は完全一致のみ。1つのCSVの列は1つの列にだけ対応させる
+COLUMN_RULES = {
+    '配送管理ID': [
+        lambda col: col.startswith('配送') and ('ID' in col or '管理' in col),
+        lambda col: col == 'A',
+    ],
+    '寄附者': [
+        lambda col: col == '寄付者',
+        lambda col: ('寄附者' in col or '寄付者' in col) and '番号' not in col,  # 「寄附者番号」を除外
+    ],
+    'お届け先名': [],
+    '配送ステータス': [],
+    '返礼品': [],
+    '出荷予定日': [],
+    '備考': [
+        lambda col: '備考' in col and '配送用' not in col,  # 「配送用伝票備考」を除外
+        lambda col: col == 'AA',
+    ],
+    '配送用伝票備考': [],
+    '申込日': [],
+    '出荷日': [],
+    '商品コード': [],
+    '入金日': [
+        lambda col: '入金' in col,
+        lambda col: col == 'AK',
+    ],
+}
+
+# 読み込んだ対応（同じプロセスでは対応ファイルを1回だけ読み込む）
+_schemas = None
+
+
+def header_signature(header):
+    """CSVのヘッダー（列名のリスト）を識別する文字列を返します。"""
+    text = "\x1f".join(str(col) for col in header)
+    return f"v{SCHEMA_VERSION}-{hashlib.sha256(text.encode('utf-8')).hexdigest()}"
+
+
+def match_columns(header):
+    """
+    COLUMN_RULESの全ての列について、対応するCSVの列名を探します。
+
+    Returns:
+        {列: CSVの列名} の辞書（見つからない列はNone）
+    """
+    header = [str(col) for col in header]
+    mapping = {}
+    used = set()
+    # 完全一致を優先し、残りの列を条件で探す
+    for name in COLUMN_RULES:
+        mapping[name] = name if name in header else None
+        if mapping[name] is not None:
+            used.add(name)
+    for name, rules in COLUMN_RULES.items():
+        if mapping[name] is not None:
+            continue
+        for rule in rules:
+            found = next((col for col in header if col not in used and rule(col)), None)
+            if found is not None:
+                mapping[name] = found
+                used.add(found)
+                break
+    return mapping
+
+
+def load_schema_cache(path=SCHEMA_CACHE_FILE):
+    """保存済みの列の対応を読み込みます。"""
+    global _schemas
+    if _schemas is None:
+        _schemas = {}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    _schemas = json.load(f)
+            except Exception:
+                _schemas = {}
+    return _schemas
+
+
+def save_schema_cache(schemas, path=SCHEMA_CACHE_FILE):
+    """列の対応を保存します。"""
+    with atomic_write(path) as f:
+        json.dump(schemas, f, ensure_ascii=False, indent=2)
+
+
+def resolve_columns(header, required=(), optional=(), source=None):
+    """
+    CSVのヘッダーから、必要な列に対応するCSVの列名を返します。
+
+    列の対応はヘッダーごとに1回だけ計算し、SCHEMA_CACHE_FILEに保存します
+    （同じヘッダーのCSVは2回目以降、列名を探さずに保存した対応を使います）。
+
+    Args:
+        header: CSVの列名のリスト
+        required: 必ず必要な列（COLUMN_RULESの列）
+        optional: なくてもよい列
+        source: エラーメッセージに表示するファイル名
+
+    Returns:
+        {列: CSVの列名} の辞書（optionalの列で見つからない列は含まない）
+
+    Raises:
+        ValueError: requiredの列が見つからない場合
+    """
+    schemas = load_schema_cache()
+    signature = header_signature(header)
+    if signature not in schemas:
+        schemas[signature] = match_columns(header)
+        save_schema_cache(schemas)
+    mapping = schemas[signature]
+
+    missing = [name for name in required if mapping.get(name) is None]
+    if missing:
+        where = f"「{os.path.basename(source)}」" if source else ""
+        raise ValueError(f"CSVファイル{where}に必要な列が見つかりません: {missing}")
+    return {name: mapping[name] for name in list(required) + list(optional) if mapping.get(name) is not None}
@@ -0,0 +1,123 @@
+import os
+import sys
+import json
+import time
+import resource
+import contextlib
+from datetime import datetime
+
+# トレース設定
+TRACE_LOG_FILE = "trace_log.jsonl"  # 1回の実行につき1行（JSON Lines）を追記するログ
+
+# 実行中のトレース（start_runで開始し、finish_runで書き出す）
+_run = None
+_open_spans = []
+
+
+def peak_rss_mb():
+    """このプロセスのピークRSS（MB）を返します。ru_maxrssはLinuxではKB、macOSではバイト。"""
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss / (1024 * 1024) if sys.platform == "darwin" else max_rss / 1024
+
+
+def start_run(script):
+    """トレースを開始します。以降のspanはこの実行の記録に追加されます。"""
+    global _run
+    _run = {
+        'script': script,
+        'started_at': datetime.now().isoformat(timespec='seconds'),
+        'start': time.perf_counter(),
+        'spans': [],
+    }
+    _open_spans.clear()
+
+
+@contextlib.contextmanager
+def span(name, rows_in=None):
+    """
+    処理の区間（パイプラインの段階やAPI呼び出し）の時間・行数・メモリ・リトライを記録します。
+
+    区間内で record['rows_out'] を設定すると出力行数として記録されます。
+    start_runの前に呼び出した場合は何も記録しません。
+
+    Args:
+        name: 区間の名前
+        rows_in: 入力行数
+
+    Yields:
+        区間の記録（dict）
+    """
+    record = {
+        'name': name,
+        'rows_in': rows_in,
+        'rows_out': None,
+        'retries': 0,
+        'sleep_seconds': 0.0,
+    }
+    if _run is None:
+        yield record
+        return
+
+    rss_before = peak_rss_mb()
+    start = time.perf_counter()
+    _open_spans.append(record)
+    try:
+        yield record
+    except BaseException as e:
+        record['error'] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _open_spans.pop()
+        record['offset_seconds'] = round(start - _run['start'], 4)
+        record['wall_seconds'] = round(time.perf_counter() - start, 4)
+        record['peak_rss_delta_mb'] = round(peak_rss_mb() - rss_before, 1)
+        record['sleep_seconds'] = round(record['sleep_seconds'], 3)
+        _run['spans'].append(record)
+
+
+def record_retry(sleep_seconds):
+    """リトライ1回分（待機秒数）を、実行中の最も内側の区間に記録します。"""
+    if _open_spans:
+        _open_spans[-1]['retries'] += 1
+        _open_spans[-1]['sleep_seconds'] += sleep_seconds
+
+
+def record_error(error):
+    """
+    区間内で受け止めて処理を続けたエラーを、実行中の最も内側の区間に記録します。
+
+    Args:
+        error: 発生した例外
+    """
+    if _open_spans:
+        _open_spans[-1]['error'] = f"{type(error).__name__}: {error}"
+
+
+def finish_run(status="ok", path=TRACE_LOG_FILE):
+    """
+    トレースを終了し、実行全体の記録をログファイルに1行追記します。
+
+    Args:
+        status: 実行結果（"ok" または "error"）
+        path: ログファイルのパス
+    """
+    global _run
+    if _run is None:
+        return
+    record = {
+        'script': _run['script'],
+        'started_at': _run['started_at'],
+        'status': status,
+        'wall_seconds': round(time.perf_counter() - _run['start'], 4),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'retries': sum(s['retries'] for s in _run['spans']),
+        'sleep_seconds': round(sum(s['sleep_seconds'] for s in _run['spans']), 3),
+        'spans': sorted(_run['spans'], key=lambda s: s['offset_seconds']),
+    }
+    _run = None
+
+    try:
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    except OSError as e:
+        print(f"トレースログ「{os.path.basename(path)}」の書き込みでエラーが発生しました: {e}")